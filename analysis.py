@@ -0,0 +1,90 @@
+"""analysis.py – Analyse RAG hors Streamlit : recherche, contexte et messages Claude.
+
+Partagé par le runner batch et l'API HTTP. Pour une question d'un domaine
+(``prospects``, ``candidates`` ou ``match`` : candidats pour les besoins des
+prospects retrouvés, comme le mode « Prospect → Candidats » du tableau de
+bord), ``prepare`` lance les recherches asynchrones, assemble le ou les
+contextes sous budget de tokens et construit les messages Claude avec les
+consignes des interfaces.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from async_retrieval import candidates_for_prospects, retrieve
+from context import CANDIDATE_FORMAT, CONTEXT_TOKEN_BUDGET, PROSPECT_FORMAT, ContextResult, build_context
+from core import prospect_filter
+
+DOMAINS = ("prospects", "candidates", "match")
+
+# (consigne système, libellé des sources dans le prompt)
+PROMPTS = {
+    "prospects": ("Tu es SalesBot, un expert commercial. Réponds brièvement, puis liste les sources ([SRCx]).",
+                  "PROSPECTS"),
+    "candidates": ("Tu es RecruitBot, un expert en talent acquisition. Réponds brièvement, puis liste les "
+                   "sources ([SRCx]).", "CANDIDATS"),
+    "match": ("Tu es un expert en placement de talents. Pour chaque prospect, propose les candidats les plus "
+              "adaptés à son besoin et justifie brièvement. Cite les sources ([PROx], [CANx]).", None),
+}
+
+
+def source_summary(ctx: ContextResult) -> List[dict]:
+    """Sources d'un contexte, réduites à ce qu'affiche un rapport."""
+    return [{"tag": s["tag"], "airtable_id": s.get("airtable_id"),
+             "name": s.get("entreprise") or s.get("nom"), "score": s.get("score")} for s in ctx.sources]
+
+
+def build_messages(domain: str, human: str) -> list:
+    from langchain.schema import HumanMessage, SystemMessage  # import différé (démarrage rapide)
+    return [SystemMessage(content=PROMPTS[domain][0]), HumanMessage(content=human)]
+
+
+@dataclass
+class Analysis:
+    domain: str
+    query: str
+    records: int = 0                                           # fiches retrouvées (tous index)
+    contexts: List[ContextResult] = field(default_factory=list)
+    messages: list = field(default_factory=list)               # vide si aucune fiche
+
+    @property
+    def sources(self) -> List[dict]:
+        return [s for ctx in self.contexts for s in source_summary(ctx)]
+
+    @property
+    def ids(self) -> List[str]:
+        """IDs des vecteurs envoyés à Claude (clé du cache de réponses)."""
+        return [vid for ctx in self.contexts for vid in ctx.ids]
+
+
+async def prepare(domain: str, query: str, filters: Optional[Dict[str, object]] = None, top_k: int = 10,
+                  prospects_k: int = 3, alpha: Optional[float] = None,
+                  query_vec: Optional[List[float]] = None) -> Analysis:
+    """Recherches et prompt d'une question ; ``filters`` : sélections façon UI ;
+    ``query_vec`` : embedding de la question déjà calculé (cache de réponses)."""
+    analysis = Analysis(domain=domain, query=query)
+    pinecone_filter = prospect_filter(filters)
+    if domain == "match":
+        result = await candidates_for_prospects(query, [pinecone_filter] if pinecone_filter else None,
+                                                prospects_k=prospects_k, top_k=top_k, alpha=alpha,
+                                                query_vec=query_vec)
+        if not result.prospects or not result.candidates:
+            return analysis
+        pctx = build_context(result.prospects[:prospects_k], PROSPECT_FORMAT,
+                             budget=CONTEXT_TOKEN_BUDGET // 3, prefix="PRO")
+        cctx = build_context(result.candidates, CANDIDATE_FORMAT,
+                             budget=CONTEXT_TOKEN_BUDGET - pctx.tokens, prefix="CAN")
+        analysis.records = len(result.prospects) + len(result.candidates)
+        analysis.contexts = [pctx, cctx]
+        human = f"PROSPECTS:\n{pctx.text}\n\nCANDIDATS:\n{cctx.text}\n\nQUESTION: {query}\n\nANALYSE:"
+    else:
+        records = (await retrieve(query, (domain,), filters={domain: [pinecone_filter]} if pinecone_filter else None,
+                                  top_k=top_k, alpha=alpha, vectors={query: query_vec} if query_vec else None))[domain]
+        if not records:
+            return analysis
+        ctx = build_context(records, PROSPECT_FORMAT if domain == "prospects" else CANDIDATE_FORMAT)
+        analysis.records = len(records)
+        analysis.contexts = [ctx]
+        human = f"{PROMPTS[domain][1]}:\n{ctx.text}\n\nQUESTION: {query}\n\nANALYSE:"
+    analysis.messages = build_messages(domain, human)
+    return analysis
@@ -0,0 +1,150 @@
+"""answer_cache.py – Cache sémantique des réponses RAG.
+
+Une réponse est réutilisée pour une question identique ou quasi identique :
+- clé = embedding de la question (similarité cosinus ≥ seuil) + version de
+  l'index interrogé (incrémentée par l'ingestion, cf. ``state.index_version``) ;
+- avec un seuil strict, la réponse est servie avant même la recherche Pinecone ;
+- avec un seuil plus souple, elle l'est seulement si la recherche a renvoyé
+  exactement le même ensemble de sources.
+
+Stockage SQLite (``RAG_STATE_DIR/answers.sqlite``) partagé entre processus,
+avec TTL et nombre d'entrées borné par index.
+
+Variables d'environnement :
+    ANSWER_CACHE                     "0" pour désactiver (défaut "1")
+    ANSWER_CACHE_TTL                 durée de vie en secondes (défaut 21600 = 6 h)
+    ANSWER_CACHE_THRESHOLD           similarité min. sans vérification des sources (défaut 0.97)
+    ANSWER_CACHE_SOURCES_THRESHOLD   similarité min. à sources identiques (défaut 0.90)
+    ANSWER_CACHE_MAX_ENTRIES         entrées max par index et interface (défaut 500)
+"""
+from __future__ import annotations
+import json, os, sqlite3, threading, time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from state import STATE_DIR, index_version
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "21600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_SOURCES_THRESHOLD = float(os.getenv("ANSWER_CACHE_SOURCES_THRESHOLD", "0.90"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    sources: List[dict]
+    similarity: float
+    age_s: float
+
+
+class AnswerCache:
+    """Cache des réponses indexé par (index, version) et embedding de la question."""
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.path = Path(path or STATE_DIR / "answers.sqlite")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY, index_name TEXT NOT NULL, scope TEXT NOT NULL, version INTEGER NOT NULL,"
+            " query TEXT NOT NULL, vec BLOB NOT NULL, source_ids TEXT NOT NULL,"
+            " payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_key ON answers(index_name, scope, version, created_at)")
+        self._db.commit()
+
+    @staticmethod
+    def _sources_key(source_ids: Iterable[str]) -> str:
+        return json.dumps(sorted(set(source_ids)))
+
+    def lookup(self, index_name: str, query_vec: List[float], scope: str = "",
+               source_ids: Optional[Iterable[str]] = None) -> Optional[CachedAnswer]:
+        """Meilleure réponse en cache pour cette question, ou None.
+
+        ``scope`` distingue les interfaces (prompts différents sur un même index).
+        Sans ``source_ids`` : seuil strict. Avec : seuil souple, mais l'ensemble
+        des sources mémorisé doit être identique.
+        """
+        import numpy as np
+        version = index_version(index_name)
+        threshold = ANSWER_CACHE_THRESHOLD if source_ids is None else ANSWER_CACHE_SOURCES_THRESHOLD
+        sources_key = None if source_ids is None else self._sources_key(source_ids)
+        now = time.time()
+        sql = "SELECT query, vec, source_ids, payload, created_at FROM answers WHERE index_name=? AND scope=? AND version=? AND created_at>=?"
+        params: list = [index_name, scope, version, now - self.ttl]
+        if sources_key is not None:
+            sql += " AND source_ids=?"
+            params.append(sources_key)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        qv = np.asarray(query_vec, dtype=np.float32)
+        rows = [r for r in rows if len(r[1]) == qv.nbytes]
+        best = None
+        if rows:
+            # Embeddings normalisés : produit scalaire = cosinus
+            sims = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), -1) @ qv
+            i = int(np.argmax(sims))
+            if sims[i] >= threshold:
+                query, _blob, _sources, payload, created_at = rows[i]
+                best = (float(sims[i]), query, payload, created_at)
+        if best is None:
+            # Un miss n'est compté qu'au second niveau (après la recherche)
+            if source_ids is not None:
+                self.misses += 1
+            return None
+        self.hits += 1
+        sim, query, payload, created_at = best
+        data = json.loads(payload)
+        return CachedAnswer(query=query, answer=data["answer"], sources=data["sources"],
+                            similarity=sim, age_s=now - created_at)
+
+    def store(self, index_name: str, query: str, query_vec: List[float],
+              source_ids: Iterable[str], answer: str, sources: List[dict], scope: str = "") -> None:
+        import numpy as np
+        payload = json.dumps({"answer": answer, "sources": sources}, ensure_ascii=False, default=str)
+        version = index_version(index_name)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO answers (index_name, scope, version, query, vec, source_ids, payload, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (index_name, scope, version, query, np.asarray(query_vec, dtype=np.float32).tobytes(),
+                 self._sources_key(source_ids), payload, time.time()),
+            )
+            # Purge : versions périmées, entrées expirées, dépassement de capacité
+            self._db.execute("DELETE FROM answers WHERE index_name=? AND (version<>? OR created_at<?)",
+                             (index_name, version, time.time() - self.ttl))
+            self._db.execute(
+                "DELETE FROM answers WHERE index_name=? AND scope=? AND id NOT IN "
+                "(SELECT id FROM answers WHERE index_name=? AND scope=? ORDER BY created_at DESC LIMIT ?)",
+                (index_name, scope, index_name, scope, self.max_entries),
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def cache_badge(cached: CachedAnswer) -> str:
+    """Bandeau affiché quand la réponse vient du cache."""
+    return (f"⚡ Réponse servie depuis le cache (similarité {cached.similarity:.2f}, "
+            f"générée il y a {format_age(cached.age_s)} pour « {cached.query} »)")
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+api.py – API HTTP asynchrone (FastAPI) : recherche et analyse RAG hors Streamlit.
+
+Endpoints :
+    GET  /health              état, caches et coalescence
+    GET  /metrics             latence par étage, format texte Prometheus (cf. telemetry.py)
+    POST /search/prospects    {"query", "filters", "top_k", "alpha", "understand"}
+    POST /search/candidates   idem, index candidats
+    POST /analyze             {"domain", "query", "filters", "top_k", "prospects_k"}
+        réponse NDJSON en flux : {"type": "sources", …}, puis {"type": "delta",
+        "text": …} au fil de la génération Claude, puis {"type": "done", …}
+
+Un seul processus sert toutes les requêtes : clients Bedrock / Pinecone /
+Claude, cache de recherche et cache de réponses sont ceux de ``core``,
+initialisés au démarrage et partagés. Les requêtes identiques en vol sont
+coalescées : une seule recherche, une seule génération Claude, diffusée à
+chaque appelant depuis le début (un appelant qui se déconnecte n'interrompt
+pas les autres).
+
+Doublures (``--stub`` ou API_STUB=1) : Bedrock, Pinecone et Claude simulés
+(``benchmarks/fakes.py``) pour les tests de charge locaux, cf.
+``benchmarks/bench_api.py``.
+
+Variables d'environnement :
+    API_KEY               si définie, exigée dans l'en-tête X-API-Key
+    API_MAX_GENERATIONS   générations Claude simultanées (défaut 8)
+    API_STUB              "1" pour les doublures
+    API_STUB_RECORDS      fiches synthétiques par domaine (défaut 1000)
+    API_STUB_LATENCY      latence Titan et index simulée, en s (défaut 0.02)
+    API_STUB_TTFT         TTFT Claude simulé, en s (défaut 0.3)
+
+Usage :
+    uvicorn api:app --host 0.0.0.0 --port 8000
+    python api.py --port 8000 --stub
+"""
+from __future__ import annotations
+import argparse, asyncio, contextlib, contextvars, json, logging, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+import core
+from analysis import prepare
+from async_retrieval import retrieve
+from core import CANDIDATE_INDEX_NAME, DOMAIN_INDEXES, PINECONE_INDEX_NAME, RecordMatch, prospect_filter, stream_answer
+from telemetry import span, telemetry, trace
+
+API_KEY             = os.getenv("API_KEY", "")
+API_MAX_GENERATIONS = int(os.getenv("API_MAX_GENERATIONS", "8"))
+API_STUB            = os.getenv("API_STUB", "0") == "1"
+API_STUB_RECORDS    = int(os.getenv("API_STUB_RECORDS", "1000"))
+API_STUB_LATENCY    = float(os.getenv("API_STUB_LATENCY", "0.02"))
+API_STUB_TTFT       = float(os.getenv("API_STUB_TTFT", "0.3"))
+
+# Index du cache de réponses par domaine (pas de cache pour « match », comme le tableau de bord)
+ANSWER_CACHE_INDEX = {"prospects": PINECONE_INDEX_NAME, "candidates": CANDIDATE_INDEX_NAME}
+
+log = logging.getLogger("rag.api")
+
+
+# ── modèles ───────────────────────────────────────────────────────────
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1)
+    filters: Dict[str, Any] = Field(default_factory=dict)   # valeur ou liste, comme les sélections de l'UI
+    top_k: int = Field(10, ge=1, le=100)
+    alpha: Optional[float] = Field(None, ge=0, le=1)
+    understand: bool = True
+
+
+class AnalyzeRequest(BaseModel):
+    domain: Literal["prospects", "candidates", "match"] = "prospects"
+    query: str = Field(min_length=1)
+    filters: Dict[str, Any] = Field(default_factory=dict)
+    top_k: int = Field(10, ge=1, le=50)
+    prospects_k: int = Field(3, ge=1, le=10)
+
+
+def request_key(kind: str, req: BaseModel) -> str:
+    return json.dumps([kind, req.model_dump()], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def record_json(r: RecordMatch) -> dict:
+    md = r.metadata or {}
+    return {"id": r.id, "airtable_id": md.get("airtable_id"), "score": round(r.score, 4),
+            "metadata": {k: v for k, v in md.items() if k != "text"}, "text": md.get("text")}
+
+
+# ── coalescence ───────────────────────────────────────────────────────
+class Coalescer:
+    """Un seul calcul par clé en vol ; les appels identiques en attendent le résultat."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = self._inflight[key] = asyncio.ensure_future(compute())
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield : l'annulation d'un appelant n'annule pas le calcul partagé
+        return await asyncio.shield(fut)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+class Broadcast:
+    """Texte produit au fil de l'eau, relu depuis le début par chaque abonné."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._wake()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self.done, self.error = True, error
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class AnalysisSession:
+    """Analyse en cours : en-tête (sources) puis génération diffusée."""
+
+    def __init__(self):
+        self.header: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.stream = Broadcast()
+        self.task: Optional[asyncio.Task] = None
+
+
+# ── service ───────────────────────────────────────────────────────────
+class RagService:
+    """État partagé par toutes les requêtes du processus."""
+
+    def __init__(self, max_generations: int = API_MAX_GENERATIONS):
+        self.searches = Coalescer()
+        self.sessions: Dict[str, AnalysisSession] = {}
+        self.analyses = 0
+        self.analyses_coalesced = 0
+        self.max_generations = max_generations
+        self._generations: Optional[asyncio.Semaphore] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        self._generations = asyncio.Semaphore(self.max_generations)
+        # Générations Claude et appels bloquants hors du pool par défaut (dimensionné sur les CPU)
+        self._pool = ThreadPoolExecutor(self.max_generations + 4, thread_name_prefix="api")
+
+    def stop(self) -> None:
+        for session in list(self.sessions.values()):
+            if session.task is not None:
+                session.task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        call = contextvars.copy_context().run
+        return await asyncio.get_running_loop().run_in_executor(self._pool, call, func, *args)
+
+    # ── recherche ─────────────────────────────────────────────────────
+    async def search(self, domain: str, req: SearchRequest) -> dict:
+        return await self.searches.run(request_key(domain, req), lambda: self._search(domain, req))
+
+    async def _search(self, domain: str, req: SearchRequest) -> dict:
+        with trace(f"api/search-{domain}", query=req.query[:80]):
+            pinecone_filter = prospect_filter(req.filters)
+            records = (await retrieve(req.query, (domain,), filters={domain: [pinecone_filter]} if pinecone_filter
+                                      else None, top_k=req.top_k, alpha=req.alpha,
+                                      understand=req.understand))[domain]
+        parsed = core.understand_query(DOMAIN_INDEXES[domain], req.query) if req.understand else None
+        deduced = parsed.matched if parsed is not None and records and parsed.accepts(records[0].metadata) else {}
+        return {"query": req.query, "filters_deduced": deduced, "records": [record_json(r) for r in records]}
+
+    # ── analyse ───────────────────────────────────────────────────────
+    def analysis(self, req: AnalyzeRequest) -> AnalysisSession:
+        """Session de l'analyse ``req`` : en cours pour une requête identique, ou démarrée."""
+        self.analyses += 1
+        key = request_key("analyze", req)
+        session = self.sessions.get(key)
+        if session is not None:
+            self.analyses_coalesced += 1
+            return session
+        session = self.sessions[key] = AnalysisSession()
+        session.task = asyncio.ensure_future(self._analyse(key, req, session))
+        return session
+
+    async def _analyse(self, key: str, req: AnalyzeRequest, session: AnalysisSession) -> None:
+        error: Optional[BaseException] = None
+        try:
+            with trace(f"api/analyze-{req.domain}", query=req.query[:80]):
+                await self._answer(req, session)
+        except asyncio.CancelledError as exc:   # arrêt du serveur
+            error = exc
+            session.header.cancel()
+            raise
+        except Exception as exc:
+            error = exc
+            if not session.header.done():
+                session.header.set_exception(exc)
+        finally:
+            # Retirée avant la fin du flux : une requête suivante relit le cache, pas cette session
+            self.sessions.pop(key, None)
+            session.stream.close(error)
+
+    async def _answer(self, req: AnalyzeRequest, session: AnalysisSession) -> None:
+        answer_cache = core.init_answer_cache()
+        index_name = ANSWER_CACHE_INDEX.get(req.domain) if answer_cache else None
+        scope = f"api/{req.domain}" + (f"/{json.dumps(req.filters, sort_keys=True)}" if req.filters else "")
+        query_vec = None
+        if index_name:
+            with span("embed", chars=len(req.query)):
+                query_vec = await self._run(core.init_embedder().embed_query, req.query)
+            with span("answer_cache", index=index_name) as sp:
+                cached = await self._run(answer_cache.lookup, index_name, query_vec, scope)
+                sp.set(cache_hit=cached is not None)
+            if cached is not None:
+                self._serve_cached(session, cached)
+                return
+
+        analysis = await prepare(req.domain, req.query, req.filters, req.top_k, req.prospects_k, query_vec=query_vec)
+        if not analysis.records:
+            session.header.set_result({"records": 0, "sources": [], "cached": False})
+            return
+        if index_name:
+            # Mêmes sources qu'une question voisine déjà traitée : réponse réutilisée
+            cached = await self._run(answer_cache.lookup, index_name, query_vec, scope, analysis.ids)
+            if cached is not None:
+                self._serve_cached(session, cached)
+                return
+        session.header.set_result({"records": analysis.records, "sources": analysis.sources, "cached": False})
+
+        chat = core.init_claude()
+        loop = asyncio.get_running_loop()
+
+        def pump() -> str:
+            parts = []
+            for chunk in stream_answer(analysis.messages, chat, label=f"api/{req.domain} q={req.query[:60]!r}"):
+                parts.append(chunk)
+                loop.call_soon_threadsafe(session.stream.push, chunk)
+            return "".join(parts)
+
+        async with self._generations:
+            answer = await self._run(pump)
+        if index_name:
+            await self._run(answer_cache.store, index_name, req.query, query_vec, analysis.ids, answer,
+                            analysis.sources, scope)
+
+    @staticmethod
+    def _serve_cached(session: AnalysisSession, cached) -> None:
+        session.header.set_result({"records": len(cached.sources), "sources": cached.sources, "cached": True,
+                                   "similarity": round(cached.similarity, 4), "age_s": round(cached.age_s)})
+        session.stream.push(cached.answer)
+
+    def stats(self) -> dict:
+        cache = core.init_retrieval_cache()
+        return {"search": self.searches.stats(),
+                "analyze": {"calls": self.analyses, "coalesced": self.analyses_coalesced,
+                            "inflight": len(self.sessions)},
+                "retrieval_cache": cache.stats() if cache is not None else None}
+
+
+def warm_up() -> None:
+    """Clients partagés créés au démarrage plutôt qu'à la première requête."""
+    for name in ("init_embedder", "init_pinecone", "init_candidate_index", "init_retrieval_cache",
+                 "init_answer_cache", "init_claude"):
+        try:
+            getattr(core, name)()
+        except Exception as exc:
+            log.warning("initialisation %s : %s", name, exc)
+
+
+# ── application ───────────────────────────────────────────────────────
+def create_app(stub: bool = API_STUB) -> FastAPI:
+    service = RagService()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        with contextlib.ExitStack() as stack:
+            if stub:
+                from benchmarks.fakes import stubbed_core
+                stack.enter_context(stubbed_core(core, API_STUB_RECORDS, API_STUB_LATENCY, API_STUB_TTFT,
+                                                 retrieval_cache=True))
+            service.start()
+            await asyncio.get_running_loop().run_in_executor(None, warm_up)
+            try:
+                yield
+            finally:
+                service.stop()
+
+    app = FastAPI(title="Assistant RAG", lifespan=lifespan)
+    app.state.service = service
+
+    async def check_key(x_api_key: Optional[str] = Header(None)) -> None:
+        if API_KEY and x_api_key != API_KEY:
+            raise HTTPException(status_code=401, detail="X-API-Key invalide")
+
+    secured = [Depends(check_key)]
+
+    @app.get("/health")
+    async def health() -> dict:
+        return {"status": "ok", "stub": stub, **service.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse, dependencies=secured)
+    async def metrics() -> str:
+        return telemetry.prometheus_text()
+
+    @app.post("/search/prospects", dependencies=secured)
+    async def search_prospects(req: SearchRequest) -> dict:
+        return await service.search("prospects", req)
+
+    @app.post("/search/candidates", dependencies=secured)
+    async def search_candidates(req: SearchRequest) -> dict:
+        return await service.search("candidates", req)
+
+    @app.post("/analyze", dependencies=secured)
+    async def analyze(req: AnalyzeRequest) -> StreamingResponse:
+        session = service.analysis(req)
+        try:
+            header = await asyncio.shield(session.header)
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"{type(exc).__name__}: {exc}")
+
+        async def body() -> AsyncIterator[bytes]:
+            yield (json.dumps({"type": "sources", **header}, ensure_ascii=False, default=str) + "\n").encode()
+            chars = 0
+            try:
+                async for chunk in session.stream.subscribe():
+                    chars += len(chunk)
+                    yield (json.dumps({"type": "delta", "text": chunk}, ensure_ascii=False) + "\n").encode()
+            except Exception as exc:
+                yield (json.dumps({"type": "error", "error": f"{type(exc).__name__}: {exc}"}) + "\n").encode()
+                return
+            yield (json.dumps({"type": "done", "chars": chars}) + "\n").encode()
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    return app
+
+
+app = create_app()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub", action="store_true", help="Bedrock / Pinecone / Claude simulés")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "warning").lower())
+    args = parser.parse_args(argv)
+    # Un seul worker : clients, caches et coalescence sont propres au processus
+    uvicorn.run(create_app(stub=args.stub or API_STUB), host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,46 +3,80 @@
 app_dashboard.py – Interface Streamlit unifiée pour Prospection (SalesBot) et Recrutement (RecruitBot).
 """
 from __future__ import annotations
-import os, sys, pathlib
-from typing import List
+import asyncio, os, sys, pathlib, logging, time
+from typing import List, Optional
 
 import streamlit as st
-import pandas as pd
 from dotenv import load_dotenv
-from langchain.prompts import ChatPromptTemplate
-from pinecone import Pinecone
 
 # ── bootstrap ──────────────────────────────────────────────
 PROJECT_DIR = pathlib.Path(__file__).resolve().parent
 load_dotenv(PROJECT_DIR / ".env")
 if str(PROJECT_DIR) not in sys.path:
     sys.path.insert(0, str(PROJECT_DIR))
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
-from core import init_embedder, init_claude, search_prospects  # utilitaire partagé
+from core import (CANDIDATE_INDEX_NAME, PINECONE_INDEX_NAME, init_answer_cache, init_embedder, init_claude,
+                  init_retrieval_cache, search_candidates, search_prospects, stream_answer, understand_query)  # utilitaire partagé
+from answer_cache import CachedAnswer, cache_badge
+from context import CANDIDATE_FORMAT, CONTEXT_TOKEN_BUDGET, PROSPECT_FORMAT, build_context
+from async_retrieval import candidates_for_prospects
+from telemetry import TELEMETRY_ENABLED, TELEMETRY_WINDOW, span, telemetry, trace
 
-# ── Config Pinecone candidats ─────────────────────────────
-CANDIDATE_INDEX_NAME = os.getenv("CANDIDATE_INDEX_NAME", "candidate-vectors")
-PINECONE_API_KEY     = os.getenv("PINECONE_API_KEY")
-PINECONE_REGION      = os.getenv("PINECONE_REGION", "us-east-1")
+# ── helpers ───────────────────────────────────────────────
+def show_results(title: str, table_title: str, rows: List[dict], csv_name: str, key: str,
+                 cached: Optional[CachedAnswer] = None, stream=None, ctx_summary: str = "") -> str:
+    """Affiche analyse, tableau et export ; retourne le texte de l'analyse."""
+    st.subheader(title)
+    analysis_box = st.container()
+    if ctx_summary:
+        st.caption(ctx_summary)
 
-@st.cache_resource
-def init_candidate_index():
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    return pc.Index(CANDIDATE_INDEX_NAME)
+    st.subheader(table_title)
+    import pandas as pd  # import différé : seulement quand il y a des résultats
+    df = pd.DataFrame(rows)
+    st.dataframe(df, use_container_width=True)
+    csv = df.to_csv(index=False).encode("utf-8")
+    st.download_button("⬇️ Export CSV", csv, csv_name, "text/csv", key=key)
 
-@st.cache_resource
-def search_candidates(query: str, top_k: int = 10):
-    embedder = init_embedder()
-    index    = init_candidate_index()
-    q_vec    = embedder.embed_query(query)
-    res = index.query(vector=q_vec, top_k=top_k, include_metadata=True)
-    return res.matches
+    with analysis_box:
+        if cached is not None:
+            st.success(cache_badge(cached))
+            st.markdown(cached.answer)
+            return cached.answer
+        return st.write_stream(stream)
+
+def cached_answer(index_name: str, query: str, scope: str):
+    """(cache, embedding de la question, réponse servie sans recherche ou None)."""
+    answer_cache = init_answer_cache()
+    if not answer_cache:
+        return None, None, None
+    with span("embed", chars=len(query)):
+        query_vec = init_embedder().embed_query(query)
+    with span("answer_cache", index=index_name) as sp:
+        cached = answer_cache.lookup(index_name, query_vec, scope=scope)
+        sp.set(cache_hit=cached is not None)
+    return answer_cache, query_vec, cached
+
+FILTERS_LABEL = "Appliquer les filtres déduits de la question"
+
+def filters_toggle(key: str) -> bool:
+    """Case à cocher : filtres déduits de la question appliqués ou non."""
+    return st.checkbox(FILTERS_LABEL, value=True, key=key,
+                       help="Décocher pour chercher sans les filtres reconnus dans la question")
+
+def show_filters(index_name: str, query: str, matches: list) -> None:
+    """Filtres déduits de la question, s'ils ont été appliqués à la recherche."""
+    parsed = understand_query(index_name, query)
+    if parsed.filter and parsed.accepts(matches[0].metadata):
+        st.caption(f"🔎 Filtres déduits de la question : {parsed.describe()} "
+                   f"(décocher « {FILTERS_LABEL} » pour les retirer)")
 
 # ── UI GLOBAL ─────────────────────────────────────────────
 st.set_page_config(page_title="🎛️ Assistant RAG", page_icon="🎛️", layout="wide")
 st.title("🎛️ Assistant RAG Consolidé")
 
-mode = st.sidebar.radio("Choisir le module :", ("Prospection", "Recrutement"))
+mode = st.sidebar.radio("Choisir le module :", ("Prospection", "Recrutement", "Prospect → Candidats", "Performance"))
 
 if mode == "Prospection":
     st.header("🎯 Module Prospection")
@@ -51,42 +85,44 @@ if mode == "Prospection":
         placeholder="Ex. : Quels sont les prospects fintech à contacter cette semaine ?",
         key="sales_query",
     )
+    use_filters = filters_toggle("filters_sales")
     if st.button("🔍 Rechercher & Analyser", key="btn_sales") and query.strip():
-        with st.spinner("Recherche prospects…"):
-            matches = search_prospects(query, None, top_k=10)
-            if not matches:
-                st.warning("Aucun prospect trouvé.")
+        with trace("dashboard/prospection", query=query[:80]):
+            scope = "dashboard/prospection" + ("" if use_filters else "/sans-filtres")
+            answer_cache, query_vec, cached = cached_answer(PINECONE_INDEX_NAME, query, scope)
+            if cached is not None:
+                show_results("🤖 Analyse Prospection", "📋 Prospects", cached.sources, "prospects.csv", "csv_pros", cached)
                 st.stop()
 
-            prospects: List[dict] = []
-            ctx_lines = []
-            for i, m in enumerate(matches, 1):
-                md = m.metadata
-                tag = f"[SRC{i}]"
-                note_snippet = (str(md.get('notes', ''))[:80]).replace("\n", " ")
-                ctx_lines.append(
-                    f"{tag} Entreprise: {md.get('entreprise','N/A')} | Contact: {md.get('contact','N/A')} | "
-                    f"Secteur: {md.get('secteur','N/A')} | Statut: {md.get('statut','N/A')} | "
-                    f"Budget: {md.get('budget','N/A')} | Notes: {note_snippet}…"
-                )
-                prospects.append(md | {"tag": tag, "score": round(m.score, 3)})
-
-            context = "\n".join(ctx_lines)
-            chat = init_claude()
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "Tu es SalesBot, un expert commercial. Réponds brièvement, puis liste les sources ([SRCx])."),
-                ("human", f"PROSPECTS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
-            ])
-            answer = chat.invoke(prompt.format_messages()).content
-
-        st.subheader("🤖 Analyse Prospection")
-        st.markdown(answer)
-
-        st.subheader("📋 Prospects")
-        df = pd.DataFrame(prospects)
-        st.dataframe(df, use_container_width=True)
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Export CSV", csv, "prospects.csv", "text/csv", key="csv_pros")
+            with st.spinner("Recherche prospects…"):
+                matches = search_prospects(query, None, top_k=10, understand=use_filters, vector=query_vec)
+                if not matches:
+                    st.warning("Aucun prospect trouvé.")
+                    st.stop()
+                if use_filters:
+                    show_filters(PINECONE_INDEX_NAME, query, matches)
+
+                ctx = build_context(matches, PROSPECT_FORMAT)
+                prospects: List[dict] = ctx.sources
+                context = ctx.text
+                chat = init_claude()
+                from langchain.prompts import ChatPromptTemplate  # import différé (démarrage rapide)
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "Tu es SalesBot, un expert commercial. Réponds brièvement, puis liste les sources ([SRCx])."),
+                    ("human", f"PROSPECTS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
+                ])
+                messages = prompt.format_messages()
+
+            source_ids = ctx.ids
+            if answer_cache:
+                cached = answer_cache.lookup(PINECONE_INDEX_NAME, query_vec, scope=scope, source_ids=source_ids)
+
+            # Tableau et export rendus pendant le streaming de l'analyse
+            answer = show_results("🤖 Analyse Prospection", "📋 Prospects", prospects, "prospects.csv", "csv_pros", cached,
+                                  stream_answer(messages, chat, label=f"dashboard/prospection q={query[:60]!r}"),
+                                  ctx.summary())
+            if answer_cache and cached is None:
+                answer_cache.store(PINECONE_INDEX_NAME, query, query_vec, source_ids, answer, prospects, scope=scope)
 
 elif mode == "Recrutement":
     st.header("🤝 Module Recrutement")
@@ -95,46 +131,134 @@ elif mode == "Recrutement":
         placeholder="Ex. : Trouve-moi des profils data engineer disponibles dans 2 mois",
         key="recruit_query",
     )
+    use_filters = filters_toggle("filters_recruit")
     if st.button("🔍 Rechercher & Analyser", key="btn_recruit") and query.strip():
-        with st.spinner("Recherche candidats…"):
-            matches = search_candidates(query, top_k=10)
-            if not matches:
-                st.warning("Aucun candidat trouvé.")
+        with trace("dashboard/recrutement", query=query[:80]):
+            scope = "dashboard/recrutement" + ("" if use_filters else "/sans-filtres")
+            answer_cache, query_vec, cached = cached_answer(CANDIDATE_INDEX_NAME, query, scope)
+            if cached is not None:
+                show_results("🤖 Analyse Recrutement", "📋 Candidats", cached.sources, "candidats.csv", "csv_cand", cached)
                 st.stop()
 
-            candidates: List[dict] = []
-            ctx_lines = []
-            for i, m in enumerate(matches, 1):
-                md = m.metadata
-                tag = f"[SRC{i}]"
-                note_snippet = (str(md.get('notes', ''))[:80]).replace("\n", " ")
-                ctx_lines.append(
-                    f"{tag} Nom: {md.get('nom','N/A')} | Role: {md.get('role','N/A')} | "
-                    f"Compétences: {md.get('competences','N/A')} | Exp: {md.get('experience','N/A')} | "
-                    f"Localisation: {md.get('localisation','N/A')} | Dispo: {md.get('disponibilite','N/A')} | "
-                    f"Notes: {note_snippet}…"
-                )
-                candidates.append(md | {"tag": tag, "score": round(m.score, 3)})
-
-            context = "\n".join(ctx_lines)
-            chat = init_claude()
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "Tu es RecruitBot, un expert en talent acquisition. Réponds brièvement, puis liste les sources ([SRCx])."),
-                ("human", f"CANDIDATS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
-            ])
-            answer = chat.invoke(prompt.format_messages()).content
-
-        st.subheader("🤖 Analyse Recrutement")
-        st.markdown(answer)
-
-        st.subheader("📋 Candidats")
-        df = pd.DataFrame(candidates)
-        st.dataframe(df, use_container_width=True)
-
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Export CSV", csv, "candidats.csv", "text/csv", key="csv_cand")
-
-        # Les CVs ne sont plus pris en charge.
+            with st.spinner("Recherche candidats…"):
+                matches = search_candidates(query, top_k=10, understand=use_filters, vector=query_vec)
+                if not matches:
+                    st.warning("Aucun candidat trouvé.")
+                    st.stop()
+                if use_filters:
+                    show_filters(CANDIDATE_INDEX_NAME, query, matches)
+
+                ctx = build_context(matches, CANDIDATE_FORMAT)
+                candidates: List[dict] = ctx.sources
+                context = ctx.text
+                chat = init_claude()
+                from langchain.prompts import ChatPromptTemplate  # import différé (démarrage rapide)
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "Tu es RecruitBot, un expert en talent acquisition. Réponds brièvement, puis liste les sources ([SRCx])."),
+                    ("human", f"CANDIDATS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
+                ])
+                messages = prompt.format_messages()
+
+            source_ids = ctx.ids
+            if answer_cache:
+                cached = answer_cache.lookup(CANDIDATE_INDEX_NAME, query_vec, scope=scope, source_ids=source_ids)
+
+            answer = show_results("🤖 Analyse Recrutement", "📋 Candidats", candidates, "candidats.csv", "csv_cand", cached,
+                                  stream_answer(messages, chat, label=f"dashboard/recrutement q={query[:60]!r}"),
+                                  ctx.summary())
+            if answer_cache and cached is None:
+                answer_cache.store(CANDIDATE_INDEX_NAME, query, query_vec, source_ids, answer, candidates, scope=scope)
+
+            # Les CVs ne sont plus pris en charge.
+
+elif mode == "Prospect → Candidats":
+    st.header("🔗 Candidats pour les besoins d'un prospect")
+    query = st.text_input(
+        "Décrivez le prospect ou son besoin…",
+        placeholder="Ex. : Quels candidats proposer aux prospects fintech qui recrutent ?",
+        key="match_query",
+    )
+    prospects_k = st.sidebar.slider("Prospects analysés", 1, 5, 3, key="match_prospects_k")
+    # Pas de cache de réponses ici : la réponse dépend de deux index versionnés
+    # séparément ; les recherches restent servies par le cache de recherche.
+    if st.button("🔍 Rechercher & Analyser", key="btn_match") and query.strip():
+        with trace("dashboard/prospect-candidats", query=query[:80]):
+            with st.spinner("Recherche prospects et candidats…"):
+                # Prospects et candidats en parallèle, puis candidats par besoin prospect
+                result = asyncio.run(candidates_for_prospects(query, prospects_k=prospects_k, top_k=10))
+                if not result.prospects or not result.candidates:
+                    st.warning("Aucun prospect ou candidat trouvé.")
+                    st.stop()
+
+                pctx = build_context(result.prospects[:prospects_k], PROSPECT_FORMAT,
+                                     budget=CONTEXT_TOKEN_BUDGET // 3, prefix="PRO")
+                cctx = build_context(result.candidates, CANDIDATE_FORMAT,
+                                     budget=CONTEXT_TOKEN_BUDGET - pctx.tokens, prefix="CAN")
+                # Prospects dont le besoin a fait remonter chaque candidat
+                companies = {p.metadata.get("airtable_id"): p.metadata.get("entreprise", "?") for p in result.prospects}
+                fits: dict = {}
+                for pid, matches in result.by_prospect.items():
+                    for m in matches:
+                        fits.setdefault(m.metadata.get("airtable_id"), []).append(companies.get(pid, "?"))
+                candidates: List[dict] = [src | {"prospects": ", ".join(fits.get(src.get("airtable_id"), []))}
+                                          for src in cctx.sources]
+                chat = init_claude()
+                from langchain.prompts import ChatPromptTemplate  # import différé (démarrage rapide)
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", "Tu es un expert en placement de talents. Pour chaque prospect, propose les candidats "
+                               "les plus adaptés à son besoin et justifie brièvement. Cite les sources ([PROx], [CANx])."),
+                    ("human", f"PROSPECTS:\n{pctx.text}\n\nCANDIDATS:\n{cctx.text}\n\nQUESTION: {query}\n\nANALYSE:")
+                ])
+                messages = prompt.format_messages()
+
+            st.caption("Prospects retenus : " + ", ".join(f"{s['tag']} {s.get('entreprise', '?')}" for s in pctx.sources))
+            show_results("🤖 Analyse Prospect → Candidats", "📋 Candidats proposés", candidates, "candidats_prospects.csv",
+                         "csv_match", stream=stream_answer(messages, chat, label=f"dashboard/prospect-candidats q={query[:60]!r}"),
+                         ctx_summary=f"Prospects : {pctx.summary()} · Candidats : {cctx.summary()}")
+
+elif mode == "Performance":
+    st.header("⏱️ Performance")
+    st.caption(f"Latence par étage des requêtes servies par ce processus (p50 / p95 sur les "
+               f"{TELEMETRY_WINDOW} dernières mesures de chaque étage).")
+    if st.sidebar.button("🧹 Réinitialiser les mesures", key="btn_perf_reset"):
+        telemetry.reset()
+    rows = telemetry.summary()
+    if not TELEMETRY_ENABLED:
+        st.info("Télémétrie désactivée (TELEMETRY=0).")
+    elif not rows:
+        st.info("Aucune mesure pour l'instant : posez une question dans un autre module.")
+    else:
+        import pandas as pd  # import différé : seulement quand il y a des mesures
+        # Requêtes racines (« dashboard/… », « ingest/… ») séparées des étages
+        roots = [r for r in rows if "/" in r["stage"]]
+        stages = [r for r in rows if "/" not in r["stage"]]
+        if roots:
+            st.subheader("Requêtes de bout en bout")
+            st.dataframe(pd.DataFrame(roots).set_index("stage"), use_container_width=True)
+        if stages:
+            st.subheader("Étages")
+            df = pd.DataFrame(stages).set_index("stage")
+            st.bar_chart(df[["p50_ms", "p95_ms"]], stack=False)
+            st.dataframe(df, use_container_width=True)
+
+        recent = telemetry.recent_traces()
+        if recent:
+            st.subheader("Dernières requêtes")
+            st.dataframe(pd.DataFrame([
+                {"heure": time.strftime("%H:%M:%S", time.localtime(t["at"])), "requête": t["name"],
+                 "question": t["attrs"].get("query", ""), "total_ms": t["ms"], **t["stages"]}
+                for t in recent
+            ]), use_container_width=True)
+
+    retrieval_cache = init_retrieval_cache()
+    if retrieval_cache is not None:
+        cs = retrieval_cache.stats()
+        st.caption(f"Cache de recherche : {cs['hits']} hits / {cs['misses']} misses "
+                   f"({cs['hit_rate']:.0%}), {cs['entries']} entrées, {cs['mb']} Mo")
+    with st.expander("Métriques Prometheus"):
+        metrics = telemetry.prometheus_text()
+        st.code(metrics, language="text")
+        st.download_button("⬇️ metrics.prom", metrics.encode("utf-8"), "metrics.prom", "text/plain", key="dl_metrics")
 
 # Footer
 st.markdown("---")
@@ -4,10 +4,9 @@ app_recruit.py – Assistant RAG pour le recrutement.
 Recherche et analyse de candidats issus d'Airtable indexés dans Pinecone.
 """
 from __future__ import annotations
-import os, sys, pathlib
-from typing import List
+import os, sys, pathlib, logging
+from typing import List, Optional
 import streamlit as st
-import pandas as pd
 from dotenv import load_dotenv
 
 # ── bootstrap ──────────────────────────────────────────────
@@ -15,28 +14,44 @@ PROJECT_DIR = pathlib.Path(__file__).resolve().parent
 load_dotenv(PROJECT_DIR / ".env")
 if str(PROJECT_DIR) not in sys.path:
     sys.path.insert(0, str(PROJECT_DIR))
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
-from langchain.prompts import ChatPromptTemplate
-from core import init_embedder, init_claude  # utilitaire partagé
-from pinecone import Pinecone
+from core import (CANDIDATE_INDEX_NAME, init_answer_cache, init_embedder, init_claude,
+                  search_candidates, stream_answer, understand_query)  # utilitaire partagé
+from answer_cache import CachedAnswer, cache_badge
+from context import CANDIDATE_FORMAT, build_context
+from telemetry import trace
 
-# ── helpers Pinecone spécifiques candidats ───────────────────────────
-CANDIDATE_INDEX_NAME = os.getenv("CANDIDATE_INDEX_NAME", "candidate-vectors")
-PINECONE_API_KEY     = os.getenv("PINECONE_API_KEY")
-PINECONE_REGION      = os.getenv("PINECONE_REGION", "us-east-1")
+# ── helpers ──────────────────────────────────────────────────────────
+CACHE_SCOPE = "app_recruit"
+FILTERS_LABEL = "Appliquer les filtres déduits de la question"
 
-@st.cache_resource
-def init_candidate_index():
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    return pc.Index(CANDIDATE_INDEX_NAME)
+def show_results(candidates: List[dict], cached: Optional[CachedAnswer] = None, stream=None,
+                 ctx_summary: str = "") -> str:
+    """Affiche analyse, sources et tableau ; retourne le texte de l'analyse."""
+    st.subheader("🤖 Analyse IA")
+    analysis_box = st.container()
+
+    st.subheader("🔗 Sources")
+    for c in candidates:
+        st.markdown(f"- {c['tag']} {c.get('nom','N/A')}")
+    if ctx_summary:
+        st.caption(ctx_summary)
+
+    st.subheader("📋 Candidats")
+    import pandas as pd  # import différé : seulement quand il y a des résultats
+    df = pd.DataFrame(candidates)
+    st.dataframe(df, use_container_width=True)
+
+    csv = df.to_csv(index=False).encode("utf-8")
+    st.download_button("⬇️ Export CSV", csv, "candidats.csv", "text/csv")
 
-@st.cache_data(ttl=600)
-def search_candidates(query: str, top_k: int = 10):
-    embedder = init_embedder()
-    index    = init_candidate_index()
-    q_vec    = embedder.embed_query(query)
-    res = index.query(vector=q_vec, top_k=top_k, include_metadata=True)
-    return res.matches
+    with analysis_box:
+        if cached is not None:
+            st.success(cache_badge(cached))
+            st.markdown(cached.answer)
+            return cached.answer
+        return st.write_stream(stream)
 
 # ── UI ─────────────────────────────────────────────────────
 st.set_page_config(page_title="🤝 RecruitBot RAG", page_icon="🤝", layout="wide")
@@ -46,50 +61,51 @@ query = st.text_input(
     "Posez votre question sur les candidats…",
     placeholder="Ex. : Trouve-moi des développeurs Python disponibles dans 1 mois"
 )
+use_filters = st.checkbox(FILTERS_LABEL, value=True, help="Décocher pour chercher sans les filtres reconnus dans la question")
 submitted = st.button("🔍 Rechercher & Analyser", type="primary")
 
 if submitted and query.strip():
-    with st.spinner("Recherche et analyse en cours…"):
-        matches = search_candidates(query, top_k=10)
-        if not matches:
-            st.warning("Aucun candidat trouvé.")
+    with trace("app_recruit", query=query[:80]):
+        scope = CACHE_SCOPE if use_filters else f"{CACHE_SCOPE}/sans-filtres"
+        answer_cache = init_answer_cache()
+        query_vec = init_embedder().embed_query(query) if answer_cache else None
+        cached = answer_cache.lookup(CANDIDATE_INDEX_NAME, query_vec, scope=scope) if answer_cache else None
+        if cached is not None:
+            show_results(cached.sources, cached=cached)
             st.stop()
 
-        # Construction contexte
-        candidates: List[dict] = []
-        ctx_lines = []
-        for i, m in enumerate(matches, 1):
-            md = m.metadata
-            tag = f"[SRC{i}]"
-            ctx_lines.append(
-                f"{tag} Nom: {md.get('nom','N/A')} | Role: {md.get('role','N/A')} | "
-                f"Compétences: {md.get('competences','N/A')} | Exp: {md.get('experience','N/A')} | "
-                f"Dispo: {md.get('disponibilite','N/A')} | Notes: {str(md.get('notes',''))[:80].replace('\n',' ')}…"
-            )
-            candidates.append(md | {"tag": tag, "score": round(m.score, 3)})
-
-        context = "\n".join(ctx_lines)
-
-        chat = init_claude()
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Tu es RecruitBot, un expert en acquisition de talents. Réponds brièvement, puis liste les sources ([SRCx])."),
-            ("human", f"CANDIDATS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
-        ])
-        answer = chat.invoke(prompt.format_messages()).content
-
-    # Affichage
-    st.subheader("🤖 Analyse IA")
-    st.markdown(answer)
+        with st.spinner("Recherche et analyse en cours…"):
+            matches = search_candidates(query, top_k=10, understand=use_filters, vector=query_vec)
+            if not matches:
+                st.warning("Aucun candidat trouvé.")
+                st.stop()
+            parsed = understand_query(CANDIDATE_INDEX_NAME, query) if use_filters else None
+            if parsed is not None and parsed.filter and parsed.accepts(matches[0].metadata):
+                st.caption(f"🔎 Filtres déduits de la question : {parsed.describe()} "
+                           f"(décocher « {FILTERS_LABEL} » pour les retirer)")
 
-    st.subheader("🔗 Sources")
-    for c in candidates:
-        st.markdown(f"- {c['tag']} {c.get('nom','N/A')}")
+            # Construction contexte
+            ctx = build_context(matches, CANDIDATE_FORMAT)
+            candidates: List[dict] = ctx.sources
+            context = ctx.text
 
-    st.subheader("📋 Candidats")
-    df = pd.DataFrame(candidates)
-    st.dataframe(df, use_container_width=True)
+            chat = init_claude()
+            from langchain.prompts import ChatPromptTemplate  # import différé (démarrage rapide)
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", "Tu es RecruitBot, un expert en acquisition de talents. Réponds brièvement, puis liste les sources ([SRCx])."),
+                ("human", f"CANDIDATS:\n{context}\n\nQUESTION: {query}\n\nANALYSE:")
+            ])
+            messages = prompt.format_messages()
 
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Export CSV", csv, "candidats.csv", "text/csv")
+        source_ids = ctx.ids
+        if answer_cache:
+            cached = answer_cache.lookup(CANDIDATE_INDEX_NAME, query_vec, scope=scope, source_ids=source_ids)
+
+        # Affichage : sources et tableau rendus pendant le streaming de l'analyse
+        answer = show_results(candidates, cached=cached,
+                              stream=stream_answer(messages, chat, label=f"app_recruit q={query[:60]!r}"),
+                              ctx_summary=ctx.summary())
+        if answer_cache and cached is None:
+            answer_cache.store(CANDIDATE_INDEX_NAME, query, query_vec, source_ids, answer, candidates, scope=scope)
 else:
     st.info("Entrez votre question puis cliquez sur le bouton.") 
\ No newline at end of file
@@ -4,11 +4,10 @@ app_smart.py – Interface simplifiée : 1 champ de recherche,
 analyse IA sourcée, export CSV/JSON.
 """
 from __future__ import annotations
-import os, sys, pathlib, json
+import os, sys, pathlib, json, logging
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -17,14 +16,68 @@ PROJECT_DIR = pathlib.Path(__file__).resolve().parent
 load_dotenv(PROJECT_DIR / ".env")
 if str(PROJECT_DIR) not in sys.path:
     sys.path.insert(0, str(PROJECT_DIR))
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
-from core import init_embedder, init_pinecone, init_claude, search_prospects
+from core import (PINECONE_INDEX_NAME, init_answer_cache, init_embedder, init_pinecone, init_claude,
+                  search_prospects, stream_answer, understand_query)
+from answer_cache import CachedAnswer, cache_badge
+from context import PROSPECT_FORMAT, build_context
+from telemetry import trace
 
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+CACHE_SCOPE = "app_smart"
+FILTERS_LABEL = "Appliquer les filtres déduits de la question"
 
 def airtable_url(rec_id: str) -> str:
     return f"https://airtable.com/{AIRTABLE_BASE_ID}/{rec_id}" if AIRTABLE_BASE_ID else f"https://airtable.com/{rec_id}"
 
+def show_results(prospects: List[dict], cached: Optional[CachedAnswer] = None, stream=None,
+                 ctx_summary: str = "") -> str:
+    """Affiche analyse, sources, tableau et exports ; retourne le texte de l'analyse.
+
+    L'analyse est streamée en haut de page ; sources, tableau et exports sont
+    rendus d'abord, donc visibles pendant la génération.
+    """
+    st.subheader("🤖 Analyse IA")
+    analysis_box = st.container()
+
+    st.subheader("🔗 Sources")
+    for p in prospects:
+        st.markdown(f"- {p['tag']} {p.get('entreprise','N/A')} [↗]({airtable_url(p['airtable_id'])})")
+    if ctx_summary:
+        st.caption(ctx_summary)
+
+    # Rows pour DataFrame avec noms clairs
+    display_rows = [{
+        "Tag": p["tag"],
+        "Score": p["score"],
+        "Entreprise": p.get('entreprise',''),
+        "Contact": p.get('contact',''),
+        "Secteur": p.get('secteur',''),
+        "Statut": p.get('statut',''),
+        "Budget": p.get('budget',''),
+        "Notes": (p.get('notes') or '')[:120]
+    } for p in prospects]
+
+    st.subheader("📋 Prospects")
+    import pandas as pd  # import différé : seulement quand il y a des résultats
+    df = pd.DataFrame(display_rows)
+    st.dataframe(df, use_container_width=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_bytes  = df.to_csv(index=False).encode("utf-8")
+    json_bytes = df.to_json(orient="records", force_ascii=False, indent=2).encode("utf-8")
+    col1, col2 = st.columns(2)
+    col1.download_button("⬇️ Export CSV",  csv_bytes,  f"prospects_{timestamp}.csv",  "text/csv")
+    col2.download_button("⬇️ Export JSON", json_bytes, f"prospects_{timestamp}.json","application/json")
+
+    with analysis_box:
+        if cached is not None:
+            st.success(cache_badge(cached))
+            st.markdown(cached.answer)
+            return cached.answer
+        return st.write_stream(stream)
+
 # ── UI ─────────────────────────────────────────────────────
 st.set_page_config(page_title="🎯 Assistant RAG", page_icon="🎯", layout="wide")
 st.title("🎯 Assistant Commercial RAG")
@@ -33,53 +86,47 @@ query = st.text_input(
     "Posez votre question sur vos prospects…",
     placeholder="Ex. : Quels sont les prospects fintech à contacter cette semaine ?"
 )
+use_filters = st.checkbox(FILTERS_LABEL, value=True, help="Décocher pour chercher sans les filtres reconnus dans la question")
 submitted = st.button("🔍 Rechercher & Analyser", type="primary")
 
 if submitted and query.strip():
-    with st.spinner("Recherche et analyse en cours…"):
-        # Recherche des 10 meilleurs prospects correspondants
-        matches = search_prospects(query, None, top_k=100)
-        if not matches:
-            st.warning("Aucun prospect trouvé.")
+    with trace("app_smart", query=query[:80]):
+        # Cache sémantique : une question (quasi) identique déjà posée est servie
+        # sans recherche ni génération
+        scope = CACHE_SCOPE if use_filters else f"{CACHE_SCOPE}/sans-filtres"
+        answer_cache = init_answer_cache()
+        query_vec = init_embedder().embed_query(query) if answer_cache else None
+        cached = answer_cache.lookup(PINECONE_INDEX_NAME, query_vec, scope=scope) if answer_cache else None
+        if cached is not None:
+            show_results(cached.sources, cached=cached)
             st.stop()
 
-        # Contexte pour Claude
-        prospects: List[dict] = []
-        display_rows: List[dict] = []
-        ctx_lines = []
-        for i, m in enumerate(matches, 1):
-            md = m.metadata
-            tag = f"[SRC{i}]"
-            ctx_lines.append(
-                f"{tag} Entreprise: {md.get('entreprise','N/A')} | "
-                f"Contact: {md.get('contact','N/A')} | "
-                f"Secteur: {md.get('secteur','N/A')} | Statut: {md.get('statut','N/A')} | "
-                f"Budget: {md.get('budget','N/A')} | Notes: {(md.get('notes') or md.get('text',''))[:1000].replace('\\n',' ')}…"
-            )
-            full_dict = md | {"tag": tag, "score": round(m.score, 3)}
-            prospects.append(full_dict)
-
-            # Row pour DataFrame avec noms clairs
-            display_rows.append({
-                "Tag": tag,
-                "Score": round(m.score,3),
-                "Entreprise": md.get('entreprise',''),
-                "Contact": md.get('contact',''),
-                "Secteur": md.get('secteur',''),
-                "Statut": md.get('statut',''),
-                "Budget": md.get('budget',''),
-                "Notes": (md.get('notes') or '')[:120]
-            })
-
-        context = "\n".join(ctx_lines)
-
-        chat = init_claude()
-        from langchain.prompts import ChatPromptTemplate
-        # Nouveau prompt SalesBot détaillé
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                """Tu es SalesBot, un consultant commercial senior expert en prospection B2B et analyse de données CRM.
+        with st.spinner("Recherche et analyse en cours…"):
+            # Recherche des prospects correspondants ; secteur / statut cités dans
+            # la question deviennent des filtres : moins de bruit, top_k réduit
+            parsed = understand_query(PINECONE_INDEX_NAME, query) if use_filters else None
+            filtered = parsed is not None and bool(parsed.filter)
+            matches = search_prospects(query, None, top_k=10 if filtered else 20, understand=use_filters,
+                                       vector=query_vec)
+            if not matches:
+                st.warning("Aucun prospect trouvé.")
+                st.stop()
+            if filtered and parsed.accepts(matches[0].metadata):
+                st.caption(f"🔎 Filtres déduits de la question : {parsed.describe()} "
+                           f"(décocher « {FILTERS_LABEL} » pour les retirer)")
+
+            # Contexte pour Claude : sources distinctes, sous budget de tokens
+            ctx = build_context(matches, PROSPECT_FORMAT)
+            prospects: List[dict] = ctx.sources
+            context = ctx.text
+
+            chat = init_claude()
+            from langchain.prompts import ChatPromptTemplate
+            # Nouveau prompt SalesBot détaillé
+            prompt = ChatPromptTemplate.from_messages([
+                (
+                    "system",
+                    """Tu es SalesBot, un consultant commercial senior expert en prospection B2B et analyse de données CRM.
 
 🎯 **MISSION** : Analyser les données prospects et fournir des recommandations commerciales basées exclusivement sur les sources fournies.
 
@@ -142,31 +189,24 @@ if submitted and query.strip():
 - Recommandations sans citation de source
 - Analyses qualitatives sans métriques
 - Hypothèses ou suppositions personnelles"""
-            ),
-            (
-                "human",
-                f"""📊 **DONNÉES PROSPECTS À ANALYSER** :\n{context}\n\n❓ **QUESTION COMMERCIALE** : {query}\n\n🎯 **OBJECTIF** : Fournis une analyse RAG complète selon la méthodologie ci-dessus, en te basant EXCLUSIVEMENT sur les données fournies."""
-            )
-        ])
-        answer = chat.invoke(prompt.format_messages()).content
-
-    # --- Affichage ---
-    st.subheader("🤖 Analyse IA")
-    st.markdown(answer)
-
-    st.subheader("🔗 Sources")
-    for p in prospects:
-        st.markdown(f"- {p['tag']} {p.get('entreprise','N/A')} [↗]({airtable_url(p['airtable_id'])})")
-
-    st.subheader("📋 Prospects")
-    df = pd.DataFrame(display_rows)
-    st.dataframe(df, use_container_width=True)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_bytes  = df.to_csv(index=False).encode("utf-8")
-    json_bytes = df.to_json(orient="records", force_ascii=False, indent=2).encode("utf-8")
-    col1, col2 = st.columns(2)
-    col1.download_button("⬇️ Export CSV",  csv_bytes,  f"prospects_{timestamp}.csv",  "text/csv")
-    col2.download_button("⬇️ Export JSON", json_bytes, f"prospects_{timestamp}.json","application/json")
+                ),
+                (
+                    "human",
+                    f"""📊 **DONNÉES PROSPECTS À ANALYSER** :\n{context}\n\n❓ **QUESTION COMMERCIALE** : {query}\n\n🎯 **OBJECTIF** : Fournis une analyse RAG complète selon la méthodologie ci-dessus, en te basant EXCLUSIVEMENT sur les données fournies."""
+                )
+            ])
+            messages = prompt.format_messages()
+
+        # Mêmes sources qu'une question voisine déjà traitée : réponse réutilisée
+        source_ids = ctx.ids
+        if answer_cache:
+            cached = answer_cache.lookup(PINECONE_INDEX_NAME, query_vec, scope=scope, source_ids=source_ids)
+
+        # --- Affichage ---
+        answer = show_results(prospects, cached=cached,
+                              stream=stream_answer(messages, chat, label=f"app_smart q={query[:60]!r}"),
+                              ctx_summary=ctx.summary())
+        if answer_cache and cached is None:
+            answer_cache.store(PINECONE_INDEX_NAME, query, query_vec, source_ids, answer, prospects, scope=scope)
 else:
     st.info("Entrez votre question puis cliquez sur le bouton.")
@@ -0,0 +1,194 @@
+"""async_retrieval.py – Recherche asyncio : formulations, index et filtres en parallèle.
+
+``retrieve`` exécute un lot de sous-requêtes (formulation × domaine × filtre)
+de façon concurrente et fusionne les résultats par domaine :
+- chaque formulation n'est embeddée qu'une fois, même si elle interroge
+  plusieurs index, et seulement si une de ses sous-requêtes manque le cache ;
+- chaque sous-requête enchaîne embedding puis requête d'index dès que son
+  vecteur est prêt : les embeddings des formulations suivantes se recouvrent
+  avec les recherches des premières ;
+- les fiches sont fusionnées par ``airtable_id`` (meilleur score conservé).
+
+Les clients Bedrock et Pinecone restent synchrones (pools partagés de
+``core``) : les appels bloquants passent par un pool de threads dédié.
+
+``candidates_for_prospects`` s'appuie dessus pour le mode croisé du tableau
+de bord (« quels candidats pour le besoin de ce prospect ? ») en deux tours
+parallèles au lieu d'une recherche par prospect.
+
+Variables d'environnement :
+    RETRIEVAL_CONCURRENCY   appels bloquants simultanés (défaut 16)
+    PROSPECT_NEED_CHARS     caractères du besoin prospect utilisés comme requête (défaut 500)
+"""
+from __future__ import annotations
+import asyncio, contextvars, functools, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import core
+from core import DOMAIN_INDEXES, RecordMatch, search_key, search_vector
+from state import resolve_index
+from telemetry import span
+
+RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", "16"))
+PROSPECT_NEED_CHARS   = int(os.getenv("PROSPECT_NEED_CHARS", "500"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(RETRIEVAL_CONCURRENCY, thread_name_prefix="retrieval")
+        return _executor
+
+
+async def _run(func, *args):
+    """Exécute un appel bloquant dans le pool de recherche (contexte de trace propagé)."""
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(_pool(), call)
+
+
+def _embed(query: str) -> List[float]:
+    with span("embed", chars=len(query)):
+        return core.init_embedder().embed_query(query)
+
+
+def _open_index(domain: str):
+    # Initialiseurs de ``core`` résolus à l'appel (doublures de benchmarks.fakes)
+    if domain == "prospects":
+        return core.init_pinecone()
+    if domain == "candidates":
+        return core.init_candidate_index()
+    return core.connections().index(DOMAIN_INDEXES[domain])
+
+
+@dataclass(frozen=True)
+class SubQuery:
+    domain: str
+    query: str
+    filter: Optional[dict] = None
+
+
+def merge_records(results: Iterable[List[RecordMatch]], top_k: int) -> List[RecordMatch]:
+    """Fusionne des listes de fiches : une entrée par ``airtable_id``, meilleur score."""
+    best: Dict[str, RecordMatch] = {}
+    for records in results:
+        for r in records:
+            key = r.metadata.get("airtable_id") or r.id
+            if key not in best or r.score > best[key].score:
+                best[key] = r
+    return sorted(best.values(), key=lambda r: r.score, reverse=True)[:top_k]
+
+
+async def run_subqueries(subqueries: Sequence[SubQuery], top_k: int = 10, alpha: Optional[float] = None,
+                         vectors: Optional[Dict[str, List[float]]] = None) -> List[List[RecordMatch]]:
+    """Exécute les sous-requêtes en parallèle ; résultats dans l'ordre d'entrée.
+
+    ``vectors`` : embeddings déjà calculés, par formulation.
+    """
+    cache = core.init_retrieval_cache()
+    embeddings: Dict[str, asyncio.Future] = {}
+    for query, vec in (vectors or {}).items():
+        embeddings[query] = asyncio.get_running_loop().create_future()
+        embeddings[query].set_result(vec)
+
+    def embedding(query: str) -> asyncio.Future:
+        # Une seule tâche d'embedding par formulation, partagée entre index
+        if query not in embeddings:
+            embeddings[query] = asyncio.ensure_future(_run(_embed, query))
+        return embeddings[query]
+
+    async def one(sub: SubQuery) -> List[RecordMatch]:
+        index_name = resolve_index(DOMAIN_INDEXES[sub.domain])
+        key = None
+        with span("search", index=index_name, top_k=top_k, filtered=bool(sub.filter)) as sp:
+            if cache is not None:
+                key = search_key(cache, index_name, sub.query, top_k, sub.filter, alpha)
+                hit = cache.get(index_name, key)
+                sp.set(cache_hit=hit is not None)
+                if hit is not None:
+                    return hit
+            vector, index = await asyncio.gather(embedding(sub.query), _run(_open_index, sub.domain))
+            records = await _run(search_vector, index, index_name, sub.query, vector, top_k, sub.filter, alpha)
+            if cache is not None:
+                cache.put(index_name, key, records)
+            return records
+
+    return list(await asyncio.gather(*(one(sub) for sub in subqueries)))
+
+
+async def retrieve(queries: Union[str, Sequence[str]], domains: Sequence[str] = ("prospects",),
+                   filters: Optional[Dict[str, Sequence[Optional[dict]]]] = None, top_k: int = 10,
+                   alpha: Optional[float] = None, understand: bool = True,
+                   vectors: Optional[Dict[str, List[float]]] = None) -> Dict[str, List[RecordMatch]]:
+    """Recherche concurrente de toutes les formulations dans tous les domaines.
+
+    ``filters`` : par domaine, liste de filtres Pinecone ; une sous-requête par
+    filtre (p. ex. un ``$eq`` par secteur), résultats fusionnés. Sans filtre
+    pour un domaine, une seule sous-requête non filtrée par formulation.
+    ``understand`` : filtres déduits de chaque formulation ajoutés (cf.
+    ``core.understand_query``), abandonnés s'ils ne donnent aucun résultat.
+    """
+    queries = [queries] if isinstance(queries, str) else list(dict.fromkeys(queries))
+    subqueries: List[SubQuery] = []
+    fallbacks: Dict[int, SubQuery] = {}
+    for domain in domains:
+        for query in queries:
+            parsed = core.understand_query(DOMAIN_INDEXES[domain], query) if understand else None
+            for flt in (filters or {}).get(domain) or [None]:
+                if parsed is not None and parsed.filter:
+                    fallbacks[len(subqueries)] = SubQuery(domain, query, flt or None)
+                    subqueries.append(SubQuery(domain, query, {**parsed.filter, **(flt or {})}))
+                else:
+                    subqueries.append(SubQuery(domain, query, flt or None))
+    results = await run_subqueries(subqueries, top_k, alpha, vectors)
+    empty = [i for i in fallbacks if not results[i]]
+    if empty:
+        for i, records in zip(empty, await run_subqueries([fallbacks[i] for i in empty], top_k, alpha, vectors)):
+            results[i] = records
+    merged: Dict[str, List[List[RecordMatch]]] = {domain: [] for domain in domains}
+    for sub, records in zip(subqueries, results):
+        merged[sub.domain].append(records)
+    return {domain: merge_records(lists, top_k) for domain, lists in merged.items()}
+
+
+# ── mode croisé prospects → candidats ─────────────────────────────────
+def prospect_need(md: dict, max_chars: int = PROSPECT_NEED_CHARS) -> str:
+    """Requête candidats tirée d'une fiche prospect (secteur + notes)."""
+    parts = [str(md[k]) for k in ("secteur", "notes") if md.get(k)] or [str(md.get("text", ""))]
+    return " ".join(" ".join(parts).split())[:max_chars]
+
+
+@dataclass
+class ProspectCandidates:
+    prospects: List[RecordMatch]
+    candidates: List[RecordMatch]                                           # fusion de tous les tours
+    by_prospect: Dict[str, List[RecordMatch]] = field(default_factory=dict)  # airtable_id → candidats
+
+
+async def candidates_for_prospects(query: str, prospect_filters: Optional[Sequence[dict]] = None,
+                                   prospects_k: int = 3, top_k: int = 10,
+                                   alpha: Optional[float] = None,
+                                   query_vec: Optional[List[float]] = None) -> ProspectCandidates:
+    """Prospects pertinents pour ``query`` et candidats adaptés à leurs besoins.
+
+    Tour 1 : prospects et candidats pour la question, en parallèle.
+    Tour 2 : une recherche candidats par besoin des ``prospects_k`` meilleurs
+    prospects, en parallèle. La latence est celle de deux recherches, quel
+    que soit ``prospects_k``.
+    """
+    first = await retrieve(query, ("prospects", "candidates"),
+                           filters={"prospects": prospect_filters} if prospect_filters else None,
+                           top_k=top_k, alpha=alpha, vectors={query: query_vec} if query_vec else None)
+    prospects = first["prospects"]
+    needs = {p.metadata.get("airtable_id") or p.id: prospect_need(p.metadata) for p in prospects[:prospects_k]}
+    needs = {pid: need for pid, need in needs.items() if need}
+    results = await run_subqueries([SubQuery("candidates", need) for need in needs.values()], top_k, alpha)
+    by_prospect = dict(zip(needs, results))
+    return ProspectCandidates(prospects=prospects,
+                              candidates=merge_records([*by_prospect.values(), first["candidates"]], top_k),
+                              by_prospect=by_prospect)
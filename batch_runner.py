@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+batch_runner.py – Questions en lot, sans Streamlit : recherche + analyse Claude.
+
+Entrée JSONL, une question par ligne :
+    {"id": "q1", "domain": "prospects", "query": "prospects fintech à relancer",
+     "filters": {"statut": "À relancer"}, "top_k": 10}
+``domain`` : ``prospects`` (défaut), ``candidates`` ou ``match`` (candidats pour
+les besoins des prospects retrouvés, comme le mode « Prospect → Candidats ») ;
+``id`` : numéro de ligne par défaut ; ``filters`` : valeurs de métadonnées
+(une valeur ou une liste), comme les sélections de l'UI.
+
+Exécution concurrente :
+- ``--concurrency`` questions en vol au plus (recherches des formulations et
+  index en parallèle, cf. ``async_retrieval``) ;
+- ``--rps`` questions démarrées par seconde, ``--claude-rpm`` appels Claude
+  par minute ; le débit Titan reste borné par BEDROCK_EMBED_RPS ;
+- chaque résultat est écrit dès qu'il est prêt (JSONL ou CSV selon
+  l'extension de ``--out``) ; relancé sur le même fichier, le runner reprend
+  où il s'était arrêté (questions déjà ``ok`` ignorées, erreurs rejouées).
+
+Pas de cache de réponses ici : un rapport reflète l'état courant des index.
+
+``--stub`` remplace Bedrock, Pinecone et Claude par les doublures de
+``benchmarks/fakes.py`` (index synthétiques, latences configurables) : mesure
+du débit sans quota, p. ex. avec ``--synthetic 1000``.
+
+Usage :
+    python batch_runner.py questions.jsonl --out rapport.csv
+    python batch_runner.py questions.jsonl --out rapport.jsonl --concurrency 8 --claude-rpm 50
+    python batch_runner.py --stub --synthetic 500 --concurrency 32 --out bench_batch.jsonl --restart
+"""
+from __future__ import annotations
+import argparse, asyncio, contextlib, csv, json, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import core
+from analysis import DOMAINS, prepare
+from core import stream_answer
+from telemetry import telemetry, trace
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_CLAUDE_RPM  = float(os.getenv("BATCH_CLAUDE_RPM", "0"))
+
+COLUMNS = ("id", "domain", "query", "status", "error", "records", "sources", "answer",
+           "retrieval_ms", "analysis_ms", "total_ms", "finished_at")
+
+
+@dataclass
+class Question:
+    id: str
+    query: str
+    domain: str = "prospects"
+    filters: Dict[str, object] = field(default_factory=dict)
+    top_k: Optional[int] = None
+
+
+def load_questions(path: str) -> List[Question]:
+    """Questions du fichier JSONL (lignes vides et ``#`` ignorées)."""
+    questions = []
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                obj = json.loads(line)
+                query = obj.get("query") or obj.get("question")
+                domain = obj.get("domain", "prospects")
+                if not query or domain not in DOMAINS:
+                    raise ValueError(f"'query' manquant ou domaine inconnu ({domain})")
+            except (ValueError, AttributeError) as exc:
+                print(f"⚠️  ligne {lineno} ignorée : {exc}")
+                continue
+            questions.append(Question(id=str(obj.get("id") or f"L{lineno}"), query=query, domain=domain,
+                                      filters=obj.get("filters") or {}, top_k=obj.get("top_k")))
+    return questions
+
+
+# ── sortie ────────────────────────────────────────────────────────────
+class ResultWriter:
+    """Résultats ajoutés au fil de l'eau (JSONL ou CSV), relus pour la reprise."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = Path(path)
+        self.csv = self.path.suffix.lower() == ".csv"
+        if restart:
+            self.path.unlink(missing_ok=True)
+        self.done: Set[str] = self._done_ids()
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._fh, fieldnames=COLUMNS) if self.csv else None
+        if self._csv is not None and new:
+            self._csv.writeheader()
+
+    def _done_ids(self) -> Set[str]:
+        if not self.path.exists():
+            return set()
+        with open(self.path, encoding="utf-8", newline="") as fh:
+            if self.csv:
+                rows = list(csv.DictReader(fh))
+            else:
+                rows = []
+                for line in fh:
+                    with contextlib.suppress(ValueError):
+                        rows.append(json.loads(line))   # dernière ligne tronquée par un arrêt brutal
+        return {row["id"] for row in rows if row.get("status") == "ok"}
+
+    def write(self, row: dict) -> None:
+        if self._csv is not None:
+            self._csv.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                                for k, v in row.items()})
+        else:
+            self._fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ── limites ───────────────────────────────────────────────────────────
+class RateLimiter:
+    """Au plus ``rate`` acquisitions par seconde, régulièrement espacées (asyncio)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# ── exécution ─────────────────────────────────────────────────────────
+async def run_question(q: Question, args, claude_limiter: RateLimiter) -> dict:
+    row = {"id": q.id, "domain": q.domain, "query": q.query, "status": "ok", "error": "", "records": 0,
+           "sources": [], "answer": "", "retrieval_ms": None, "analysis_ms": None, "total_ms": None}
+    start = time.perf_counter()
+    try:
+        with trace(f"batch/{q.domain}", query=q.query[:80]):
+            analysis = await prepare(q.domain, q.query, q.filters, q.top_k or args.top_k, args.prospects_k)
+            row["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            row["records"], row["sources"] = analysis.records, analysis.sources
+            if not row["records"]:
+                row["status"] = "empty"
+            elif not args.no_analysis:
+                chat = core.init_claude()   # résolu à l'appel (doublures de --stub)
+                await claude_limiter.acquire()
+                t = time.perf_counter()
+                row["answer"] = await asyncio.to_thread(
+                    lambda: "".join(stream_answer(analysis.messages, chat, label=f"batch q={q.id}")))
+                row["analysis_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    except Exception as exc:
+        row["status"], row["error"] = "error", f"{type(exc).__name__}: {exc}"
+    row["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    row["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return row
+
+
+async def run_batch(questions: List[Question], writer: ResultWriter, args) -> List[dict]:
+    """Exécute les questions avec ``args.concurrency`` workers ; résultats dans l'ordre de fin."""
+    # Générations Claude (bloquantes) : un thread par question en vol, quel que soit le nombre de CPU
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max(1, args.concurrency), thread_name_prefix="batch"))
+    pending: asyncio.Queue = asyncio.Queue()
+    for q in questions:
+        pending.put_nowait(q)
+    start_limiter = RateLimiter(args.rps)
+    claude_limiter = RateLimiter(args.claude_rpm / 60)
+    rows: List[dict] = []
+
+    async def worker() -> None:
+        while True:
+            try:
+                q = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await start_limiter.acquire()
+            row = await run_question(q, args, claude_limiter)
+            writer.write(row)
+            rows.append(row)
+            if not args.quiet:
+                icon = {"ok": "✅", "empty": "⚪", "error": "❌"}[row["status"]]
+                print(f"{icon} [{len(rows)}/{len(questions)}] {q.id} {row['total_ms'] / 1000:.2f} s"
+                      + (f" – {row['error']}" if row["error"] else ""))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    return rows
+
+
+def report(rows: List[dict], seconds: float) -> None:
+    if not rows:
+        return
+    counts = {status: sum(r["status"] == status for r in rows) for status in ("ok", "empty", "error")}
+    latencies = sorted(r["total_ms"] for r in rows)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"\n📊 {len(rows)} questions en {seconds:.1f} s ({len(rows) / seconds:.2f} q/s) – "
+          f"{counts['ok']} ok, {counts['empty']} sans résultat, {counts['error']} en erreur")
+    print(f"   latence : p50 {statistics.median(latencies):.0f} ms, p95 {p95:.0f} ms")
+    for s in telemetry.summary():
+        if not s["stage"].startswith("batch/"):
+            print(f"   {s['stage']:<14} n={s['count']:<6} p50 {s['p50_ms']:>8.1f} ms  p95 {s['p95_ms']:>8.1f} ms")
+
+
+@contextlib.contextmanager
+def stub_backends(args):
+    """Bedrock, Pinecone et Claude simulés (``benchmarks/fakes.py``)."""
+    from benchmarks.fakes import stubbed_core
+    print(f"🧪 Doublures : {args.stub_records} fiches par domaine, latence index {args.stub_latency * 1000:.0f} ms")
+    with stubbed_core(core, args.stub_records, args.stub_latency, args.stub_ttft):
+        yield
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", nargs="?", help="fichier JSONL de questions")
+    parser.add_argument("--out", default="batch_results.jsonl", help="résultats (.jsonl ou .csv)")
+    parser.add_argument("--restart", action="store_true", help="ignorer les résultats existants")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions en vol")
+    parser.add_argument("--rps", type=float, default=0, help="questions démarrées par seconde (0 = illimité)")
+    parser.add_argument("--claude-rpm", type=float, default=BATCH_CLAUDE_RPM, help="appels Claude par minute")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--prospects-k", type=int, default=3, help="prospects analysés (domaine match)")
+    parser.add_argument("--no-analysis", action="store_true", help="recherche seule, sans Claude")
+    parser.add_argument("--limit", type=int, help="nombre max de questions traitées")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--stub", action="store_true", help="Bedrock / Pinecone / Claude simulés")
+    parser.add_argument("--synthetic", type=int, help="N questions synthétiques au lieu du fichier")
+    parser.add_argument("--stub-records", type=int, default=1000)
+    parser.add_argument("--stub-latency", type=float, default=0.02, help="latence Titan et index simulée (s)")
+    parser.add_argument("--stub-ttft", type=float, default=0.3, help="TTFT Claude simulé (s)")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        from benchmarks.fakes import synthetic_questions
+        questions = [Question(**q) for q in synthetic_questions(args.synthetic)]
+    elif args.questions:
+        questions = load_questions(args.questions)
+    else:
+        parser.error("fichier de questions ou --synthetic requis")
+    if not args.stub and not args.no_analysis and not core.ANTHROPIC_API_KEY:
+        sys.exit("❌ ANTHROPIC_API_KEY manquante (ou --no-analysis pour la recherche seule)")
+
+    writer = ResultWriter(args.out, restart=args.restart)
+    todo = [q for q in questions if q.id not in writer.done]
+    if len(todo) < len(questions):
+        print(f"↪️  Reprise : {len(questions) - len(todo)} questions déjà traitées dans {args.out}")
+    if args.limit is not None:
+        todo = todo[:args.limit]
+    print(f"🚀 {len(todo)} questions, {args.concurrency} en parallèle → {args.out}")
+
+    start = time.perf_counter()
+    try:
+        with stub_backends(args) if args.stub else contextlib.nullcontext():
+            rows = asyncio.run(run_batch(todo, writer, args))
+    finally:
+        writer.close()
+    report(rows, time.perf_counter() - start)
+    sys.exit(1 if any(r["status"] == "error" for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks hors-ligne (Airtable, Bedrock et Pinecone simulés localement)."""
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_api.py – Test de charge local de l'API HTTP (``api.py``).
+
+Lance ``api.py --stub`` dans un processus fils (Bedrock, Pinecone et Claude
+simulés) ou vise une instance existante (``--url``), puis envoie ``--requests``
+requêtes avec ``--concurrency`` clients simultanés :
+    search    POST /search/prospects et /search/candidates
+    analyze   POST /analyze, réponse NDJSON consommée en flux
+    mixed     les deux (une analyse pour trois recherches)
+``--duplicates`` : part des requêtes tirées d'un petit ensemble de questions
+« chaudes » ; identiques et simultanées, elles sont coalescées par l'API.
+
+Mesures : requêtes/s, latence p50 / p95 (ms), premier fragment de réponse
+pour /analyze (TTFB), codes HTTP, requêtes coalescées (``/health``).
+
+Usage :
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --endpoint analyze --requests 200 --concurrency 50 --duplicates 0.8
+    python -m benchmarks.bench_api --url http://localhost:8000 --endpoint search --out bench_api.json
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, statistics, subprocess, sys, time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from benchmarks.fakes import synthetic_questions
+
+# Questions « chaudes » (tirées par --duplicates)
+HOT_SET = 5
+
+
+def build_requests(n: int, endpoint: str, duplicates: float, seed: int = 11) -> List[tuple]:
+    """(chemin, corps JSON) des ``n`` requêtes."""
+    rng = random.Random(seed)
+    pool = synthetic_questions(max(n, HOT_SET), seed=seed)
+    hot = pool[:HOT_SET]
+    out = []
+    for i in range(n):
+        q = rng.choice(hot) if rng.random() < duplicates else pool[i % len(pool)]
+        analyze = endpoint == "analyze" or (endpoint == "mixed" and i % 4 == 0)
+        if analyze:
+            out.append(("/analyze", {"domain": q["domain"], "query": q["query"], "filters": q["filters"]}))
+        else:
+            domain = "candidates" if q["domain"] == "candidates" else "prospects"
+            out.append((f"/search/{domain}", {"query": q["query"], "filters": q["filters"]}))
+    return out
+
+
+async def run_load(url: str, requests: List[tuple], concurrency: int, api_key: str) -> Dict[str, object]:
+    import httpx
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+    latencies: Dict[str, List[float]] = {"search": [], "analyze": [], "ttfb": []}
+    statuses: Counter = Counter()
+    headers = {"X-API-Key": api_key} if api_key else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, headers=headers, timeout=120, limits=limits) as client:
+        async def worker() -> None:
+            while not queue.empty():
+                path, body = queue.get_nowait()
+                kind = "analyze" if path == "/analyze" else "search"
+                start = time.perf_counter()
+                try:
+                    async with client.stream("POST", path, json=body) as resp:
+                        first = None
+                        async for _ in resp.aiter_raw():
+                            first = first or time.perf_counter()
+                    status = str(resp.status_code)
+                except httpx.HTTPError as exc:
+                    status, first = type(exc).__name__, None
+                statuses[status] += 1
+                if status == "200":
+                    latencies[kind].append(time.perf_counter() - start)
+                    if kind == "analyze" and first is not None:
+                        latencies["ttfb"].append(first - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+        health = (await client.get("/health")).json()
+    return {"seconds": seconds, "latencies": latencies, "statuses": dict(statuses), "health": health}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"n": 0}
+    values = sorted(values)
+    return {"n": len(values), "p50_ms": round(statistics.median(values) * 1000, 1),
+            "p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))] * 1000, 1)}
+
+
+def wait_ready(url: str, proc: Optional[subprocess.Popen], timeout: float = 60) -> None:
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            sys.exit(f"❌ api.py s'est arrêté (code {proc.returncode})")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    sys.exit(f"❌ {url}/health ne répond pas après {timeout:.0f} s")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="API existante (défaut : api.py --stub lancé ici)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", choices=("search", "analyze", "mixed"), default="mixed")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicates", type=float, default=0.5, help="part des requêtes « chaudes » (0-1)")
+    parser.add_argument("--stub-records", type=int, default=1000)
+    parser.add_argument("--stub-latency", type=float, default=0.02)
+    parser.add_argument("--stub-ttft", type=float, default=0.3)
+    parser.add_argument("--out", help="résultats JSON")
+    args = parser.parse_args(argv)
+
+    proc = None
+    url = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    if not args.url:
+        env = {**os.environ, "API_STUB_RECORDS": str(args.stub_records),
+               "API_STUB_LATENCY": str(args.stub_latency), "API_STUB_TTFT": str(args.stub_ttft),
+               "TELEMETRY_LOG": "0"}
+        proc = subprocess.Popen([sys.executable, str(PROJECT_DIR / "api.py"), "--stub", "--port", str(args.port)],
+                                cwd=PROJECT_DIR, env=env)
+    try:
+        wait_ready(url, proc)
+        requests = build_requests(args.requests, args.endpoint, args.duplicates)
+        print(f"🚀 {len(requests)} requêtes {args.endpoint}, {args.concurrency} clients, "
+              f"{args.duplicates:.0%} chaudes → {url}")
+        result = asyncio.run(run_load(url, requests, args.concurrency, os.getenv("API_KEY", "")))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    seconds, health = result["seconds"], result["health"]
+    summary = {kind: percentiles(values) for kind, values in result["latencies"].items()}
+    print(f"\n📊 {len(requests)} requêtes en {seconds:.1f} s ({len(requests) / seconds:.1f} req/s) – "
+          f"codes {result['statuses']}")
+    for kind, stats in summary.items():
+        if stats["n"]:
+            print(f"   {kind:<8} n={stats['n']:<5} p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms")
+    print(f"   coalescées : recherche {health['search']['coalesced']}/{health['search']['calls']}, "
+          f"analyse {health['analyze']['coalesced']}/{health['analyze']['calls']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"args": vars(args), "seconds": seconds, "statuses": result["statuses"],
+                       "latency": summary, "health": health}, fh, indent=2, ensure_ascii=False)
+        print(f"💾 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
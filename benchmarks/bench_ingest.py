@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_ingest.py – Benchmark hors-ligne de l'ingestion et de la recherche.
+
+Étapes mesurées, pour chaque domaine (prospects, candidats) et chaque volume :
+    build     construction des Documents (``build_documents``)
+    embed     embeddings via ``BedrockEmbeddingEngine`` + faux client Bedrock
+    upsert    écriture via ``UpsertWriter`` dans un index en mémoire
+    pipeline  pipeline complet en flux (pages Airtable → upsert)
+    search    ``core.search_prospects`` / ``core.search_candidates`` sur l'index
+              rempli (chunks agrégés par fiche)
+
+Chaque ligne de résultat contient records/s, latences p50/p95 (ms) et pic
+mémoire (Mo, tracemalloc). Les résultats sont écrits en JSON pour comparer deux
+versions (``--compare ancien.json``).
+
+Usage :
+    python -m benchmarks.bench_ingest                       # 1k et 10k
+    python -m benchmarks.bench_ingest --scales 1000,10000,100000 --out bench.json
+    python -m benchmarks.bench_ingest --compare bench_v1.json
+"""
+from __future__ import annotations
+import argparse, json, os, platform, subprocess, sys, threading, time, tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from benchmarks.fakes import FakeBedrockClient, FakeTable, InMemoryIndex, patched_core, synthetic_records
+from embeddings import BedrockEmbeddingEngine
+from incremental import IngestManifest, vector_ids
+from ingest_engine import DOMAINS, build_documents, to_vector
+from ingest_pipeline import run_pipeline
+from upsert_writer import UpsertWriter
+
+QUERIES = {
+    "prospects": ["prospects fintech à contacter cette semaine", "clients santé avec budget élevé",
+                  "relance démo plateforme sécurité", "Société 42", "migration cloud en négociation"],
+    "candidates": ["développeur Python disponible immédiatement", "data engineer Spark à Lyon",
+                   "profil DevOps Kubernetes AWS", "Candidat 42", "product manager remote 2 mois"],
+}
+
+
+# ── mesure ────────────────────────────────────────────────────────────
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class Timings:
+    """Collecte thread-safe de durées unitaires (en secondes)."""
+
+    def __init__(self):
+        self.values: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.values.append(seconds)
+
+
+@contextmanager
+def measure(track_memory: bool):
+    """Mesure la durée et, optionnellement, le pic mémoire Python du bloc."""
+    out: Dict[str, float] = {}
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield out
+    finally:
+        out["seconds"] = time.perf_counter() - start
+        if track_memory:
+            out["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+
+
+class TimedClient(FakeBedrockClient):
+    def __init__(self, timings: Timings, **kwargs):
+        super().__init__(**kwargs)
+        self.timings = timings
+
+    def invoke_model(self, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().invoke_model(**kwargs)
+        finally:
+            self.timings.add(time.perf_counter() - start)
+
+
+class TimedIndex(InMemoryIndex):
+    def __init__(self, timings: Timings, **kwargs):
+        super().__init__(**kwargs)
+        self.timings = timings
+
+    def upsert(self, vectors, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().upsert(vectors, **kwargs)
+        finally:
+            self.timings.add(time.perf_counter() - start)
+
+
+def row(bench: str, domain: str, scale: int, items: int, m: dict, timings: Optional[Timings] = None, **extra) -> dict:
+    lat = [t * 1000 for t in (timings.values if timings else [])]
+    result = {
+        "bench": bench, "domain": domain, "scale": scale, "items": items,
+        "seconds": round(m["seconds"], 4),
+        "records_per_s": round(items / m["seconds"], 1) if m["seconds"] else None,
+        "p50_ms": round(percentile(lat, 50), 3) if lat else None,
+        "p95_ms": round(percentile(lat, 95), 3) if lat else None,
+        "peak_mb": round(m["peak_mb"], 1) if "peak_mb" in m else None,
+    }
+    result.update(extra)
+    return result
+
+
+# ── benchmarks ────────────────────────────────────────────────────────
+def bench_domain(domain: str, scale: int, args) -> List[dict]:
+    schema = DOMAINS[domain]
+    records = synthetic_records(domain, scale)
+    results = []
+
+    with measure(args.memory) as m:
+        docs = build_documents(schema, records)
+    results.append(row("build", domain, scale, len(records), m, docs=len(docs)))
+
+    sample = docs[:args.embed_limit] if args.embed_limit else docs
+    timings = Timings()
+    engine = BedrockEmbeddingEngine(TimedClient(timings, latency=args.embed_latency), dimensions=args.dim,
+                                    concurrency=args.concurrency, rate_limit=0)
+    with measure(args.memory) as m:
+        vecs = engine.embed_documents([d.page_content for d in sample])
+    results.append(row("embed", domain, scale, len(sample), m, timings, concurrency=args.concurrency))
+
+    timings = Timings()
+    index = TimedIndex(timings, dimension=args.dim, latency=args.upsert_latency)
+    ids = vector_ids(sample)
+    writer = UpsertWriter(index)
+    with measure(args.memory) as m:
+        report = writer.write(to_vector(schema, vid, d, v) for vid, d, v in zip(ids, sample, vecs))
+    writer.close()
+    results.append(row("upsert", domain, scale, report.upserted, m, timings, batches=report.batches))
+
+    # Pipeline complet sur le même échantillon d'enregistrements
+    rec_sample = records[:args.embed_limit] if args.embed_limit else records
+    timings = Timings()
+    index = TimedIndex(timings, dimension=args.dim, latency=args.upsert_latency)
+    manifest = IngestManifest(f"bench_{domain}")
+    writer = UpsertWriter(index)
+    with measure(args.memory) as m:
+        res = run_pipeline(FakeTable(rec_sample, latency=args.airtable_latency).iterate(), manifest,
+                           lambda recs: build_documents(schema, recs), engine, writer,
+                           to_vector=lambda vid, d, v: to_vector(schema, vid, d, v), force=True)
+    writer.close()
+    results.append(row("pipeline", domain, scale, len(rec_sample), m, timings,
+                       first_vector_s=round(res.first_vector_s or 0, 4), vectors=res.docs))
+    engine.close()
+
+    results.append(bench_search(domain, scale, index, args))
+    return results
+
+
+def bench_search(domain: str, scale: int, index: InMemoryIndex, args) -> dict:
+    import core
+
+    timings = Timings()
+    engine = BedrockEmbeddingEngine(FakeBedrockClient(latency=args.embed_latency), dimensions=args.dim,
+                                    rate_limit=0)
+    queries = QUERIES[domain] * max(1, args.queries // len(QUERIES[domain]))
+    search = core.search_prospects if domain == "prospects" else core.search_candidates
+    records = 0
+    with patched_core(core, engine, index, candidate_index=index):
+        with measure(args.memory) as m:
+            for q in queries:
+                start = time.perf_counter()
+                records += len(search(q, top_k=10))
+                timings.add(time.perf_counter() - start)
+    engine.close()
+    return row("search", domain, scale, len(queries), m, timings,
+               records_per_query=round(records / len(queries), 1))
+
+
+# ── sortie ────────────────────────────────────────────────────────────
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: List[dict], baseline: Optional[Dict[tuple, dict]] = None) -> None:
+    header = f"{'bench':<9}{'domain':<12}{'scale':>8}{'items':>8}{'s':>9}{'rec/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'peak Mo':>9}"
+    if baseline:
+        header += f"{'Δ rec/s':>10}"
+    print(header)
+    for r in results:
+        line = (f"{r['bench']:<9}{r['domain']:<12}{r['scale']:>8}{r['items']:>8}{r['seconds']:>9.3f}"
+                f"{r['records_per_s'] or 0:>11.1f}{r['p50_ms'] or 0:>9.2f}{r['p95_ms'] or 0:>9.2f}"
+                f"{r['peak_mb'] or 0:>9.1f}")
+        if baseline:
+            old = baseline.get((r["bench"], r["domain"], r["scale"]))
+            if old and old.get("records_per_s") and r.get("records_per_s"):
+                line += f"{(r['records_per_s'] / old['records_per_s'] - 1) * 100:>+9.1f}%"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1000,10000", help="volumes d'enregistrements (ex. 1000,10000,100000)")
+    parser.add_argument("--domains", default="prospects,candidates")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--embed-latency", type=float, default=0.002, help="latence simulée Bedrock (s)")
+    parser.add_argument("--upsert-latency", type=float, default=0.005, help="latence simulée Pinecone (s)")
+    parser.add_argument("--airtable-latency", type=float, default=0.01, help="latence simulée par page Airtable (s)")
+    parser.add_argument("--embed-limit", type=int, default=5000, help="docs max embeddés par volume (0 = tous)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="désactive tracemalloc")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="fichier JSON d'une exécution précédente")
+    args = parser.parse_args(argv)
+
+    results: List[dict] = []
+    for scale in (int(s) for s in args.scales.split(",")):
+        for domain in args.domains.split(","):
+            print(f"… {domain} × {scale}", file=sys.stderr)
+            results.extend(bench_domain(domain, scale, args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = {(r["bench"], r["domain"], r["scale"]): r for r in json.load(fh)["results"]}
+    print_table(results, baseline)
+
+    payload = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "git": git_revision(),
+                 "python": platform.python_version(), "cpu_count": os.cpu_count(),
+                 "args": vars(args)},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
+    print(f"\nRésultats écrits dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
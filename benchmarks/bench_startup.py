@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_startup.py – Démarrage à froid et rerun des interfaces Streamlit.
+
+Pour chaque cible (``core`` et les apps), un processus neuf est lancé avec
+``python -X importtime`` :
+    cold_s     durée du processus complet (interpréteur + imports + 1er rendu)
+    first_s    premier rendu de la page (``streamlit.testing`` AppTest), imports compris
+    rerun_ms   p50 d'un rerun (interaction utilisateur sans recherche)
+    heavy      modules lourds chargés alors qu'aucune recherche n'a eu lieu
+Le profil ``-X importtime`` est agrégé par paquet (temps propre cumulé) pour
+identifier les imports dominants.
+
+Usage :
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --targets app_dashboard --repeat 5 --out startup.json
+    python -m benchmarks.bench_startup --compare startup_v1.json
+"""
+from __future__ import annotations
+import argparse, json, os, statistics, subprocess, sys, time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+TARGETS = ("core", "app_dashboard", "app_smart", "app_recruit")
+HEAVY_MODULES = ("langchain", "langchain_anthropic", "anthropic", "pinecone", "boto3", "pandas", "numpy", "pyairtable")
+
+
+# ── processus enfant ──────────────────────────────────────────────────
+def child(target: str, reruns: int) -> None:
+    start = time.perf_counter()
+    rerun_ms: List[float] = []
+    if target == "core":
+        import core  # noqa: F401
+        first = time.perf_counter() - start
+    else:
+        from streamlit.testing.v1 import AppTest
+        app = AppTest.from_file(str(PROJECT_DIR / f"{target}.py"), default_timeout=120)
+        app.run()
+        first = time.perf_counter() - start
+        if app.exception:
+            raise SystemExit(f"{target} : {app.exception[0].message}")
+        for _ in range(reruns):
+            t = time.perf_counter()
+            app.run()
+            rerun_ms.append((time.perf_counter() - t) * 1000)
+    print(json.dumps({"first_s": first, "rerun_ms": rerun_ms,
+                      "heavy": sorted(m for m in HEAVY_MODULES if m in sys.modules)}))
+
+
+# ── processus parent ──────────────────────────────────────────────────
+def parse_importtime(stderr: str) -> Counter:
+    """Temps propre (µs) cumulé par paquet de premier niveau."""
+    by_package: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, _cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        by_package[name.split(".")[0]] += int(self_us)
+    return by_package
+
+
+def run_target(target: str, reruns: int) -> dict:
+    env = dict(os.environ, STREAMLIT_LOGGER_LEVEL="error")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "benchmarks.bench_startup",
+                           "--child", target, "--reruns", str(reruns)],
+                          cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+    cold = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"{target} : échec du processus enfant\n{proc.stderr[-2000:]}")
+    data = json.loads(proc.stdout.strip().splitlines()[-1])
+    data["cold_s"] = cold
+    data["imports"] = parse_importtime(proc.stderr)
+    return data
+
+
+def bench(target: str, repeat: int, reruns: int, top: int) -> dict:
+    runs = [run_target(target, reruns) for _ in range(repeat)]
+    imports: Counter = sum((r["imports"] for r in runs), Counter())
+    reruns_ms = [ms for r in runs for ms in r["rerun_ms"]]
+    return {
+        "target": target,
+        "cold_s": round(statistics.median(r["cold_s"] for r in runs), 3),
+        "first_s": round(statistics.median(r["first_s"] for r in runs), 3),
+        "rerun_ms": round(statistics.median(reruns_ms), 2) if reruns_ms else None,
+        "heavy": runs[-1]["heavy"],
+        "top_imports_ms": {pkg: round(us / len(runs) / 1000, 1) for pkg, us in imports.most_common(top)},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3, help="processus à froid par cible (médiane)")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns mesurés par processus")
+    parser.add_argument("--top", type=int, default=8, help="paquets affichés dans le profil d'import")
+    parser.add_argument("--out", default="bench_startup.json")
+    parser.add_argument("--compare", help="fichier JSON d'une exécution précédente")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child, args.reruns)
+        return
+
+    baseline: Dict[str, dict] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = {r["target"]: r for r in json.load(fh)["results"]}
+
+    results = []
+    print(f"{'cible':<15}{'froid s':>9}{'1er rendu s':>13}{'rerun ms':>10}  modules lourds chargés")
+    for target in args.targets.split(","):
+        r = bench(target, args.repeat, args.reruns, args.top)
+        results.append(r)
+        line = (f"{r['target']:<15}{r['cold_s']:>9.3f}{r['first_s']:>13.3f}{r['rerun_ms'] or 0:>10.2f}"
+                f"  {', '.join(r['heavy']) or '—'}")
+        old = baseline.get(target)
+        if old:
+            line += f"   (froid {old['cold_s']:.3f} s → {r['cold_s']:.3f} s)"
+        print(line)
+        print("   imports : " + ", ".join(f"{pkg} {ms} ms" for pkg, ms in r["top_imports_ms"].items()))
+
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump({"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0]},
+                   "results": results}, fh, ensure_ascii=False, indent=2)
+    print(f"\nRésultats écrits dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+benchmarks/eval_recall.py – Recall@k des configurations réduites face à la
+référence Titan 1024 dimensions en float32.
+
+Pour chaque configuration ``dimensions:type[:rerank]`` (ex. ``512:int8:4``), le
+corpus est embeddé à la dimension demandée, chargé dans un ``LocalIndex``
+quantifié, puis interrogé ; le recall@k est la part des k résultats de la
+référence retrouvés. Le rapport indique aussi les octets par vecteur et la
+latence de requête, et désigne la configuration la moins coûteuse dont le
+recall dépasse le seuil.
+
+Les questions viennent d'un fichier (une par ligne, ou JSONL avec un champ
+"question") ; à défaut, des extraits de chunks du corpus sont utilisés.
+
+Usage :
+    python -m benchmarks.eval_recall prospects                     # Airtable + Bedrock
+    python -m benchmarks.eval_recall candidates --questions q.jsonl --k 10 --min-recall 0.95
+    python -m benchmarks.eval_recall prospects --fake --records 2000   # hors-ligne
+
+Avec ``--fake``, les vecteurs sont pseudo-aléatoires : seules les variantes de
+quantification à 1024 dimensions sont significatives.
+"""
+from __future__ import annotations
+import argparse, json, random, sys, tempfile, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from benchmarks.bench_ingest import percentile
+from benchmarks.fakes import FakeBedrockClient, synthetic_records
+from embeddings import BedrockEmbeddingEngine, bedrock_client
+from embed_cache import with_cache
+from incremental import vector_ids
+from ingest_engine import AWS_REGION, BEDROCK_MODEL, DOMAINS, IngestEngine, build_documents
+from local_index import LocalIndex
+from quantization import bytes_per_vector
+
+DEFAULT_CONFIGS = ("1024:float32,1024:int8,1024:int8:4,1024:binary:4,1024:binary:10,"
+                   "512:float32,512:int8:4,512:binary:10,256:float32,256:int8:4")
+BASELINE = "1024:float32"
+
+
+def parse_config(text: str) -> dict:
+    parts = text.split(":")
+    return {"name": text, "dimensions": int(parts[0]), "dtype": parts[1] if len(parts) > 1 else "float32",
+            "rerank": int(parts[2]) if len(parts) > 2 else 0}
+
+
+def load_questions(path: Optional[str], docs, n: int, seed: int = 7) -> List[str]:
+    if path:
+        questions = []
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+        return questions[:n] if n else questions
+    # Extraits de 12 mots pris au hasard dans les chunks
+    rng = random.Random(seed)
+    questions = []
+    for doc in rng.sample(docs, min(n, len(docs))):
+        words = doc.page_content.split()
+        start = rng.randrange(max(1, len(words) - 12))
+        questions.append(" ".join(words[start:start + 12]))
+    return questions
+
+
+def embedder_for(dimensions: int, fake: bool):
+    if fake:
+        return BedrockEmbeddingEngine(FakeBedrockClient(latency=0), dimensions=dimensions, rate_limit=0)
+    # Cache disque : les vecteurs de chaque dimension ne sont calculés qu'une fois
+    return with_cache(BedrockEmbeddingEngine(bedrock_client(AWS_REGION), model_id=BEDROCK_MODEL,
+                                             dimensions=dimensions, normalize=True))
+
+
+def evaluate(docs, questions: List[str], configs: List[dict], k: int, fake: bool) -> List[dict]:
+    ids = vector_ids(docs)
+    texts = [d.page_content for d in docs]
+    embedded: Dict[int, tuple] = {}
+    results: List[dict] = []
+    baseline: Optional[List[set]] = None
+    with tempfile.TemporaryDirectory() as root:
+        for cfg in [parse_config(BASELINE)] + configs:
+            dim = cfg["dimensions"]
+            if dim not in embedded:
+                engine = embedder_for(dim, fake)
+                print(f"… embeddings {dim} dim ({len(texts)} chunks, {len(questions)} questions)", file=sys.stderr)
+                embedded[dim] = (engine.embed_documents(texts), [engine.embed_query(q) for q in questions])
+                engine.close()
+            doc_vecs, query_vecs = embedded[dim]
+            index = LocalIndex(cfg["name"].replace(":", "_"), dtype=cfg["dtype"], rerank=cfg["rerank"],
+                               root=Path(root))
+            index.upsert([{"id": vid, "values": v} for vid, v in zip(ids, doc_vecs)])
+            index.flush()
+
+            latencies, found = [], []
+            for qv in query_vecs:
+                start = time.perf_counter()
+                matches = index.query(qv, top_k=k).matches
+                latencies.append((time.perf_counter() - start) * 1000)
+                found.append({m.id for m in matches})
+            if baseline is None:
+                baseline = found
+                continue
+            recall = sum(len(f & b) / max(1, len(b)) for f, b in zip(found, baseline)) / len(found)
+            results.append({**cfg, "recall": round(recall, 4),
+                            "bytes_per_vector": bytes_per_vector(cfg["dtype"], dim, cfg["rerank"]),
+                            "p50_ms": round(percentile(latencies, 50), 3),
+                            "p95_ms": round(percentile(latencies, 95), 3)})
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domain", choices=sorted(DOMAINS))
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="liste dimensions:type[:rerank]")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--questions", help="fichier de questions (texte ou JSONL)")
+    parser.add_argument("--queries", type=int, default=200, help="nombre max de questions")
+    parser.add_argument("--records", type=int, default=0, help="enregistrements max (0 = tous)")
+    parser.add_argument("--fake", action="store_true", help="données synthétiques et faux Bedrock")
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    schema = DOMAINS[args.domain]
+    if args.fake:
+        records = synthetic_records(args.domain, args.records or 2000)
+    else:
+        records = IngestEngine.table(schema).all()
+        records = records[:args.records] if args.records else records
+    docs = build_documents(schema, records)
+    questions = load_questions(args.questions, docs, args.queries)
+    configs = [parse_config(c) for c in args.configs.split(",") if c != BASELINE]
+
+    results = evaluate(docs, questions, configs, args.k, args.fake)
+    print(f"\nRéférence : {BASELINE} ({bytes_per_vector('float32', 1024)} o/vecteur), "
+          f"{len(docs)} chunks, {len(questions)} questions, k={args.k}")
+    print(f"{'config':<16}{'recall@k':>10}{'o/vect':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for r in results:
+        print(f"{r['name']:<16}{r['recall']:>10.3f}{r['bytes_per_vector']:>9}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}")
+
+    eligible = [r for r in results if r["recall"] >= args.min_recall]
+    if eligible:
+        best = min(eligible, key=lambda r: (r["bytes_per_vector"], r["p50_ms"]))
+        print(f"\n✅ Configuration la moins coûteuse avec recall ≥ {args.min_recall} : {best['name']}")
+        print(f"   BEDROCK_EMBED_DIMENSIONS={best['dimensions']} LOCAL_INDEX_DTYPE={best['dtype']} "
+              f"LOCAL_INDEX_RERANK={best['rerank']}")
+    else:
+        print(f"\n⚠️ Aucune configuration n'atteint un recall de {args.min_recall}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"k": args.k, "min_recall": args.min_recall, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""benchmarks/fakes.py – Doublures locales d'Airtable, Bedrock et Pinecone.
+
+Permettent de mesurer l'ingestion et la recherche sans consommer de quota :
+- ``synthetic_records`` / ``FakeTable`` : enregistrements Airtable synthétiques ;
+- ``FakeBedrockClient`` : ``invoke_model`` Titan avec latence configurable et
+  vecteurs déterministes (dérivés du hash du texte) ;
+- ``InMemoryIndex`` : index vectoriel en mémoire compatible avec le sous-ensemble
+  de l'API Pinecone utilisé ici (upsert, query, delete, list, fetch), y compris
+  les vecteurs creux des requêtes hybrides ; ``seeded_index`` le remplit d'un
+  domaine synthétique sans appel d'embedding ;
+- ``FakeChat`` : Claude simulé (``stream`` / ``invoke``) avec TTFT et débit ;
+- ``synthetic_questions`` : questions au format du runner batch ;
+- ``isolated_state`` : ``RAG_STATE_DIR`` temporaire (alias, facettes, BM25,
+  doc store…), utilisé par ``patched_core`` / ``stubbed_core`` pour que les
+  mesures hors-ligne ne lisent pas l'état de production de la machine.
+"""
+from __future__ import annotations
+import contextlib, hashlib, io, json, random, re, sys, tempfile, threading, time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+SECTEURS  = ["Fintech", "Santé", "Retail", "Industrie", "SaaS", "Énergie", "Assurance"]
+STATUTS   = ["Nouveau", "Qualifié", "À relancer", "En négociation", "Perdu", "Client"]
+ROLES     = ["Data Engineer", "Développeur Python", "DevOps", "Product Manager", "Data Scientist"]
+SKILLS    = ["Python", "Spark", "Kubernetes", "AWS", "React", "SQL", "Terraform", "Airflow"]
+VILLES    = ["Paris", "Lyon", "Nantes", "Lille", "Bordeaux", "Remote"]
+DISPOS    = ["Immédiate", "1 mois", "2 mois", "3 mois"]
+WORDS     = ("projet budget équipe besoin solution migration cloud données contrat rendez-vous "
+             "relance démo devis priorité croissance recrutement plateforme sécurité").split()
+
+
+def _notes(rng: random.Random, min_words: int = 10, max_words: int = 220) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def synthetic_records(domain: str, n: int, seed: int = 42) -> List[dict]:
+    """Enregistrements au format Airtable ({"id", "fields"}) pour un domaine."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        if domain == "prospects":
+            fields = {
+                "Entreprise": f"Société {i}",
+                "Contact": f"Contact {i}",
+                "Email": f"contact{i}@societe{i}.fr",
+                "Phone": f"+33 6 {i % 100:02d} {i // 100 % 100:02d} 00 00",
+                "Secteur": rng.choice(SECTEURS),
+                "Statut": rng.choice(STATUTS),
+                "Notes": _notes(rng),
+            }
+        else:
+            fields = {
+                "Nom": f"Candidat {i}",
+                "Role": rng.choice(ROLES),
+                "Competences": ", ".join(rng.sample(SKILLS, 3)),
+                "Experience": f"{rng.randint(0, 15)} ans",
+                "Localisation": rng.choice(VILLES),
+                "Disponibilite": rng.choice(DISPOS),
+                "Notes": _notes(rng),
+            }
+        records.append({"id": f"rec{domain[:3]}{i:07d}", "fields": fields})
+    return records
+
+
+class FakeTable:
+    """Sous-ensemble de ``pyairtable.Table`` : ``all`` et ``iterate``."""
+
+    def __init__(self, records: List[dict], latency: float = 0.0):
+        self.records = records
+        self.latency = latency
+
+    def iterate(self, page_size: int = 100, **_) -> Iterator[List[dict]]:
+        for i in range(0, len(self.records), page_size):
+            time.sleep(self.latency)
+            yield self.records[i:i + page_size]
+
+    def all(self, **kwargs) -> List[dict]:
+        return [r for page in self.iterate(**kwargs) for r in page]
+
+
+def fake_vector(text: str, dimensions: int) -> List[float]:
+    """Vecteur unitaire déterministe dérivé du texte."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vec = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    vec /= np.linalg.norm(vec)
+    return vec.tolist()
+
+
+class FakeBedrockClient:
+    """``invoke_model`` Titan v2 simulé (latence fixe + jitter, erreurs optionnelles)."""
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.0, throttle_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId: str, body: str, **_) -> dict:
+        with self._lock:
+            self.calls += 1
+        payload = json.loads(body)
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            exc = RuntimeError("ThrottlingException")
+            exc.response = {"Error": {"Code": "ThrottlingException"}}  # type: ignore[attr-defined]
+            raise exc
+        vec = fake_vector(payload["inputText"], payload.get("dimensions", 1024))
+        return {"body": io.BytesIO(json.dumps({"embedding": vec}).encode("utf-8"))}
+
+
+def _match_filter(meta: dict, flt: Optional[dict]) -> bool:
+    if not flt:
+        return True
+    for key, cond in flt.items():
+        if key == "$and":
+            if not all(_match_filter(meta, c) for c in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(_match_filter(meta, c) for c in cond):
+                return False
+            continue
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        val = meta.get(key)
+        for op, arg in cond.items():
+            if op == "$eq" and val != arg:
+                return False
+            if op == "$ne" and val == arg:
+                return False
+            if op == "$in" and val not in arg:
+                return False
+            if op == "$nin" and val in arg:
+                return False
+    return True
+
+
+class InMemoryIndex:
+    """Index vectoriel en mémoire (produit scalaire), imitant ``pinecone.Index``.
+
+    Vecteurs unitaires : équivalent au cosinus pour le dense ; les vecteurs
+    creux (``sparse_values`` / ``sparse_vector``) s'ajoutent au score comme
+    dans un index Pinecone ``dotproduct``.
+    """
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._meta: List[dict] = []
+        self._sparse: List[Dict[int, float]] = []
+        self._mat = np.zeros((0, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.upserts = 0
+        self.queries = 0
+
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None, **_) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            self.upserts += 1
+            for v in vectors:
+                pos = self._pos.get(v["id"])
+                if pos is None:
+                    pos = self._pos[v["id"]] = len(self._ids)
+                    self._ids.append(v["id"])
+                    self._meta.append({})
+                    self._sparse.append({})
+                    if pos >= len(self._mat):
+                        # Croissance géométrique du tampon
+                        grown = np.zeros((max(1024, 2 * len(self._mat)), self.dimension), dtype=np.float32)
+                        grown[:pos] = self._mat[:pos]
+                        self._mat = grown
+                self._mat[pos] = np.asarray(v["values"], dtype=np.float32)
+                self._meta[pos] = v.get("metadata") or {}
+                sparse = v.get("sparse_values")
+                self._sparse[pos] = dict(zip(sparse["indices"], sparse["values"])) if sparse else {}
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None, **_) -> None:
+        with self._lock:
+            drop = set(ids)
+            keep = [i for i, vid in enumerate(self._ids) if vid not in drop]
+            self._ids = [self._ids[i] for i in keep]
+            self._meta = [self._meta[i] for i in keep]
+            self._sparse = [self._sparse[i] for i in keep]
+            self._mat = self._mat[keep].copy()
+            self._pos = {vid: i for i, vid in enumerate(self._ids)}
+
+    def list(self, prefix: Optional[str] = None, limit: int = 100, **_) -> Iterator[List[str]]:
+        ids = [vid for vid in self._ids if not prefix or vid.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def fetch(self, ids: List[str], **_):
+        vectors = {vid: SimpleNamespace(id=vid, values=self._mat[self._pos[vid]].tolist(),
+                                        metadata=self._meta[self._pos[vid]])
+                   for vid in ids if vid in self._pos}
+        return SimpleNamespace(vectors=vectors)
+
+    def describe_index_stats(self, **_) -> dict:
+        return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[dict] = None, namespace: Optional[str] = None,
+              sparse_vector: Optional[dict] = None, **_):
+        time.sleep(self.latency)
+        self.queries += 1
+        with self._lock:
+            if not self._ids:
+                return SimpleNamespace(matches=[])
+            scores = self._mat[:len(self._ids)] @ np.asarray(vector, dtype=np.float32)
+            if sparse_vector and sparse_vector["indices"]:
+                q = dict(zip(sparse_vector["indices"], sparse_vector["values"]))
+                scores = scores + np.array([sum(w * s.get(i, 0.0) for i, w in q.items()) for s in self._sparse],
+                                           dtype=np.float32)
+            if filter:
+                mask = np.array([_match_filter(m, filter) for m in self._meta])
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, len(self._ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = [
+                SimpleNamespace(id=self._ids[i], score=float(scores[i]),
+                                metadata=self._meta[i] if include_metadata else None)
+                for i in top if np.isfinite(scores[i])
+            ]
+        return SimpleNamespace(matches=matches)
+
+
+def seeded_index(domain: str, n: int, dimension: int = 1024, latency: float = 0.0) -> InMemoryIndex:
+    """Index rempli des ``n`` fiches synthétiques d'un domaine (vecteurs dérivés du texte)."""
+    from ingest_engine import DOMAINS, build_documents
+    from incremental import vector_ids
+    docs = build_documents(DOMAINS[domain], synthetic_records(domain, n))
+    index = InMemoryIndex(dimension=dimension)
+    index.upsert([{"id": vid, "values": fake_vector(d.page_content, dimension),
+                   "metadata": {**d.metadata, "text": d.page_content}}
+                  for vid, d in zip(vector_ids(docs), docs)])
+    index.latency = latency
+    return index
+
+
+class FakeChat:
+    """Claude simulé : premier token après ``ttft`` s, puis ``tokens_per_s`` mots/s.
+
+    La réponse cite les sources (``[SRC1]``, ``[PRO2]``…) présentes dans le prompt.
+    """
+
+    def __init__(self, ttft: float = 0.3, tokens_per_s: float = 200.0, words: int = 40):
+        self.ttft = ttft
+        self.tokens_per_s = tokens_per_s
+        self.words = words
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, messages) -> List[str]:
+        prompt = " ".join(str(getattr(m, "content", m)) for m in messages)
+        tags = list(dict.fromkeys(re.findall(r"\[[A-Z]+\d+\]", prompt)))[:5]
+        rng = random.Random(prompt)
+        return ["Analyse", "simulée", ":"] + [rng.choice(WORDS) for _ in range(self.words)] + ["Sources"] + tags
+
+    def stream(self, messages):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.ttft)
+        for word in self._answer(messages):
+            if self.tokens_per_s > 0:
+                time.sleep(1 / self.tokens_per_s)
+            yield SimpleNamespace(content=word + " ")
+
+    def invoke(self, messages):
+        return SimpleNamespace(content="".join(chunk.content for chunk in self.stream(messages)))
+
+
+def synthetic_questions(n: int, seed: int = 7) -> List[dict]:
+    """Questions ``{"id", "domain", "query", "filters"}`` sur les domaines synthétiques."""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(n):
+        kind = rng.choice(("prospects", "prospects", "candidates", "match"))
+        if kind == "prospects":
+            q = {"query": f"prospects {rng.choice(SECTEURS).lower()} {rng.choice(WORDS)} à prioriser",
+                 "filters": {"statut": rng.choice(STATUTS)} if rng.random() < 0.3 else {}}
+        elif kind == "candidates":
+            q = {"query": f"{rng.choice(ROLES)} {rng.choice(SKILLS)} {rng.choice(VILLES)}", "filters": {}}
+        else:
+            q = {"query": f"candidats pour les prospects {rng.choice(SECTEURS).lower()} qui recrutent",
+                 "filters": {}}
+        questions.append({"id": f"q{i:05d}", "domain": kind, **q})
+    return questions
+
+
+# Chemins dérivés de STATE_DIR à l'import, par module
+_STATE_PATHS = {"state": {"VERSIONS_PATH": "index_versions.json", "ALIASES_PATH": "index_aliases.json"},
+                "local_index": {"LOCAL_INDEX_DIR": "local_index"}}
+# Caches de fichiers d'état chargés, par module
+_STATE_CACHES = {"sparse": "_loaded", "query_parser": "_loaded", "doc_store": "_opened",
+                 "local_index": "_indexes"}
+
+
+@contextlib.contextmanager
+def isolated_state() -> Iterator[Path]:
+    """Répertoire d'état temporaire pour tous les modules déjà importés.
+
+    ``STATE_DIR`` est importé par valeur (``from state import STATE_DIR``) :
+    chaque module qui le référence est repointé, ainsi que les chemins qui en
+    dérivent ; les caches de fichiers d'état sont vidés à l'entrée et à la sortie.
+    """
+    import state
+    real = state.STATE_DIR
+    saved = []
+
+    def patch(module, name, value):
+        saved.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+
+    def clear_caches():
+        for mod_name, attr in _STATE_CACHES.items():
+            module = sys.modules.get(mod_name)
+            if module is not None:
+                for handle in getattr(module, attr).values():
+                    if hasattr(handle, "close"):
+                        handle.close()
+                getattr(module, attr).clear()
+
+    with tempfile.TemporaryDirectory(prefix="rag_state_") as tmp:
+        root = Path(tmp)
+        clear_caches()
+        for module in list(sys.modules.values()):
+            if getattr(module, "STATE_DIR", None) == real:
+                patch(module, "STATE_DIR", root)
+        for mod_name, paths in _STATE_PATHS.items():
+            module = sys.modules.get(mod_name)
+            if module is not None:
+                for name, rel in paths.items():
+                    patch(module, name, root / rel)
+        patch(state, "_aliases_cache", (None, {}))
+        try:
+            yield root
+        finally:
+            clear_caches()
+            for module, name, value in reversed(saved):
+                setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def patched_core(core_module, embedder, index, candidate_index=None, chat=None, retrieval_cache: bool = False):
+    """Remplace temporairement les initialiseurs de ``core`` par des doublures,
+    avec un état local temporaire (cf. ``isolated_state``)."""
+    # Cache de recherche désactivé par défaut : chaque requête mesurée atteint l'index
+    names = {"init_embedder": lambda: embedder, "init_pinecone": lambda: index}
+    if not retrieval_cache:
+        names["init_retrieval_cache"] = lambda: None
+    if candidate_index is not None:
+        names["init_candidate_index"] = lambda: candidate_index
+    if chat is not None:
+        names["init_claude"] = lambda: chat
+    saved = {name: getattr(core_module, name, None) for name in names}
+    for name, fn in names.items():
+        setattr(core_module, name, fn)
+    try:
+        with isolated_state():
+            yield
+    finally:
+        for name, fn in saved.items():
+            if fn is None:
+                delattr(core_module, name)
+            else:
+                setattr(core_module, name, fn)
+
+
+@contextlib.contextmanager
+def stubbed_core(core_module, records: int = 1000, latency: float = 0.02, ttft: float = 0.3,
+                 retrieval_cache: bool = False):
+    """Bedrock, Pinecone et Claude simulés pour tout ``core`` (runner batch, API).
+
+    Index prospects et candidats de ``records`` fiches synthétiques ; le cache
+    de réponses (persistant) est désactivé pour ne pas mélanger doublures et
+    données réelles.
+    """
+    from embeddings import BedrockEmbeddingEngine
+    dim = core_module.BEDROCK_DIMENSIONS
+    embedder = BedrockEmbeddingEngine(FakeBedrockClient(latency=latency), dimensions=dim, rate_limit=0)
+    prospects = seeded_index("prospects", records, dim, latency)
+    candidates = seeded_index("candidates", records, dim, latency)
+    saved = core_module.init_answer_cache
+    core_module.init_answer_cache = lambda: None
+    try:
+        with patched_core(core_module, embedder, prospects, candidates, FakeChat(ttft=ttft), retrieval_cache):
+            yield
+    finally:
+        core_module.init_answer_cache = saved
+
@@ -6,13 +6,14 @@ Usage :
     python clear_pinecone.py          # Demande confirmation avant suppression
     python clear_pinecone.py --force  # Supprime sans confirmation
 
+Pour reconstruire un index sans interruption, préférer ``reindex.py``.
+
 Les variables d'environnement nécessaires :
     PINECONE_API_KEY   (obligatoire)
 """
 from __future__ import annotations
 import os, sys
 from dotenv import load_dotenv
-from pinecone import Pinecone
 
 # Charger les variables depuis .env s'il existe
 load_dotenv()
@@ -21,7 +22,11 @@ API_KEY = os.getenv("PINECONE_API_KEY")
 if not API_KEY:
     sys.exit("❌ PINECONE_API_KEY manquante dans .env ou variables d'environnement")
 
-pc = Pinecone(api_key=API_KEY)
+from core import connections
+from state import drop_aliases
+
+conn = connections()
+pc = conn.client
 indexes = pc.list_indexes()
 if not indexes:
     print("✅ Aucun index Pinecone à supprimer.")
@@ -41,6 +46,8 @@ if not force:
 for idx in indexes:
     print(f"🗑️  Suppression {idx.name}…", end=" ")
     pc.delete_index(idx.name)
+    conn.forget(idx.name)   # hôte mémorisé désormais invalide
+    drop_aliases(idx.name)
     print("✅")
 
 print("🎉 Tous les index ont été supprimés.") 
\ No newline at end of file
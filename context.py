@@ -0,0 +1,125 @@
+"""context.py – Assemblage du contexte envoyé à Claude sous budget de tokens.
+
+Les matches (déjà triés par pertinence) sont dédupliqués par ``airtable_id``,
+leurs champs tronqués, puis ajoutés un à un tant que le budget n'est pas
+atteint : une source trop longue est écartée, les suivantes peuvent encore
+entrer. Le nombre de sources incluses / écartées est rapporté pour
+l'affichage et les logs.
+
+Variables d'environnement :
+    CONTEXT_TOKEN_BUDGET      budget de tokens du contexte (défaut 6000)
+    CONTEXT_NOTES_CHARS       caractères max des notes par source (défaut 600)
+    CONTEXT_FIELD_CHARS       caractères max des autres champs (défaut 120)
+    CONTEXT_CHARS_PER_TOKEN   ratio de l'estimateur local (défaut 3.5)
+"""
+from __future__ import annotations
+import math, os, time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from telemetry import record
+
+CONTEXT_TOKEN_BUDGET    = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_NOTES_CHARS     = int(os.getenv("CONTEXT_NOTES_CHARS", "600"))
+CONTEXT_FIELD_CHARS     = int(os.getenv("CONTEXT_FIELD_CHARS", "120"))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
+
+
+@dataclass(frozen=True)
+class SourceFormat:
+    """Champs d'une source dans le contexte : (clé de métadonnée, libellé)."""
+    fields: Tuple[Tuple[str, str], ...]
+    notes_keys: Tuple[str, ...] = ("notes", "text")   # première clé non vide
+    notes_chars: int = CONTEXT_NOTES_CHARS
+    field_chars: int = CONTEXT_FIELD_CHARS
+
+
+PROSPECT_FORMAT = SourceFormat(fields=(
+    ("entreprise", "Entreprise"), ("contact", "Contact"), ("secteur", "Secteur"),
+    ("statut", "Statut"), ("budget", "Budget"),
+))
+
+CANDIDATE_FORMAT = SourceFormat(fields=(
+    ("nom", "Nom"), ("role", "Role"), ("competences", "Compétences"), ("experience", "Exp"),
+    ("localisation", "Localisation"), ("disponibilite", "Dispo"),
+))
+
+
+@dataclass
+class ContextResult:
+    text: str = ""
+    sources: List[dict] = field(default_factory=list)   # métadonnées + tag + score
+    ids: List[str] = field(default_factory=list)        # IDs des vecteurs inclus
+    tokens: int = 0
+    budget: int = CONTEXT_TOKEN_BUDGET
+    dropped: int = 0
+    duplicates: int = 0
+
+    @property
+    def included(self) -> int:
+        return len(self.sources)
+
+    def summary(self) -> str:
+        text = f"{self.included} sources dans le contexte (~{self.tokens}/{self.budget} tokens)"
+        if self.dropped:
+            text += f", {self.dropped} écartées faute de budget"
+        if self.duplicates:
+            text += f", {self.duplicates} doublons fusionnés"
+        return text
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation locale (sans tokenizer) du nombre de tokens d'un texte."""
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN) if text else 0
+
+
+def _clip(value, limit: int) -> str:
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def format_source(tag: str, md: dict, fmt: SourceFormat) -> str:
+    """Ligne de contexte d'une source ; les champs vides sont omis."""
+    parts = [f"{label}: {_clip(md[key], fmt.field_chars)}" for key, label in fmt.fields if md.get(key)]
+    notes = next((md[k] for k in fmt.notes_keys if md.get(k)), None)
+    if notes:
+        parts.append(f"Notes: {_clip(notes, fmt.notes_chars)}")
+    return f"{tag} " + " | ".join(parts)
+
+
+def build_context(matches: Iterable, fmt: SourceFormat, budget: int = CONTEXT_TOKEN_BUDGET,
+                  max_sources: Optional[int] = None, prefix: str = "SRC") -> ContextResult:
+    """Remplit le budget avec les meilleures sources distinctes, dans l'ordre.
+
+    ``matches`` : objets Pinecone (``id``, ``score``, ``metadata``).
+    ``prefix`` : préfixe des tags (``[SRC1]``…), à distinguer quand plusieurs
+    contextes sont envoyés dans un même prompt.
+    """
+    start = time.perf_counter()
+    result = ContextResult(budget=budget)
+    seen = set()
+    lines: List[str] = []
+    for m in matches:
+        md = m.metadata or {}
+        key = md.get("airtable_id") or m.id
+        if key in seen:
+            result.duplicates += 1
+            continue
+        seen.add(key)
+        if max_sources is not None and result.included >= max_sources:
+            result.dropped += 1
+            continue
+        tag = f"[{prefix}{result.included + 1}]"
+        line = format_source(tag, md, fmt)
+        cost = estimate_tokens(line) + 1   # + saut de ligne
+        if result.tokens + cost > budget:
+            result.dropped += 1
+            continue
+        lines.append(line)
+        result.tokens += cost
+        result.ids.append(m.id)
+        result.sources.append(md | {"tag": tag, "score": round(m.score, 3)})
+    result.text = "\n".join(lines)
+    record("context", time.perf_counter() - start, sources=result.included, tokens=result.tokens,
+           dropped=result.dropped)
+    return result
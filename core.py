@@ -1,90 +1,467 @@
 #!/usr/bin/env python3
 """core.py – Fonctions utilitaires partagées (embedding, Pinecone, Claude, recherche).
 Suppression d'anciennes dépendances à app.py.
+
+Les clients lourds (langchain_anthropic, pinecone, boto3, numpy pour l'index
+local) ne sont importés qu'au premier appel qui en a besoin : importer ``core``
+reste rapide au démarrage des apps et à chaque rerun Streamlit.
 """
 from __future__ import annotations
-import os, time, functools
-from typing import Any, List, Optional
+import os, sys, time, functools, hashlib, logging, threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Protocol, Set
 
 from dotenv import load_dotenv
-from langchain_community.embeddings import BedrockEmbeddings
-from pinecone import Pinecone, ServerlessSpec
-from langchain_anthropic import ChatAnthropic
 
-# Streamlit est optionnel : si importé depuis script Streamlit, on utilise cache_resource
-try:
+from embeddings import validate_dimensions
+from answer_cache import ANSWER_CACHE_ENABLED
+from retrieval_cache import RETRIEVAL_CACHE_ENABLED, RetrievalCache
+from sparse import HYBRID_ALPHA, HYBRID_SEARCH, hybrid_scale, load_encoder
+from query_parser import QUERY_FILTERS, ParsedQuery, load_facets, parse_query
+from doc_store import DOC_STORE_KEY, DocStore, open_doc_store
+from state import STATE_DIR, load_json, resolve_index, save_json
+from telemetry import record, span
+
+if TYPE_CHECKING:
+    from answer_cache import AnswerCache
+
+# Streamlit est optionnel : depuis un script Streamlit (déjà importé), on
+# utilise cache_resource ; les scripts hors Streamlit n'ont pas à l'importer
+if "streamlit" in sys.modules:
     import streamlit as st
     cache_dec = st.cache_resource  # type: ignore
-except ModuleNotFoundError:  # scripts hors Streamlit
+else:
     def cache_dec(func):
         return functools.lru_cache(maxsize=None)(func)
 
+log = logging.getLogger("rag")
+
 # ── env ───────────────────────────────────────────────────
 load_dotenv()
 AWS_REGION           = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
 BEDROCK_MODEL_ID     = os.getenv("BEDROCK_EMBED_MODEL", "amazon.titan-embed-text-v2:0")
-BEDROCK_DIMENSIONS   = int(os.getenv("BEDROCK_EMBED_DIMENSIONS", "1024"))
+BEDROCK_DIMENSIONS   = validate_dimensions(int(os.getenv("BEDROCK_EMBED_DIMENSIONS", "1024")))
 
 PINECONE_API_KEY     = os.getenv("PINECONE_API_KEY")
 PINECONE_REGION      = os.getenv("PINECONE_REGION", "us-east-1")
 PINECONE_INDEX_NAME  = os.getenv("PINECONE_INDEX_NAME", "airtable-vectors")
+CANDIDATE_INDEX_NAME = os.getenv("CANDIDATE_INDEX_NAME", "candidate-vectors")
+PINECONE_POOL_SIZE   = int(os.getenv("PINECONE_POOL_SIZE", "16"))
+
+# Index de chaque domaine intégré
+DOMAIN_INDEXES = {"prospects": PINECONE_INDEX_NAME, "candidates": CANDIDATE_INDEX_NAME}
+
+# Agrégation par fiche : top_k × SEARCH_OVERFETCH chunks demandés à Pinecone,
+# puis fusion des scores des chunks d'une même fiche ("max" ou "sum")
+SEARCH_OVERFETCH     = int(os.getenv("SEARCH_OVERFETCH", "3"))
+SEARCH_FUSION        = os.getenv("SEARCH_FUSION", "max")
+SEARCH_CHUNKS_PER_RECORD = int(os.getenv("SEARCH_CHUNKS_PER_RECORD", "2"))
 
 ANTHROPIC_API_KEY    = os.getenv("ANTHROPIC_API_KEY")
 ANTHROPIC_MODEL      = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022")
 
+# ── vector store ──────────────────────────────────────────
+class VectorStore(Protocol):
+    """Sous-ensemble de ``pinecone.Index`` utilisé par la recherche et l'ingestion.
+
+    Implémentations : ``pinecone.Index`` (VECTOR_BACKEND=pinecone, défaut) et
+    ``local_index.LocalIndex`` (VECTOR_BACKEND=local, NumPy + mmap).
+    """
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None, **kwargs) -> Any: ...
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[dict] = None, **kwargs) -> Any: ...
+    def delete(self, ids: List[str], namespace: Optional[str] = None, **kwargs) -> Any: ...
+    def fetch(self, ids: List[str], **kwargs) -> Any: ...
+    def list(self, prefix: Optional[str] = None, **kwargs) -> Iterator[List[str]]: ...
+
+
+def _is_ready(description) -> bool:
+    status = description.status
+    return bool(status.get("ready") if isinstance(status, dict) else getattr(status, "ready", False))
+
+
+class PineconeConnections:
+    """Client Pinecone unique (pool de connexions HTTP) et handles d'index partagés.
+
+    L'URL d'hôte de chaque index est mémorisée dans ``RAG_STATE_DIR`` : après un
+    redémarrage, le handle est ouvert directement sur l'hôte, sans
+    ``list_indexes`` ni ``describe_index``.
+    """
+
+    def __init__(self, api_key: Optional[str] = PINECONE_API_KEY, pool_size: int = PINECONE_POOL_SIZE,
+                 client=None):
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self._client = client
+        self._indexes: Dict[str, VectorStore] = {}
+        # Index Pinecone existants hors métrique dotproduct : pas de vecteurs creux
+        self.dense_only: Set[str] = set()
+        self._lock = threading.Lock()
+        # Hôtes propres au projet de la clé API
+        key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+        self.hosts_path = STATE_DIR / f"pinecone_hosts_{key_id}.json"
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise RuntimeError("PINECONE_API_KEY manquante")
+            from pinecone import Pinecone
+            self._client = Pinecone(api_key=self.api_key, connection_pool_maxsize=self.pool_size)
+        return self._client
+
+    def _host(self, name: str, create: bool, dimension: int, metric: str) -> str:
+        host = load_json(self.hosts_path, {}).get(name)
+        if host:
+            return host
+        pc = self.client
+        if create and name not in [idx.name for idx in pc.list_indexes()]:
+            from pinecone import ServerlessSpec
+            pc.create_index(name=name, dimension=dimension, metric=metric,
+                            spec=ServerlessSpec(cloud="aws", region=PINECONE_REGION))
+        # Attendre qu'il soit prêt
+        while not _is_ready(desc := pc.describe_index(name)):
+            time.sleep(1)
+        hosts = load_json(self.hosts_path, {})
+        hosts[name] = desc.host
+        save_json(self.hosts_path, hosts)
+        return desc.host
+
+    def index(self, name: str, create: bool = False, dimension: int = BEDROCK_DIMENSIONS,
+              metric: Optional[str] = None) -> VectorStore:
+        """Handle d'index mis en cache (créé au besoin si ``create``).
+
+        ``name`` peut être un nom logique : l'alias (cf. ``reindex.py``) désigne
+        l'index physique en service. Avec VECTOR_BACKEND=local, index NumPy
+        local (cf. ``local_index``).
+        """
+        name = resolve_index(name)
+        metric = metric or ("dotproduct" if HYBRID_SEARCH else "cosine")  # hybride : dotproduct requis
+        with self._lock:
+            if name not in self._indexes:
+                from local_index import VECTOR_BACKEND, open_local_index
+                if VECTOR_BACKEND == "local":
+                    self._indexes[name] = open_local_index(name, dimension=dimension, metric=metric)
+                else:
+                    host = self._host(name, create, dimension, metric)
+                    self._indexes[name] = self.client.Index(host=host)
+                    if HYBRID_SEARCH and (actual := self.client.describe_index(name).metric) != "dotproduct":
+                        log.warning("index %s en métrique %s : recherche hybride désactivée "
+                                    "(python reindex.py pour le recréer en dotproduct)", name, actual)
+                        self.dense_only.add(name)
+            return self._indexes[name]
+
+    def supports_sparse(self, name: str) -> bool:
+        """Faux pour un index Pinecone ouvert dont la métrique refuse les vecteurs creux."""
+        return resolve_index(name) not in self.dense_only
+
+    def domain_indexes(self) -> Dict[str, VectorStore]:
+        """Handles des index de tous les domaines intégrés."""
+        return {domain: self.index(name) for domain, name in DOMAIN_INDEXES.items()}
+
+    def exists(self, name: str) -> bool:
+        """Vrai si l'index physique existe, sans le créer ni ouvrir de handle."""
+        from local_index import VECTOR_BACKEND, local_index_exists
+        if VECTOR_BACKEND == "local":
+            return local_index_exists(name)
+        return name in [idx.name for idx in self.client.list_indexes()]
+
+    def delete(self, name: str) -> None:
+        """Supprime un index physique (Pinecone ou local) et oublie son hôte."""
+        from local_index import VECTOR_BACKEND, drop_local_index
+        if VECTOR_BACKEND == "local":
+            with self._lock:
+                self._indexes.pop(name, None)
+            drop_local_index(name)
+        else:
+            self.client.delete_index(name)
+            self.forget(name)
+
+    def forget(self, name: Optional[str] = None) -> None:
+        """Oublie l'hôte mémorisé d'un index (ou de tous), p. ex. après suppression."""
+        with self._lock:
+            hosts = load_json(self.hosts_path, {})
+            for key in [name] if name else list(hosts):
+                hosts.pop(key, None)
+                self._indexes.pop(key, None)
+            save_json(self.hosts_path, hosts)
+
+
+_connections: Optional[PineconeConnections] = None
+_connections_lock = threading.Lock()
+
+
+def connections() -> PineconeConnections:
+    """Gestionnaire de connexions du processus (apps, ingestion, scripts)."""
+    global _connections
+    with _connections_lock:
+        if _connections is None:
+            _connections = PineconeConnections()
+        return _connections
+
 # ── helpers ───────────────────────────────────────────────
 @cache_dec
-def init_embedder() -> BedrockEmbeddings:
-    import boto3
-    client = boto3.client("bedrock-runtime", region_name=AWS_REGION)
-    return BedrockEmbeddings(
-        client=client,
+def init_embedder():
+    from embeddings import BedrockEmbeddingEngine, bedrock_client
+    from embed_cache import with_cache
+    # Questions répétées : servies par le cache disque partagé avec l'ingestion
+    return with_cache(BedrockEmbeddingEngine(
+        bedrock_client(AWS_REGION),
         model_id=BEDROCK_MODEL_ID,
-        model_kwargs={"dimensions": BEDROCK_DIMENSIONS, "normalize": True},
-    )
+        dimensions=BEDROCK_DIMENSIONS,
+        normalize=True,
+    ))
 
-@cache_dec
-def init_pinecone():
-    if not PINECONE_API_KEY:
-        raise RuntimeError("PINECONE_API_KEY manquante")
-    pc = Pinecone(api_key=PINECONE_API_KEY)
+def init_pinecone() -> VectorStore:
     # Crée l'index s'il n'existe pas
-    if PINECONE_INDEX_NAME not in [idx.name for idx in pc.list_indexes()]:
-        pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=BEDROCK_DIMENSIONS,
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region=PINECONE_REGION),
-        )
-        # Attendre qu'il soit prêt
-        while not pc.describe_index(PINECONE_INDEX_NAME).status.get("ready"):
-            time.sleep(1)
-    return pc.Index(PINECONE_INDEX_NAME)
+    return connections().index(PINECONE_INDEX_NAME, create=True)
+
+def init_candidate_index() -> VectorStore:
+    return connections().index(CANDIDATE_INDEX_NAME)
+
+@cache_dec
+def init_retrieval_cache() -> Optional[RetrievalCache]:
+    """Cache des résultats de recherche (None si RETRIEVAL_CACHE=0)."""
+    return RetrievalCache() if RETRIEVAL_CACHE_ENABLED else None
+
+@cache_dec
+def init_answer_cache() -> Optional[AnswerCache]:
+    """Cache sémantique des réponses (None si ANSWER_CACHE=0)."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    from answer_cache import AnswerCache
+    return AnswerCache()
 
 @cache_dec
 def init_claude():
     if not ANTHROPIC_API_KEY:
         raise RuntimeError("ANTHROPIC_API_KEY manquante")
+    from langchain_anthropic import ChatAnthropic
     return ChatAnthropic(api_key=ANTHROPIC_API_KEY, model_name=ANTHROPIC_MODEL)
 
 # ----------------------------------------------------------
 
-def search_prospects(query: str, filters: Optional[dict] = None, top_k: int = 10):
-    """Recherche dans l'index Pinecone et retourne les matches."""
-    embedder = init_embedder()
-    index    = init_pinecone()
-    query_vec = embedder.embed_query(query)
+@dataclass
+class RecordMatch:
+    """Fiche Airtable retrouvée : score fusionné de ses chunks les mieux classés.
+
+    ``id`` et ``metadata`` sont ceux du meilleur chunk (même interface qu'un
+    match Pinecone) ; ``chunks`` garde les meilleurs chunks de la fiche.
+    """
+    id: str
+    score: float
+    metadata: Dict[str, Any]
+    chunks: List[Any] = field(default_factory=list)
+
+
+def aggregate_matches(matches: List[Any], top_k: int, fusion: str = SEARCH_FUSION,
+                      chunks_per_record: int = SEARCH_CHUNKS_PER_RECORD) -> List[RecordMatch]:
+    """Regroupe les chunks par ``airtable_id`` et retourne les ``top_k`` meilleures fiches.
+
+    ``fusion="max"`` : score du meilleur chunk ; ``"sum"`` : somme des scores
+    des ``chunks_per_record`` meilleurs chunks (favorise les fiches riches).
+    Le texte des meilleurs chunks est concaténé dans ``metadata["text"]``.
+    """
+    groups: Dict[str, List[Any]] = {}
+    for m in matches:   # déjà triés par score décroissant
+        md = m.metadata or {}
+        groups.setdefault(md.get("airtable_id") or m.id, []).append(m)
+
+    records = []
+    for chunks in groups.values():
+        best = chunks[:chunks_per_record]
+        score = sum(c.score for c in best) if fusion == "sum" else best[0].score
+        md = _merge_chunks([c.metadata for c in best])
+        records.append(RecordMatch(id=best[0].id, score=score, metadata=md, chunks=best))
+    records.sort(key=lambda r: r.score, reverse=True)
+    return records[:top_k]
+
+
+def _merge_chunks(chunk_metadata: List[Optional[dict]]) -> Dict[str, Any]:
+    """Métadonnées du meilleur chunk, textes des chunks concaténés."""
+    md = dict(chunk_metadata[0] or {})
+    texts = [m["text"] for m in chunk_metadata if m and m.get("text")]
+    if len(texts) > 1:
+        md["text"] = "\n…\n".join(texts)
+    return md
+
+
+def hydrate_records(index_name: str, records: List[RecordMatch]) -> List[RecordMatch]:
+    """Complète les fiches retenues avec le contenu de leurs chunks (doc store).
+
+    Sans doc store pour l'index, Pinecone porte déjà toutes les métadonnées,
+    sauf si les vecteurs ont été réduits (marqueur ``DOC_STORE_KEY``) : l'état
+    local de l'ingestion manque alors sur cette machine.
+    """
+    if not records:
+        return records
+    store = open_doc_store(index_name)
+    if store is None:
+        if any(r.metadata.get(DOC_STORE_KEY) for r in records):
+            raise RuntimeError(f"Doc store introuvable pour {index_name} ({DocStore.path_for(index_name)}) : "
+                               "partager RAG_STATE_DIR avec la machine d'ingestion ou ré-ingérer avec DOC_STORE=0")
+        return records
+    payloads = store.get_many([c.id for r in records for c in r.chunks])
+    for r in records:
+        chunk_metadata = [payloads.get(c.id) for c in r.chunks]
+        if chunk_metadata[0] is not None:
+            r.metadata = {**r.metadata, **_merge_chunks(chunk_metadata)}
+    return records
+
+
+def search_key(cache: RetrievalCache, index_name: str, query: str, top_k: int,
+               pinecone_filter: Optional[dict] = None, alpha: Optional[float] = None) -> str:
+    """Clé du cache de recherche pour une requête sur un index."""
+    return cache.key(index_name, query=query, top_k=top_k, filter=pinecone_filter or None, alpha=alpha,
+                     hybrid=HYBRID_SEARCH, overfetch=SEARCH_OVERFETCH, fusion=SEARCH_FUSION)
+
+
+def _query_records(index, index_name: str, query: str, top_k: int,
+                   pinecone_filter: Optional[dict] = None, alpha: Optional[float] = None,
+                   vector: Optional[List[float]] = None) -> List[RecordMatch]:
+    """Recherche agrégée par fiche, servie par le cache de recherche si possible."""
+    cache = init_retrieval_cache()
+    with span("search", index=index_name, top_k=top_k, filtered=bool(pinecone_filter)) as sp:
+        if cache is None:
+            return _run_query(index, index_name, query, top_k, pinecone_filter, alpha, vector)
+        key = search_key(cache, index_name, query, top_k, pinecone_filter, alpha)
+        records = cache.get(index_name, key)
+        sp.set(cache_hit=records is not None)
+        if records is None:
+            records = _run_query(index, index_name, query, top_k, pinecone_filter, alpha, vector)
+            cache.put(index_name, key, records)
+        return records
+
+
+def _run_query(index, index_name: str, query: str, top_k: int,
+               pinecone_filter: Optional[dict] = None, alpha: Optional[float] = None,
+               vector: Optional[List[float]] = None) -> List[RecordMatch]:
+    if vector is None:
+        with span("embed", chars=len(query)):
+            vector = init_embedder().embed_query(query)
+    return search_vector(index, index_name, query, vector, top_k, pinecone_filter, alpha)
+
 
+def search_vector(index, index_name: str, query: str, vector: List[float], top_k: int,
+                  pinecone_filter: Optional[dict] = None, alpha: Optional[float] = None) -> List[RecordMatch]:
+    """Requête d'un index avec l'embedding déjà calculé de ``query`` (sans cache).
+
+    Un même embedding peut servir pour plusieurs index : la pondération
+    hybride (propre à l'encodeur BM25 de chaque index) est appliquée ici.
+    """
+    kwargs = {}
+    # Hybride : le vecteur creux BM25 de la requête complète le dense
+    encoder = load_encoder(index_name) if HYBRID_SEARCH and connections().supports_sparse(index_name) else None
+    if encoder is not None:
+        sparse = encoder.encode_query(query)
+        if sparse["indices"]:
+            vector, kwargs["sparse_vector"] = hybrid_scale(vector, sparse, HYBRID_ALPHA if alpha is None else alpha)
+    with span("vector_query", index=index_name, top_k=top_k, hybrid="sparse_vector" in kwargs) as sp:
+        res = index.query(
+            vector=vector,
+            top_k=top_k * max(1, SEARCH_OVERFETCH),
+            include_metadata=True,
+            filter=pinecone_filter or None,
+            **kwargs,
+        )
+        sp.set(matches=len(res.matches))
+    records = aggregate_matches(res.matches, top_k)
+    # Contenu complet relu seulement pour les fiches retenues
+    with span("doc_store", records=len(records)):
+        return hydrate_records(index_name, records)
+
+
+def understand_query(index_name: str, query: str) -> ParsedQuery:
+    """Filtres reconnus dans la question (facettes enregistrées à l'ingestion de l'index)."""
+    return parse_query(query, load_facets(resolve_index(index_name)) if QUERY_FILTERS else None)
+
+
+def _search_records(index, index_name: str, query: str, top_k: int, pinecone_filter: dict,
+                    alpha: Optional[float], understand: bool,
+                    vector: Optional[List[float]] = None) -> List[RecordMatch]:
+    """Recherche restreinte par les filtres déduits de la question.
+
+    Si ces filtres ne donnent aucun résultat (terme mal interprété), la
+    recherche est relancée avec la question d'origine, sans eux.
+    """
+    # État propre à la génération en service (encodeur, facettes, doc store, cache)
+    index_name = resolve_index(index_name)
+    parsed = understand_query(index_name, query) if understand else None
+    if parsed is not None and parsed.filter:
+        # Les filtres explicites de l'UI priment sur ceux déduits de la question
+        records = _query_records(index, index_name, query, top_k, {**parsed.filter, **pinecone_filter}, alpha, vector)
+        if records:
+            log.info("filtres déduits %s : %s", index_name, parsed.describe())
+            return records
+        log.info("filtres déduits %s sans résultat (%s), recherche non filtrée", index_name, parsed.describe())
+    return _query_records(index, index_name, query, top_k, pinecone_filter, alpha, vector)
+
+
+def search_prospects(query: str, filters: Optional[dict] = None, top_k: int = 10,
+                     alpha: Optional[float] = None, understand: bool = True,
+                     vector: Optional[List[float]] = None) -> List[RecordMatch]:
+    """Recherche dans l'index prospects et retourne les ``top_k`` fiches distinctes.
+
+    ``alpha`` : poids du dense en recherche hybride (défaut HYBRID_ALPHA).
+    ``understand`` : secteur / statut cités dans la question appliqués en filtres.
+    ``vector`` : embedding de ``query`` déjà calculé (p. ex. pour le cache de réponses).
+    """
+    return _search_records(init_pinecone(), PINECONE_INDEX_NAME, query, top_k, prospect_filter(filters),
+                           alpha, understand, vector)
+
+
+def prospect_filter(filters: Optional[dict]) -> dict:
+    """Filtre Pinecone des sélections de l'UI (``"Tous"`` ou vide = ignoré).
+
+    Une valeur donne un ``$eq``, une liste de valeurs un ``$in``.
+    """
     pinecone_filter = {}
     if filters:
         for key, val in filters.items():
-            if val and val != "Tous":
+            if isinstance(val, (list, tuple, set)):
+                vals = [v for v in val if v and v != "Tous"]
+                if vals:
+                    pinecone_filter[key] = {"$eq": vals[0]} if len(vals) == 1 else {"$in": sorted(vals)}
+            elif val and val != "Tous":
                 pinecone_filter[key] = {"$eq": val}
+    return pinecone_filter
+
+
+def search_candidates(query: str, top_k: int = 10, alpha: Optional[float] = None,
+                      understand: bool = True, vector: Optional[List[float]] = None) -> List[RecordMatch]:
+    """Recherche dans l'index candidats et retourne les ``top_k`` fiches distinctes.
+
+    ``understand`` : localisation / disponibilité citées dans la question appliquées en filtres.
+    ``vector`` : embedding de ``query`` déjà calculé.
+    """
+    return _search_records(init_candidate_index(), CANDIDATE_INDEX_NAME, query, top_k, {}, alpha, understand,
+                           vector)
+
+
+def stream_answer(messages: list, chat=None, label: str = "") -> Iterator[str]:
+    """Génère la réponse de Claude morceau par morceau (pour ``st.write_stream``).
 
-    res = index.query(
-        vector=query_vec,
-        top_k=top_k,
-        include_metadata=True,
-        filter=pinecone_filter if pinecone_filter else None,
-    )
-    return res.matches 
\ No newline at end of file
+    Le temps jusqu'au premier token (TTFT) et la durée totale sont journalisés
+    et mesurés (étages ``claude_ttft`` et ``claude``, tokens estimés).
+    """
+    from context import CONTEXT_CHARS_PER_TOKEN, estimate_tokens
+    chat = chat or init_claude()
+    prompt_tokens = sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+    chars = 0
+    start = time.perf_counter()
+    first: Optional[float] = None
+    for chunk in chat.stream(messages):
+        content = chunk.content
+        text = content if isinstance(content, str) else "".join(
+            part.get("text", "") for part in content if isinstance(part, dict))
+        if not text:
+            continue
+        if first is None:
+            first = time.perf_counter() - start
+            log.info("claude ttft=%.3fs %s", first, label)
+            record("claude_ttft", first)
+        chars += len(text)
+        yield text
+    total = time.perf_counter() - start
+    log.info("claude total=%.3fs ttft=%s %s", total, f"{first:.3f}s" if first is not None else "n/a", label)
+    record("claude", total, prompt_tokens=prompt_tokens, output_tokens=round(chars / CONTEXT_CHARS_PER_TOKEN)) 
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""doc_store.py – Contenu complet des chunks, hors de Pinecone.
+
+Avec le doc store, Pinecone ne reçoit que les métadonnées utiles au filtrage
+et au regroupement (``airtable_id`` et champs facettes du domaine) ; le texte
+du chunk, les notes et les autres champs sont écrits localement, indexés par
+ID de vecteur. Les réponses de requête et le stockage Pinecone s'en trouvent
+réduits d'autant.
+
+La recherche agrège d'abord les chunks par fiche, puis ne relit ici que les
+chunks des fiches retenues (``top_k``) : ce sont les seules affichées ou
+envoyées à Claude.
+
+Stockage SQLite (``RAG_STATE_DIR/docs_<index>.sqlite``, mode WAL), charge
+utile JSON compressée (zlib). Le fichier doit être partagé entre la machine
+d'ingestion et celles qui servent la recherche (volume commun) : les vecteurs
+réduits portent le marqueur ``DOC_STORE_KEY`` et la recherche échoue si le doc
+store de l'index est introuvable, plutôt que de renvoyer des fiches vides.
+
+Variables d'environnement :
+    DOC_STORE   "1" pour réduire les métadonnées Pinecone (défaut "0")
+"""
+from __future__ import annotations
+import json, os, sqlite3, threading, zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from state import STATE_DIR
+
+DOC_STORE_ENABLED = os.getenv("DOC_STORE", "0") == "1"
+# Marqueur des métadonnées réduites : contenu à relire dans le doc store
+DOC_STORE_KEY = "doc_store"
+
+# Écritures regroupées par transactions de N chunks
+WRITE_BATCH = 500
+
+
+class DocStore:
+    """Charges utiles des chunks d'un index, par ID de vecteur (thread-safe)."""
+
+    def __init__(self, name: str, path: Optional[Path] = None):
+        self.name = name
+        self.path = Path(path or self.path_for(name))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pending: List[Tuple[str, bytes]] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, payload BLOB NOT NULL)")
+        self._db.commit()
+
+    @staticmethod
+    def path_for(name: str) -> Path:
+        return STATE_DIR / f"docs_{name}.sqlite"
+
+    # ── écriture (ingestion) ──────────────────────────────────────────
+    def add(self, vector_id: str, payload: dict) -> None:
+        """Ajoute (ou remplace) un chunk ; écrit par lots de ``WRITE_BATCH``."""
+        blob = zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._pending.append((vector_id, blob))
+            if len(self._pending) >= WRITE_BATCH:
+                self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        if self._pending:
+            self._db.executemany("INSERT OR REPLACE INTO docs (id, payload) VALUES (?, ?)", self._pending)
+            self._db.commit()
+            self._pending = []
+
+    def retain(self, keep: Set[str]) -> int:
+        """Supprime les chunks absents de ``keep`` (IDs du manifest) ; retourne leur nombre."""
+        self.flush()
+        with self._lock:
+            stale = [(vid,) for (vid,) in self._db.execute("SELECT id FROM docs") if vid not in keep]
+            if stale:
+                self._db.executemany("DELETE FROM docs WHERE id = ?", stale)
+                self._db.commit()
+        return len(stale)
+
+    # ── lecture (recherche) ───────────────────────────────────────────
+    def get_many(self, ids: Sequence[str]) -> Dict[str, dict]:
+        found: Dict[str, dict] = {}
+        uniq = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(uniq), 500):
+                chunk = uniq[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT id, payload FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for vid, blob in rows:
+                    found[vid] = json.loads(zlib.decompress(blob))
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM docs").fetchone()
+        return {"entries": count, "bytes": size}
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+
+def slim_metadata(metadata: dict, keys: Iterable[str]) -> dict:
+    """Métadonnées envoyées à Pinecone : ``airtable_id``, ``keys`` et le marqueur."""
+    return {k: metadata[k] for k in ("airtable_id", *keys) if k in metadata} | {DOC_STORE_KEY: True}
+
+
+_opened: Dict[str, DocStore] = {}
+_opened_lock = threading.Lock()
+
+
+def open_doc_store(name: str) -> Optional[DocStore]:
+    """Doc store d'un index pour la recherche (None si l'index garde ses
+    métadonnées complètes dans Pinecone)."""
+    with _opened_lock:
+        if not DocStore.path_for(name).exists():
+            stale = _opened.pop(name, None)
+            if stale is not None:
+                stale.close()
+            return None
+        if name not in _opened:
+            _opened[name] = DocStore(name)
+        return _opened[name]
+
+
+def drop_doc_store(name: str) -> None:
+    """Supprime le doc store d'un index (ingestion avec DOC_STORE=0)."""
+    with _opened_lock:
+        store = _opened.pop(name, None)
+        if store is not None:
+            store.close()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{DocStore.path_for(name)}{suffix}").unlink(missing_ok=True)
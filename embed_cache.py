@@ -0,0 +1,143 @@
+"""embed_cache.py – Cache disque des embeddings, adressé par le contenu.
+
+Clé = SHA-256(modèle, dimensions, normalize, texte) ; valeur = vecteur float32
+stocké dans SQLite (``RAG_STATE_DIR/embeddings.sqlite``). Le cache est partagé
+entre l'ingestion et les interfaces (mode WAL, accès multi-processus) et borné
+en nombre d'entrées et en octets avec éviction LRU.
+
+Variables d'environnement :
+    EMBED_CACHE              "0" pour désactiver (défaut "1")
+    EMBED_CACHE_MAX_ENTRIES  (défaut 100000)
+    EMBED_CACHE_MAX_MB       (défaut 512)
+"""
+from __future__ import annotations
+import hashlib, os, sqlite3, threading, time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from state import STATE_DIR
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") != "0"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+EMBED_CACHE_MAX_BYTES = int(float(os.getenv("EMBED_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# Vérification des bornes toutes les N insertions
+EVICT_EVERY = 500
+
+
+class EmbeddingCache:
+    """Cache SQLite thread-safe avec éviction LRU et compteurs hit/miss."""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 max_bytes: int = EMBED_CACHE_MAX_BYTES):
+        self.path = Path(path or STATE_DIR / "embeddings.sqlite")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS emb_lru ON emb(last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model_id: str, dimensions: int, normalize: bool, text: str) -> str:
+        h = hashlib.sha256(f"{model_id}\x1f{dimensions}\x1f{int(normalize)}\x1f".encode("utf-8"))
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        uniq = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(uniq), 500):
+                chunk = uniq[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for k, blob in rows:
+                    found[k] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE emb SET last_used=? WHERE key=?", [(now, k) for k in found])
+                self._db.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO emb (key, vec, last_used) VALUES (?, ?, ?)",
+                [(k, array("f", v).tobytes(), now) for k, v in items.items()],
+            )
+            self._db.commit()
+            self._inserts += len(items)
+            if self._inserts >= EVICT_EVERY:
+                self._inserts = 0
+                self._evict()
+
+    def _evict(self) -> None:
+        count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM emb").fetchone()
+        if not count:
+            return
+        excess = count - self.max_entries
+        if size > self.max_bytes:
+            excess = max(excess, int((size - self.max_bytes) / (size / count)) + 1)
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM emb").fetchone()
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": count, "bytes": size}
+
+
+class CachedEmbeddings:
+    """Enveloppe un moteur d'embedding (``embed_documents`` / ``embed_query``)
+    et ne transmet au moteur que les textes absents du cache."""
+
+    def __init__(self, engine, cache: EmbeddingCache):
+        self.engine = engine
+        self.cache = cache
+
+    def _key(self, text: str) -> str:
+        return self.cache.key(self.engine.model_id, self.engine.dimensions, self.engine.normalize, text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            text_of = dict(zip(keys, texts))
+            fresh = dict(zip(missing, self.engine.embed_documents([text_of[k] for k in missing])))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def __getattr__(self, name):
+        # model_id, dimensions, close()… délégués au moteur
+        return getattr(self.engine, name)
+
+
+def with_cache(engine):
+    """Ajoute le cache disque au moteur, sauf si EMBED_CACHE=0."""
+    return CachedEmbeddings(engine, EmbeddingCache()) if EMBED_CACHE_ENABLED else engine
@@ -0,0 +1,163 @@
+"""embeddings.py – Moteur d'embedding Bedrock Titan concurrent et limité en débit.
+
+``BedrockEmbeddings`` (LangChain) appelle Titan un texte à la fois, en série.
+``BedrockEmbeddingEngine`` expose la même interface (``embed_documents`` /
+``embed_query``) mais répartit les appels sur un pool de threads, respecte un
+quota via un token bucket et ré-essaie avec backoff exponentiel en cas de
+throttling, d'erreur 5xx ou d'erreur réseau. L'ordre des résultats est celui des textes en entrée.
+
+Le client est injectable : tout objet exposant ``invoke_model(modelId=…, body=…)``
+(comme ``boto3.client("bedrock-runtime")``) convient, y compris un faux client local.
+"""
+from __future__ import annotations
+import json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+AWS_REGION        = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+BEDROCK_MODEL_ID  = os.getenv("BEDROCK_EMBED_MODEL", "amazon.titan-embed-text-v2:0")
+BEDROCK_DIMENSIONS = int(os.getenv("BEDROCK_EMBED_DIMENSIONS", "1024"))
+# Nombre d'appels Titan simultanés et quota (requêtes / seconde)
+EMBED_CONCURRENCY = int(os.getenv("BEDROCK_EMBED_CONCURRENCY", "8"))
+EMBED_RATE_LIMIT  = float(os.getenv("BEDROCK_EMBED_RPS", "25"))
+
+# Codes d'erreur Bedrock ré-essayables
+RETRYABLE_CODES = {
+    "ThrottlingException", "TooManyRequestsException",
+    "ServiceUnavailableException", "ModelNotReadyException", "ModelTimeoutException",
+}
+
+# Dimensions de sortie supportées par Titan Text Embeddings v2
+TITAN_DIMENSIONS = (256, 512, 1024)
+
+
+def validate_dimensions(dimensions: int) -> int:
+    if dimensions not in TITAN_DIMENSIONS:
+        raise ValueError(f"BEDROCK_EMBED_DIMENSIONS={dimensions} non supporté par Titan v2 "
+                         f"(valeurs possibles : {', '.join(map(str, TITAN_DIMENSIONS))})")
+    return dimensions
+
+
+class TokenBucket:
+    """Limiteur de débit thread-safe : ``rate`` jetons/s, rafale de ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Bloque jusqu'à disposer de ``tokens`` jetons (aucune limite si rate <= 0)."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _transport_errors() -> Tuple[type, ...]:
+    """Erreurs réseau (connexion, timeout de lecture) ré-essayables."""
+    try:
+        from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+    except ImportError:
+        return (ConnectionError, TimeoutError)
+    return (ConnectionError, TimeoutError, BotoConnectionError, HTTPClientError)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Throttling Bedrock, erreur 5xx (``botocore.exceptions.ClientError`` ou
+    équivalent) ou erreur réseau : le client boto3 ne ré-essaie pas lui-même."""
+    if isinstance(exc, _transport_errors()):
+        return True
+    response = getattr(exc, "response", None) or {}
+    code = response.get("Error", {}).get("Code", "")
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return code in RETRYABLE_CODES or status >= 500
+
+
+class BedrockEmbeddingEngine:
+    """Embeddings Titan v2 concurrents, ordonnés, limités en débit."""
+
+    def __init__(self, client, model_id: str = BEDROCK_MODEL_ID,
+                 dimensions: int = BEDROCK_DIMENSIONS, normalize: bool = True,
+                 concurrency: int = EMBED_CONCURRENCY, rate_limit: float = EMBED_RATE_LIMIT,
+                 max_retries: int = 6, base_delay: float = 0.5, max_delay: float = 20.0):
+        self.client = client
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.normalize = normalize
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Pool de workers partagé, créé au premier usage."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="embed")
+            return self._pool
+
+    def _invoke(self, text: str) -> List[float]:
+        body = json.dumps({"inputText": text, "dimensions": self.dimensions, "normalize": self.normalize})
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                resp = self.client.invoke_model(
+                    modelId=self.model_id, body=body,
+                    accept="application/json", contentType="application/json",
+                )
+                return json.loads(resp["body"].read())["embedding"]
+            except Exception as exc:
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                # Backoff exponentiel avec jitter
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        raise AssertionError("unreachable")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= 1 or self.concurrency == 1:
+            return [self._invoke(t) for t in texts]
+        return list(self.pool.map(self._invoke, texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._invoke(text)
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+def bedrock_client(region: str = AWS_REGION, max_pool_connections: int = EMBED_CONCURRENCY):
+    """Client ``bedrock-runtime`` dimensionné pour le pool (retries gérés par le moteur)."""
+    import boto3
+    from botocore.config import Config
+    return boto3.client(
+        "bedrock-runtime", region_name=region,
+        config=Config(max_pool_connections=max(10, max_pool_connections),
+                      retries={"max_attempts": 1, "mode": "standard"}),
+    )
+
+
+def bedrock_engine(client=None, **kwargs) -> BedrockEmbeddingEngine:
+    """Moteur configuré à partir des variables d'environnement."""
+    return BedrockEmbeddingEngine(client or bedrock_client(), **kwargs)
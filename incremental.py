@@ -0,0 +1,189 @@
+"""incremental.py – Ré-ingestion incrémentale : manifest local et détection des changements.
+
+Le manifest associe chaque enregistrement Airtable à l'empreinte de ses
+documents, aux IDs des vecteurs écrits dans Pinecone et à sa date de dernière
+modification. Seuls les enregistrements modifiés sont ré-embeddés ; les
+vecteurs des enregistrements disparus sont supprimés.
+"""
+from __future__ import annotations
+import hashlib, json
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from state import STATE_DIR, load_json, save_json
+
+# Nombre d'IDs par formule OR(RECORD_ID()=…) (limite de longueur d'URL Airtable)
+FETCH_CHUNK = 50
+# Nombre maximal d'IDs par appel delete Pinecone
+DELETE_CHUNK = 1000
+
+
+class IngestManifest:
+    """Manifest persistant : record id → {hash, ids, modified}."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = STATE_DIR / f"manifest_{name}.json"
+        self.records: Dict[str, dict] = {}
+
+    @classmethod
+    def load(cls, name: str) -> "IngestManifest":
+        manifest = cls(name)
+        manifest.records = load_json(manifest.path, {}).get("records", {})
+        return manifest
+
+    def save(self) -> None:
+        save_json(self.path, {"version": 1, "records": self.records})
+
+    def get(self, rec_id: str) -> Optional[dict]:
+        return self.records.get(rec_id)
+
+    def set(self, rec_id: str, digest: str, ids: List[str], modified: Optional[str] = None) -> None:
+        self.records[rec_id] = {"hash": digest, "ids": ids, "modified": modified}
+
+    def pop(self, rec_id: str) -> List[str]:
+        """Retire l'enregistrement du manifest et retourne ses IDs de vecteurs."""
+        return self.records.pop(rec_id, {}).get("ids", [])
+
+
+@dataclass
+class IngestPlan:
+    """Résultat de la comparaison Airtable ↔ manifest."""
+    pending: Dict[str, list] = field(default_factory=dict)          # record id → Documents à (ré)indexer
+    digests: Dict[str, str] = field(default_factory=dict)
+    modified: Dict[str, Optional[str]] = field(default_factory=dict)
+    removed: List[str] = field(default_factory=list)                # record ids disparus / vidés
+    skipped: int = 0
+
+
+def documents_digest(docs: Iterable) -> str:
+    """Empreinte SHA-256 du contenu et des métadonnées envoyés à l'index."""
+    h = hashlib.sha256()
+    for d in docs:
+        h.update(json.dumps([d.page_content, d.metadata], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def changed_record_pages(table, manifest: IngestManifest, modified_field: str) -> Tuple[Iterator[List[dict]], Set[str]]:
+    """Liste légère (id + date de modification) puis lecture complète, page par
+    page, des seuls enregistrements modifiés depuis le dernier passage.
+
+    Retourne ``(pages_de_records_modifiés, ids_présents_dans_airtable)`` ; les
+    pages sont lues paresseusement.
+    """
+    light = table.all(fields=[modified_field])
+    present = {r["id"] for r in light}
+    changed = []
+    for r in light:
+        mod = r.get("fields", {}).get(modified_field)
+        prev = manifest.get(r["id"])
+        if mod is None or prev is None or prev.get("modified") != mod:
+            changed.append(r["id"])
+
+    def pages() -> Iterator[List[dict]]:
+        for i in range(0, len(changed), FETCH_CHUNK):
+            chunk = changed[i:i + FETCH_CHUNK]
+            formula = "OR(" + ",".join(f"RECORD_ID()='{rid}'" for rid in chunk) + ")"
+            yield table.all(formula=formula)
+    return pages(), present
+
+
+def plan_records(records: List[dict], manifest: IngestManifest,
+                 build_documents: Callable[[List[dict]], list],
+                 modified_field: Optional[str] = None, force: bool = False,
+                 plan: Optional[IngestPlan] = None) -> IngestPlan:
+    """Compare un lot d'enregistrements au manifest (sans détection des
+    suppressions) ; ``plan`` permet d'accumuler page après page."""
+    plan = plan if plan is not None else IngestPlan()
+    for r in records:
+        docs = build_documents([r])
+        if not docs:
+            # Enregistrement vidé : traité comme une suppression
+            plan.removed.append(r["id"])
+            continue
+        digest = documents_digest(docs)
+        mod = r.get("fields", {}).get(modified_field) if modified_field else None
+        prev = manifest.get(r["id"])
+        if not force and prev and prev.get("hash") == digest:
+            plan.skipped += 1
+            if mod != prev.get("modified"):
+                manifest.set(r["id"], digest, prev.get("ids", []), mod)
+            continue
+        plan.pending[r["id"]] = docs
+        plan.digests[r["id"]] = digest
+        plan.modified[r["id"]] = mod
+    return plan
+
+
+def finish_plan(plan: IngestPlan, read: Set[str], present: Set[str], manifest: IngestManifest) -> None:
+    """Une fois toutes les pages lues : ``present`` contient tous les IDs encore
+    présents dans Airtable (y compris ceux non relus, comptés inchangés) ; les
+    enregistrements du manifest absents sont marqués supprimés."""
+    plan.skipped += len(present - read)
+    plan.removed.extend(rid for rid in manifest.records
+                        if rid not in present and rid not in plan.removed)
+
+
+def vector_ids(docs: list) -> List[str]:
+    """IDs déterministes ``{airtable_id}_{n}`` où ``n`` est le numéro du chunk
+    *dans l'enregistrement* : insérer ou supprimer un enregistrement ne décale
+    plus les IDs des autres."""
+    counters: Dict[str, int] = {}
+    ids = []
+    for d in docs:
+        rec_id = d.metadata["airtable_id"]
+        n = counters.get(rec_id, 0)
+        counters[rec_id] = n + 1
+        ids.append(f"{rec_id}_{n}")
+    return ids
+
+
+def record_id(vector_id: str) -> str:
+    return vector_id.rsplit("_", 1)[0]
+
+
+def apply_plan(index, manifest: IngestManifest, plan: IngestPlan, ids: List[str],
+               failed: Iterable[str] = (), namespace: Optional[str] = None) -> Tuple[int, int]:
+    """Après l'upsert : supprime les chunks surnuméraires des enregistrements
+    raccourcis et les vecteurs des enregistrements disparus, puis met à jour
+    le manifest. Les enregistrements dont un vecteur a échoué (``failed``)
+    gardent leur ancienne entrée et seront retentés au prochain passage.
+    Retourne ``(mis_à_jour, supprimés)``."""
+    failed_records = {record_id(vid) for vid in failed}
+    new_ids: Dict[str, List[str]] = {}
+    for vid in ids:
+        if record_id(vid) not in failed_records:
+            new_ids.setdefault(record_id(vid), []).append(vid)
+
+    stale: List[str] = []
+    for rec_id, rec_ids in new_ids.items():
+        old = (manifest.get(rec_id) or {}).get("ids", [])
+        stale += [vid for vid in old if vid not in rec_ids]
+        manifest.set(rec_id, plan.digests[rec_id], rec_ids, plan.modified[rec_id])
+    deleted = 0
+    for rec_id in plan.removed:
+        old = manifest.pop(rec_id)
+        deleted += bool(old)
+        stale += old
+    if stale:
+        delete_vectors(index, stale, namespace)
+    manifest.save()
+    return len(new_ids), deleted
+
+
+def prune_index(index, manifest: IngestManifest, namespace: Optional[str] = None) -> int:
+    """Supprime de l'index tout vecteur inconnu du manifest (orphelins laissés
+    par l'ancien schéma d'IDs ou par des ingestions interrompues)."""
+    keep = {vid for entry in manifest.records.values() for vid in entry.get("ids", [])}
+    ns = {"namespace": namespace} if namespace else {}
+    orphans = [vid for page in index.list(**ns) for vid in page if vid not in keep]
+    if orphans:
+        delete_vectors(index, orphans, namespace)
+    return len(orphans)
+
+
+def delete_vectors(index, ids: List[str], namespace: Optional[str] = None) -> None:
+    """Supprime des vecteurs Pinecone par lots."""
+    ns = {"namespace": namespace} if namespace else {}
+    for i in range(0, len(ids), DELETE_CHUNK):
+        index.delete(ids=ids[i:i + DELETE_CHUNK], **ns)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+ingest_engine.py – Moteur d'ingestion unique, piloté par un schéma de domaine.
+
+Chaque domaine (prospects, candidats…) est décrit par un ``DomainSchema`` :
+table Airtable, ordre des champs, mapping vers les métadonnées, index/namespace
+Pinecone, taille des chunks. Un même processus peut ingérer plusieurs domaines
+en partageant le client Bedrock (et son pool de workers), la connexion Pinecone
+et le cache d'embeddings.
+
+Ajouter un domaine = configuration : un fichier JSON désigné par
+INGEST_DOMAINS_FILE contenant une liste d'objets, par exemple ::
+
+    [{"name": "partenaires", "table": "Partenaires", "index_name": "partner-vectors",
+      "field_map": {"Nom": "nom", "Secteur": "secteur", "Notes": "notes"},
+      "facets": ["secteur"]}]
+
+Les valeurs distinctes des champs ``facets`` sont enregistrées à chaque
+ingestion : la recherche s'en sert pour transformer les termes reconnus dans
+la question en filtres (cf. ``query_parser``).
+
+Usage :
+    python ingest_engine.py                          # tous les domaines
+    python ingest_engine.py prospects --incremental  # un domaine, incrémental
+"""
+from __future__ import annotations
+import json, os, sys
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pyairtable import Table
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from embeddings import BedrockEmbeddingEngine, bedrock_client, validate_dimensions
+from embed_cache import with_cache
+from incremental import IngestManifest, apply_plan, changed_record_pages, prune_index
+from ingest_pipeline import run_pipeline
+from sparse import HYBRID_SEARCH, BM25Encoder
+from query_parser import FacetIndex
+from doc_store import DOC_STORE_ENABLED, DocStore, drop_doc_store, slim_metadata
+from core import PineconeConnections, connections
+from local_index import VECTOR_BACKEND
+from state import aliases_of, bump_index_version, resolve_index
+from telemetry import format_stages, trace, trace_stages
+from upsert_writer import UpsertWriter
+
+# ── config ───────────────────────────────────────────────────────────
+load_dotenv()
+AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
+AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
+
+AWS_REGION    = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+BEDROCK_MODEL = os.getenv("BEDROCK_EMBED_MODEL", "amazon.titan-embed-text-v2:0")
+# 256 / 512 / 1024 : réduire la dimension implique une ré-indexation complète
+BEDROCK_DIM   = validate_dimensions(int(os.getenv("BEDROCK_EMBED_DIMENSIONS", "1024")))
+
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+
+# Champ Airtable de type « Last modified time » (optionnel) : en mode
+# incrémental, seuls les enregistrements dont il a changé sont relus.
+MODIFIED_FIELD = os.getenv("AIRTABLE_MODIFIED_FIELD")
+DOMAINS_FILE   = os.getenv("INGEST_DOMAINS_FILE")
+
+
+@dataclass(frozen=True)
+class DomainSchema:
+    """Description déclarative d'un domaine à indexer."""
+    name: str
+    table: str
+    index_name: str
+    field_map: Dict[str, str]                 # champ Airtable → clé de métadonnée
+    field_order: Tuple[str, ...] = ()         # ordre dans le texte (défaut : field_map)
+    namespace: Optional[str] = None
+    store_text: bool = False                  # copie du chunk dans metadata["text"]
+    chunk_size: int = 800
+    chunk_overlap: int = 50
+    modified_field: Optional[str] = None
+    label: str = ""                           # libellé pour les messages
+    facets: Tuple[str, ...] = ()              # métadonnées filtrables depuis la question
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return self.field_order or tuple(self.field_map)
+
+    @property
+    def manifest_name(self) -> str:
+        return f"{self.index_name}_{self.namespace}" if self.namespace else self.index_name
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DomainSchema":
+        data = dict(data)
+        data["field_order"] = tuple(data.get("field_order", ()))
+        data["facets"] = tuple(data.get("facets", ()))
+        return cls(**data)
+
+
+PROSPECTS = DomainSchema(
+    name="prospects",
+    table=os.getenv("AIRTABLE_TABLE_NAME", "Prospects"),
+    index_name=os.getenv("PINECONE_INDEX_NAME", "airtable-vectors"),
+    field_map={
+        "Entreprise": "entreprise",
+        "Contact": "contact",
+        "Email": "email",
+        "Phone": "phone",
+        "Secteur": "secteur",
+        "Statut": "statut",
+        "Notes": "notes",
+    },
+    store_text=True,
+    modified_field=MODIFIED_FIELD,
+    label="prospects",
+    facets=("secteur", "statut"),
+)
+
+CANDIDATES = DomainSchema(
+    name="candidates",
+    table=os.getenv("AIRTABLE_CANDIDATE_TABLE_NAME", "Candidats"),
+    index_name=os.getenv("CANDIDATE_INDEX_NAME", "candidate-vectors"),
+    field_map={
+        "Nom": "nom",
+        "Role": "role",
+        "Competences": "competences",
+        "Experience": "experience",
+        "Localisation": "localisation",
+        "Disponibilite": "disponibilite",
+        "Notes": "notes",
+    },
+    modified_field=os.getenv("AIRTABLE_CANDIDATE_MODIFIED_FIELD", MODIFIED_FIELD),
+    label="candidats",
+    facets=("localisation", "disponibilite"),
+)
+
+
+def load_domains() -> Dict[str, DomainSchema]:
+    """Domaines intégrés + domaines additionnels déclarés dans INGEST_DOMAINS_FILE."""
+    domains = {PROSPECTS.name: PROSPECTS, CANDIDATES.name: CANDIDATES}
+    if DOMAINS_FILE:
+        with open(DOMAINS_FILE, encoding="utf-8") as fh:
+            for entry in json.load(fh):
+                schema = DomainSchema.from_dict(entry)
+                domains[schema.name] = schema
+    return domains
+
+
+DOMAINS = load_domains()
+
+# ── helpers ───────────────────────────────────────────────────────────
+def build_documents(schema: DomainSchema, records: List[dict]) -> List[Document]:
+    """Transforme les enregistrements Airtable en Documents LangChain.
+
+    Les champs du schéma sont placés dans le texte dans l'ordre déclaré ; les
+    métadonnées structurées sont conservées sur chaque chunk.
+    """
+    docs: List[Document] = []
+    for r in records:
+        f = r.get("fields", {})
+        content = "\n".join(f"{k}: {f[k]}" for k in schema.fields if f.get(k))
+        if not content.strip():
+            continue
+        meta = {"airtable_id": r["id"]}
+        for k_src, k_meta in schema.field_map.items():
+            if f.get(k_src):
+                meta[k_meta] = f[k_src]
+        docs.append(Document(page_content=content, metadata=meta))
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=schema.chunk_size, chunk_overlap=schema.chunk_overlap)
+    return splitter.split_documents(docs)
+
+
+def to_vector(schema: DomainSchema, vid: str, doc, values: List[float],
+              encoder: Optional[BM25Encoder] = None, store: Optional[DocStore] = None) -> dict:
+    """Vecteur Pinecone ; avec ``encoder``, ajoute le vecteur creux BM25 du chunk
+    (et enregistre ses termes dans les statistiques de corpus). Avec ``store``,
+    les métadonnées complètes y sont écrites et Pinecone ne reçoit que
+    ``airtable_id`` et les facettes (champs filtrables)."""
+    meta = doc.metadata | {"text": doc.page_content} if schema.store_text else doc.metadata
+    if store is not None:
+        store.add(vid, meta)
+        meta = slim_metadata(meta, schema.facets)
+    vec = {"id": vid, "values": values, "metadata": meta}
+    if encoder is not None:
+        sparse = encoder.encode_document(doc.page_content, encoder.add(vid, doc.page_content))
+        if sparse["indices"]:
+            vec["sparse_values"] = sparse
+    return vec
+
+
+def validate_env() -> None:
+    required = {"AIRTABLE_API_KEY": AIRTABLE_API_KEY, "AIRTABLE_BASE_ID": AIRTABLE_BASE_ID}
+    if VECTOR_BACKEND != "local":
+        required["PINECONE_API_KEY"] = PINECONE_API_KEY
+    for name, val in required.items():
+        if not val:
+            raise RuntimeError(f"Variable manquante: {name}")
+
+
+# ── engine ────────────────────────────────────────────────────────────
+class IngestEngine:
+    """Ressources partagées entre domaines : embedder, client Pinecone, index."""
+
+    def __init__(self, embedder=None, pinecone_client=None):
+        self._embedder = embedder
+        # Client injecté (tests) ; sinon gestionnaire partagé du processus
+        self._connections = PineconeConnections(client=pinecone_client) if pinecone_client else None
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            # Concurrence et quota : BEDROCK_EMBED_CONCURRENCY / BEDROCK_EMBED_RPS
+            self._embedder = with_cache(BedrockEmbeddingEngine(
+                bedrock_client(AWS_REGION), model_id=BEDROCK_MODEL,
+                dimensions=BEDROCK_DIM, normalize=True))
+        return self._embedder
+
+    @property
+    def connections(self) -> PineconeConnections:
+        return self._connections or connections()
+
+    @property
+    def pinecone(self):
+        return self.connections.client
+
+    def index(self, schema: DomainSchema):
+        """Handle d'index (créé au besoin), partagé via le gestionnaire de connexions.
+
+        Avec VECTOR_BACKEND=local, index NumPy local (cf. ``local_index``).
+        """
+        return self.connections.index(schema.index_name, create=True, dimension=BEDROCK_DIM)
+
+    @staticmethod
+    def table(schema: DomainSchema) -> Table:
+        return Table(AIRTABLE_API_KEY, AIRTABLE_BASE_ID, schema.table)
+
+    def record_pages(self, schema: DomainSchema) -> Iterator[List[dict]]:
+        """Pages de 100 enregistrements, lues au fil de l'eau."""
+        return self.table(schema).iterate(page_size=100)
+
+    def ingest(self, schema: DomainSchema, incremental: bool = False) -> dict:
+        """Indexe un domaine.
+
+        En mode incrémental, seuls les enregistrements dont le contenu a changé
+        depuis le dernier passage (cf. manifest local) sont ré-embeddés ; les
+        vecteurs des enregistrements disparus sont supprimés dans tous les cas.
+
+        ``schema.index_name`` peut être un nom logique : l'index physique en
+        service (alias, cf. ``reindex.py``) est alimenté, avec son propre état
+        local (manifest, encodeur BM25, facettes, doc store).
+
+        Le temps passé par étage (lecture, embeddings, upsert) est affiché en
+        fin de domaine et exporté (cf. ``telemetry.py``).
+        """
+        with trace(f"ingest/{schema.name}", incremental=incremental) as sp:
+            stats = self._ingest(replace(schema, index_name=resolve_index(schema.index_name)), incremental)
+            sp.set(vectors=stats["vectors"])
+            stages = trace_stages()
+            if stages:
+                print(f"   ⏱️  {format_stages(stages)}")
+        return stats
+
+    def _ingest(self, schema: DomainSchema, incremental: bool) -> dict:
+        label = schema.label or schema.name
+        manifest = IngestManifest.load(schema.manifest_name)
+
+        print(f"1/2 [{schema.name}] Lecture Airtable → embeddings → upload Pinecone (en flux)…")
+        present = None
+        if incremental and schema.modified_field and manifest.records:
+            pages, present = changed_record_pages(self.table(schema), manifest, schema.modified_field)
+        else:
+            pages = self.record_pages(schema)
+        idx = self.index(schema)
+        encoder = None
+        if HYBRID_SEARCH and not self.connections.supports_sparse(schema.index_name):
+            raise RuntimeError(f"HYBRID_SEARCH=1 mais l'index {schema.index_name} n'est pas en métrique dotproduct : "
+                               f"lancer python reindex.py {schema.name} pour créer une génération hybride")
+        if HYBRID_SEARCH:
+            # Passage complet : statistiques BM25 réapprises sur tout le corpus
+            encoder = (BM25Encoder.load(schema.manifest_name) if incremental else None) or BM25Encoder()
+            if encoder.n_docs > len(encoder.terms):
+                print("   ⚠️ encodeur BM25 à l'ancien format : lancer une ingestion complète pour le réapprendre")
+        facets = None
+        if schema.facets:
+            # Incrémental : nouvelles valeurs ajoutées au dictionnaire existant
+            loaded = FacetIndex.load(schema.manifest_name, schema.facets) if incremental else None
+            facets = loaded or FacetIndex(schema.facets)
+        if DOC_STORE_ENABLED:
+            store = DocStore(schema.manifest_name)
+        else:
+            store = None
+            drop_doc_store(schema.manifest_name)   # Pinecone reçoit de nouveau toutes les métadonnées
+
+        def build(recs: List[dict]):
+            docs = build_documents(schema, recs)
+            return facets.observe(docs) if facets is not None else docs
+
+        writer = UpsertWriter(idx, namespace=schema.namespace)
+        try:
+            result = run_pipeline(
+                pages, manifest, build, self.embedder, writer,
+                to_vector=lambda vid, d, v: to_vector(schema, vid, d, v, encoder, store),
+                present=present, modified_field=schema.modified_field, force=not incremental,
+            )
+        finally:
+            writer.close()
+        if facets is not None:
+            facets.save(schema.manifest_name)
+            print("   facettes : " + ", ".join(f"{f} ({len(v)} valeurs)" for f, v in facets.values.items()))
+        print(f"   {len(present or result.read)} {label} lus, {result.docs} docs")
+        if result.first_vector_s is not None:
+            print(f"   premier lot envoyé après {result.first_vector_s:.1f} s")
+        print(f"   {result.report}")
+        if hasattr(self.embedder, "cache"):
+            st = self.embedder.cache.stats()
+            print(f"   cache embeddings : {st['hits']} hits, {st['misses']} misses")
+
+        print(f"2/2 [{schema.name}] Nettoyage et manifest…")
+        updated, deleted = apply_plan(idx, manifest, result.plan, result.ids,
+                                      failed=result.report.failed_ids, namespace=schema.namespace)
+        orphans = 0
+        if not incremental:
+            # Ré-indexation complète : nettoyage des orphelins éventuels
+            orphans = prune_index(idx, manifest, schema.namespace)
+            if orphans:
+                print(f"   {orphans} vecteurs orphelins supprimés")
+
+        if encoder is not None:
+            # Statistiques alignées sur le manifest (chunks supprimés ou raccourcis)
+            encoder.retain({vid for entry in manifest.records.values() for vid in entry.get("ids", [])})
+            encoder.save(schema.manifest_name)
+            print(f"   encodeur BM25 : {encoder.n_docs} chunks, {len(encoder.df)} termes")
+        if hasattr(idx, "flush"):
+            idx.flush()   # index local : publication de la nouvelle génération
+        if store is not None:
+            # Doc store aligné sur le manifest (chunks supprimés ou raccourcis)
+            removed = store.retain({vid for entry in manifest.records.values() for vid in entry.get("ids", [])})
+            st = store.stats()
+            print(f"   doc store : {st['entries']} chunks, {st['bytes'] / 1024 / 1024:.1f} Mo"
+                  + (f", {removed} retirés" if removed else ""))
+            store.close()
+        print(f"   {result.plan.skipped} inchangés, {updated} mis à jour, {deleted} supprimés")
+        if updated or deleted or orphans:
+            # Invalide les réponses mises en cache sur l'ancien contenu de l'index
+            for name in {schema.index_name, *aliases_of(schema.index_name)}:
+                bump_index_version(name)
+        return {"domain": schema.name, "skipped": result.plan.skipped, "updated": updated,
+                "deleted": deleted, "orphans": orphans, "vectors": result.report.upserted,
+                "seconds": result.seconds}
+
+    def ingest_many(self, names: List[str], incremental: bool = False) -> List[dict]:
+        return [self.ingest(DOMAINS[name], incremental) for name in names]
+
+    def close(self) -> None:
+        if self._embedder is not None:
+            self._embedder.close()
+
+
+# ── main ──────────────────────────────────────────────────────────────
+def main(argv: List[str]) -> None:
+    incremental = "--incremental" in argv
+    names = [a for a in argv if not a.startswith("--")] or list(DOMAINS)
+    unknown = [n for n in names if n not in DOMAINS]
+    if unknown:
+        sys.exit(f"❌ Domaine(s) inconnu(s) : {', '.join(unknown)} (disponibles : {', '.join(DOMAINS)})")
+    validate_env()
+    engine = IngestEngine()
+    try:
+        engine.ingest_many(names, incremental)
+    finally:
+        engine.close()
+    print("✅ Terminé !")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
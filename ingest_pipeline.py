@@ -0,0 +1,164 @@
+"""ingest_pipeline.py – Pipeline d'ingestion en flux : pages Airtable → documents
+→ embeddings → upsert Pinecone.
+
+Chaque étage tourne dans son propre thread et communique avec le suivant par
+une file bornée : la mémoire reste plate (quelques pages en vol au plus) et les
+appels réseau (Airtable, Bedrock, Pinecone) se recouvrent au lieu de
+s'enchaîner. Les upserts de plusieurs pages sont en vol simultanément sur le
+pool du writer (``queue_size`` pages au plus). Seuls les IDs et empreintes sont
+conservés jusqu'à la fin pour mettre à jour le manifest.
+"""
+from __future__ import annotations
+import contextvars, os, queue, threading, time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Set
+
+from incremental import IngestManifest, IngestPlan, finish_plan, plan_records, vector_ids
+from telemetry import record, span
+from upsert_writer import PendingWrite, UpsertReport, UpsertWriter
+
+# Nombre de lots en attente entre deux étages
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Un autre étage a échoué : arrêt de l'étage courant."""
+
+
+@dataclass
+class PipelineResult:
+    plan: IngestPlan
+    ids: List[str] = field(default_factory=list)
+    report: UpsertReport = field(default_factory=UpsertReport)
+    read: Set[str] = field(default_factory=set)
+    docs: int = 0
+    first_vector_s: Optional[float] = None
+    seconds: float = 0.0
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> None:
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def _close(q: queue.Queue, stop: threading.Event) -> None:
+    try:
+        _put(q, _DONE, stop)
+    except _Stopped:
+        pass
+
+
+def run_pipeline(pages: Iterable[List[dict]], manifest: IngestManifest,
+                 build_documents: Callable[[List[dict]], list], embedder, writer: UpsertWriter,
+                 to_vector: Callable, present: Optional[Set[str]] = None,
+                 modified_field: Optional[str] = None, force: bool = False,
+                 queue_size: int = QUEUE_SIZE) -> PipelineResult:
+    """Exécute le pipeline et retourne le plan cumulé (sans documents en mémoire).
+
+    ``to_vector(id, document, valeurs)`` construit le dict envoyé à Pinecone.
+    ``present`` : IDs encore présents dans Airtable ; par défaut, ceux lus.
+    """
+    result = PipelineResult(plan=IngestPlan())
+    docs_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    vecs_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    start = time.perf_counter()
+
+    def read_stage():
+        try:
+            t = time.perf_counter()
+            for page in pages:
+                result.read.update(r["id"] for r in page)
+                plan_records(page, manifest, build_documents, modified_field, force, plan=result.plan)
+                docs = [d for rec_docs in result.plan.pending.values() for d in rec_docs]
+                result.plan.pending.clear()
+                # Lecture Airtable + planification, hors attente de l'étage suivant
+                record("ingest.read", time.perf_counter() - t, records=len(page), docs=len(docs))
+                if docs:
+                    _put(docs_q, docs, stop)
+                t = time.perf_counter()
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            _close(docs_q, stop)
+
+    def embed_stage():
+        try:
+            while (docs := _get(docs_q, stop)) is not _DONE:
+                with span("ingest.embed", docs=len(docs)):
+                    vecs = embedder.embed_documents([d.page_content for d in docs])
+                ids = vector_ids(docs)
+                _put(vecs_q, [to_vector(vid, d, v) for vid, d, v in zip(ids, docs, vecs)], stop)
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            _close(vecs_q, stop)
+
+    # Chaque étage hérite du contexte de trace de l'appelant
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(stage,), name=name, daemon=True)
+               for stage, name in ((read_stage, "ingest-read"), (embed_stage, "ingest-embed"))]
+    for t in threads:
+        t.start()
+    in_flight: deque = deque()
+
+    def finish(pending: PendingWrite) -> None:
+        report = pending.result()
+        record("ingest.upsert", report.seconds, vectors=pending.vectors,
+               failed=len(report.failed_ids), retries=report.retries)
+        result.report.merge(report)
+
+    upsert_start = None
+    try:
+        while (batch := _get(vecs_q, stop)) is not _DONE:
+            if result.first_vector_s is None:
+                result.first_vector_s = time.perf_counter() - start
+                upsert_start = time.perf_counter()
+            in_flight.append(writer.submit(batch))
+            result.ids += [v["id"] for v in batch]
+            result.docs += len(batch)
+            while len(in_flight) > queue_size:
+                finish(in_flight.popleft())
+        while in_flight:
+            finish(in_flight.popleft())
+        if upsert_start is not None:
+            # Pages recouvrantes : débit mesuré sur la durée réelle de l'étage
+            result.report.seconds = time.perf_counter() - upsert_start
+    except _Stopped:
+        pass
+    except BaseException as exc:
+        errors.append(exc)
+        stop.set()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    finish_plan(result.plan, result.read, present if present is not None else result.read, manifest)
+    result.seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,410 @@
+"""local_index.py – Index vectoriel local (NumPy + fichier mappé en mémoire).
+
+Alternative à Pinecone pour des bases de quelques dizaines de milliers de
+vecteurs : pas d'aller-retour réseau, recherche en quelques millisecondes,
+développement hors-ligne. Même sous-ensemble d'API que ``pinecone.Index`` (upsert, query,
+delete, list, fetch, describe_index_stats), y compris les vecteurs creux.
+
+Stockage (``RAG_STATE_DIR/local_index/<nom>/``) :
+- ``vectors.<gen>.npy`` : matrice float32, int8 (+ ``scales.<gen>.npy``) ou
+  binaire (cf. ``quantization``), ouverte en ``mmap_mode="r"`` ;
+- ``full.<gen>.npy`` : copie float32 pour le re-rank des index quantifiés
+  (seules les lignes des candidats sont lues depuis le disque) ;
+- ``meta.json`` : IDs, métadonnées, vecteurs creux, génération courante.
+
+Les écritures se font en mémoire puis ``flush()`` publie une nouvelle
+génération (fichiers écrits avant ``meta.json``, remplacé atomiquement) ; les
+lecteurs d'autres processus la rechargent au prochain appel. Les fichiers de
+la génération précédente ne sont supprimés qu'au flush suivant : un lecteur
+qui vient de lire l'ancien ``meta.json`` peut encore les ouvrir.
+
+Les filtres de métadonnées ($eq, $ne, $in, $nin, $gt/$gte/$lt/$lte, $and,
+$or) sont évalués sur des index colonnaires (valeur → positions) construits au
+chargement.
+
+Variables d'environnement :
+    VECTOR_BACKEND       "local" pour utiliser cet index à la place de Pinecone
+    LOCAL_INDEX_DTYPE    "float32" (défaut), "int8" ou "binary"
+    LOCAL_INDEX_RERANK   facteur de présélection avant re-rank float32 des index
+                         quantifiés (défaut 4 ; 0 = pas de re-rank ni de copie float32)
+"""
+from __future__ import annotations
+import os, shutil, threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from quantization import DTYPES, bytes_per_vector, dequantize, quantize, scores
+from state import STATE_DIR, load_json, save_json
+
+VECTOR_BACKEND     = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DTYPE  = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+LOCAL_INDEX_RERANK = int(os.getenv("LOCAL_INDEX_RERANK", "4"))
+LOCAL_INDEX_DIR    = STATE_DIR / "local_index"
+
+
+def _scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+class ColumnIndex:
+    """Index colonnaires des métadonnées : clé → valeur → positions."""
+
+    def __init__(self, metadata: List[dict]):
+        self.size = len(metadata)
+        self.postings: Dict[str, Dict[object, np.ndarray]] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        raw: Dict[str, Dict[object, List[int]]] = {}
+        numeric: Dict[str, Dict[int, float]] = {}
+        for pos, md in enumerate(metadata):
+            for key, value in md.items():
+                values = value if isinstance(value, list) else [value]
+                for v in values:
+                    if _scalar(v):
+                        raw.setdefault(key, {}).setdefault(v, []).append(pos)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    numeric.setdefault(key, {})[pos] = float(value)
+        for key, by_value in raw.items():
+            self.postings[key] = {v: np.asarray(p, dtype=np.int64) for v, p in by_value.items()}
+        for key, by_pos in numeric.items():
+            col = np.full(self.size, np.nan, dtype=np.float64)
+            col[list(by_pos)] = list(by_pos.values())
+            self.columns[key] = col
+
+    def _values_mask(self, key: str, values) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        postings = self.postings.get(key, {})
+        for v in values:
+            if v in postings:
+                mask[postings[v]] = True
+        return mask
+
+    def mask(self, flt: dict) -> np.ndarray:
+        """Masque booléen des positions satisfaisant un filtre Pinecone."""
+        mask = np.ones(self.size, dtype=bool)
+        for key, cond in flt.items():
+            if key == "$and":
+                for c in cond:
+                    mask &= self.mask(c)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for c in cond:
+                    any_mask |= self.mask(c)
+                mask &= any_mask
+                continue
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, arg in cond.items():
+                if op == "$eq":
+                    mask &= self._values_mask(key, [arg])
+                elif op == "$in":
+                    mask &= self._values_mask(key, arg)
+                elif op == "$ne":
+                    mask &= ~self._values_mask(key, [arg])
+                elif op == "$nin":
+                    mask &= ~self._values_mask(key, arg)
+                elif op in ("$gt", "$gte", "$lt", "$lte"):
+                    col = self.columns.get(key)
+                    if col is None:
+                        mask[:] = False
+                        continue
+                    with np.errstate(invalid="ignore"):
+                        mask &= {"$gt": col > arg, "$gte": col >= arg,
+                                 "$lt": col < arg, "$lte": col <= arg}[op]
+                else:
+                    raise ValueError(f"Opérateur de filtre non supporté : {op}")
+        return mask
+
+
+class LocalIndex:
+    """Index local persistant, imitant ``pinecone.Index``.
+
+    En écriture, les vecteurs sont tenus en float32 (exact) ; ``flush()`` les
+    quantifie selon ``dtype`` et publie la génération. En lecture, le balayage
+    se fait sur la matrice quantifiée puis, si ``rerank`` > 0, les
+    ``top_k × rerank`` meilleurs candidats sont re-classés en float32.
+    """
+
+    def __init__(self, name: str, dimension: Optional[int] = None, metric: str = "cosine",
+                 dtype: str = LOCAL_INDEX_DTYPE, rerank: int = LOCAL_INDEX_RERANK,
+                 root: Optional[Path] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"LOCAL_INDEX_DTYPE doit valoir {', '.join(DTYPES)}")
+        self.name = name
+        self.dir = Path(root or LOCAL_INDEX_DIR) / name
+        self.dimension = dimension
+        self.metric = metric
+        self.dtype = dtype
+        self.rerank = rerank
+        self._lock = threading.RLock()
+        self._meta_mtime: Optional[float] = None
+        self._generation = 0
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._meta: List[dict] = []
+        self._sparse: List[Dict[int, float]] = []
+        self._codes: Optional[np.ndarray] = None       # matrice quantifiée (mmap)
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[np.ndarray] = None        # float32 pour le re-rank (mmap)
+        self._buf: Optional[np.ndarray] = None         # float32 en écriture
+        self._columns: Optional[ColumnIndex] = None
+        self._sparse_index: Optional[Dict[int, tuple]] = None
+        self._writable = False
+        self._count = 0
+        self._load()
+
+    # ── persistance ───────────────────────────────────────────────────
+    @property
+    def _meta_path(self) -> Path:
+        return self.dir / "meta.json"
+
+    def _files(self, generation: int) -> Dict[str, Path]:
+        return {kind: self.dir / f"{kind}.{generation}.npy" for kind in ("vectors", "scales", "full")}
+
+    def _load(self) -> None:
+        """(Re)charge la dernière génération publiée si elle a changé."""
+        try:
+            mtime = self._meta_path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime or self._writable:
+            return
+        data = load_json(self._meta_path, None)
+        if not data:
+            return
+        files = self._files(data["generation"])
+        self.dimension, self.metric, self.dtype = data["dimension"], data["metric"], data["dtype"]
+        self._codes = np.load(files["vectors"], mmap_mode="r")
+        self._scales = np.load(files["scales"], mmap_mode="r") if files["scales"].exists() else None
+        self._full = np.load(files["full"], mmap_mode="r") if files["full"].exists() else None
+        self._generation = data["generation"]
+        self._ids = data["ids"]
+        self._pos = {vid: i for i, vid in enumerate(self._ids)}
+        self._meta = data["metadata"]
+        self._sparse = [{int(k): v for k, v in s.items()} for s in data["sparse"]]
+        self._count = len(self._ids)
+        self._invalidate()
+        self._meta_mtime = mtime
+
+    def _float_rows(self, rows=slice(None)) -> np.ndarray:
+        """Vecteurs float32 (exacts si disponibles, sinon déquantifiés)."""
+        if self._writable:
+            return self._buf[:self._count][rows]
+        if self._full is not None or self.dtype == "float32":
+            return np.asarray((self._full if self._full is not None else self._codes)[rows], dtype=np.float32)
+        scales = self._scales[rows] if self._scales is not None else None
+        return dequantize(self._codes[rows], scales, self.dtype, self.dimension)
+
+    def _ensure_writable(self) -> None:
+        if self._writable:
+            return
+        self._load()
+        buf = np.array(self._float_rows()[:self._count]) if self._codes is not None else None
+        self._buf = buf
+        self._writable = True
+
+    def _invalidate(self) -> None:
+        self._columns = None
+        self._sparse_index = None
+
+    def flush(self) -> None:
+        """Quantifie et publie l'état courant (nouvelle génération) pour tous les lecteurs."""
+        with self._lock:
+            if not self._writable:
+                return
+            self.dir.mkdir(parents=True, exist_ok=True)
+            # Génération N-2 : plus aucun lecteur ne peut la désigner
+            old = self._files(self._generation - 1)
+            self._generation += 1
+            files = self._files(self._generation)
+            full = self._buf[:self._count] if self._buf is not None else np.zeros((0, self.dimension or 0), np.float32)
+            codes, scales = quantize(full, self.dtype)
+            np.save(files["vectors"], codes)
+            if scales is not None:
+                np.save(files["scales"], scales)
+            if self.dtype != "float32" and self.rerank > 0:
+                np.save(files["full"], full)
+            save_json(self._meta_path, {
+                "generation": self._generation, "dimension": self.dimension, "metric": self.metric,
+                "dtype": self.dtype, "ids": self._ids, "metadata": self._meta,
+                "sparse": [{str(k): v for k, v in s.items()} for s in self._sparse],
+            })
+            for path in old.values():
+                if path.exists():
+                    path.unlink()
+            self._writable = False
+            self._buf = None
+            self._meta_mtime = None
+            self._load()
+
+    # ── écriture ──────────────────────────────────────────────────────
+    def _normalized(self, values) -> np.ndarray:
+        vec = np.asarray(values, dtype=np.float32)
+        if self.metric == "cosine":
+            norm = np.linalg.norm(vec)
+            vec = vec / norm if norm else vec
+        return vec
+
+    def upsert(self, vectors: List[dict], namespace: Optional[str] = None, **_) -> dict:
+        with self._lock:
+            self._ensure_writable()
+            for v in vectors:
+                if self.dimension is None:
+                    self.dimension = len(v["values"])
+                pos = self._pos.get(v["id"])
+                if pos is None:
+                    pos = self._pos[v["id"]] = self._count
+                    self._ids.append(v["id"])
+                    self._meta.append({})
+                    self._sparse.append({})
+                    self._count += 1
+                    self._grow(self._count)
+                self._buf[pos] = self._normalized(v["values"])
+                self._meta[pos] = v.get("metadata") or {}
+                sparse = v.get("sparse_values")
+                self._sparse[pos] = dict(zip(sparse["indices"], sparse["values"])) if sparse else {}
+            self._invalidate()
+        return {"upserted_count": len(vectors)}
+
+    def _grow(self, needed: int) -> None:
+        size = 0 if self._buf is None else len(self._buf)
+        if needed <= size:
+            return
+        # Croissance géométrique du tampon
+        grown = np.zeros((max(1024, 2 * size, needed), self.dimension), dtype=np.float32)
+        if self._buf is not None:
+            grown[:size] = self._buf
+        self._buf = grown
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None, **_) -> None:
+        with self._lock:
+            self._ensure_writable()
+            drop = set(ids)
+            keep = [i for i, vid in enumerate(self._ids) if vid not in drop]
+            self._ids = [self._ids[i] for i in keep]
+            self._meta = [self._meta[i] for i in keep]
+            self._sparse = [self._sparse[i] for i in keep]
+            if self._buf is not None:
+                self._buf = self._buf[keep].copy()
+            self._pos = {vid: i for i, vid in enumerate(self._ids)}
+            self._count = len(self._ids)
+            self._invalidate()
+
+    # ── lecture ───────────────────────────────────────────────────────
+    def list(self, prefix: Optional[str] = None, limit: int = 100, **_) -> Iterator[List[str]]:
+        with self._lock:
+            self._load()
+            ids = [vid for vid in self._ids if not prefix or vid.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def _values(self, pos: int) -> List[float]:
+        return self._float_rows([pos])[0].tolist()
+
+    def fetch(self, ids: List[str], **_):
+        with self._lock:
+            self._load()
+            vectors = {vid: SimpleNamespace(id=vid, values=self._values(self._pos[vid]),
+                                            metadata=self._meta[self._pos[vid]])
+                       for vid in ids if vid in self._pos}
+        return SimpleNamespace(vectors=vectors)
+
+    def describe_index_stats(self, **_) -> dict:
+        with self._lock:
+            self._load()
+            return {"dimension": self.dimension, "total_vector_count": self._count,
+                    "metric": self.metric, "dtype": self.dtype,
+                    "bytes_per_vector": bytes_per_vector(self.dtype, self.dimension or 0, self.rerank)}
+
+    def _sparse_scores(self, sparse_vector: dict) -> np.ndarray:
+        if self._sparse_index is None:
+            # Index inversé terme → (positions, poids), construit à la demande
+            postings: Dict[int, tuple] = {}
+            for pos, terms in enumerate(self._sparse):
+                for term, weight in terms.items():
+                    rows, weights = postings.setdefault(term, ([], []))
+                    rows.append(pos)
+                    weights.append(weight)
+            self._sparse_index = {t: (np.asarray(r, dtype=np.int64), np.asarray(w, dtype=np.float32))
+                                  for t, (r, w) in postings.items()}
+        scores = np.zeros(self._count, dtype=np.float32)
+        for term, weight in zip(sparse_vector["indices"], sparse_vector["values"]):
+            if term in self._sparse_index:
+                rows, weights = self._sparse_index[term]
+                scores[rows] += weight * weights
+        return scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top[np.isfinite(scores[top])]
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              include_values: bool = False, filter: Optional[dict] = None,
+              namespace: Optional[str] = None, sparse_vector: Optional[dict] = None, **_):
+        with self._lock:
+            self._load()
+            if not self._count:
+                return SimpleNamespace(matches=[])
+            query = self._normalized(vector)
+            exact = self._writable or self.dtype == "float32"
+            if self._writable:
+                dense = self._buf[:self._count] @ query
+            else:
+                dense = scores(self._codes, self._scales, self.dtype, query, self.dimension)
+            sparse = (self._sparse_scores(sparse_vector)
+                      if sparse_vector and sparse_vector["indices"] else None)
+            total = dense + sparse if sparse is not None else dense
+            if filter:
+                if self._columns is None:
+                    self._columns = ColumnIndex(self._meta)
+                total = np.where(self._columns.mask(filter), total, -np.inf)
+
+            if exact or self.rerank <= 0 or self._full is None:
+                top = self._top(total, top_k)
+                final = total
+            else:
+                # Présélection sur les scores quantifiés, re-rank exact en float32
+                cand = self._top(total, top_k * self.rerank)
+                rescored = np.full(self._count, -np.inf, dtype=np.float32)
+                rescored[cand] = np.asarray(self._full[cand] @ query, dtype=np.float32)
+                if sparse is not None:
+                    rescored[cand] += sparse[cand]
+                top = self._top(rescored, top_k)
+                final = rescored
+            matches = [
+                SimpleNamespace(id=self._ids[i], score=float(final[i]),
+                                metadata=self._meta[i] if include_metadata else None,
+                                values=self._values(i) if include_values else None)
+                for i in top
+            ]
+        return SimpleNamespace(matches=matches)
+
+
+_indexes: Dict[str, LocalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_local_index(name: str, dimension: Optional[int] = None, metric: str = "cosine") -> LocalIndex:
+    """Handle partagé (un par processus et par nom) vers un index local."""
+    with _indexes_lock:
+        if name not in _indexes:
+            _indexes[name] = LocalIndex(name, dimension=dimension, metric=metric)
+        return _indexes[name]
+
+
+def local_index_exists(name: str) -> bool:
+    """Vrai si une génération de l'index local a été publiée."""
+    return (LOCAL_INDEX_DIR / name / "meta.json").exists()
+
+
+def drop_local_index(name: str) -> None:
+    """Supprime un index local (fichiers et handle partagé)."""
+    with _indexes_lock:
+        _indexes.pop(name, None)
+        shutil.rmtree(LOCAL_INDEX_DIR / name, ignore_errors=True)
@@ -0,0 +1,78 @@
+"""quantization.py – Quantification des vecteurs et scores approchés.
+
+Trois représentations pour une matrice de vecteurs (une ligne par vecteur) :
+- ``float32`` : référence, 4 octets par dimension ;
+- ``int8``    : quantification symétrique par vecteur (codes + une échelle
+  float32 par ligne), 1 octet par dimension ;
+- ``binary``  : signe de chaque composante, 8 dimensions par octet ; le score
+  est dérivé de la distance de Hamming (≈ cosinus pour des vecteurs unitaires).
+
+Les scores approchés servent à présélectionner des candidats ; un re-rank en
+float32 sur ces candidats rétablit l'ordre exact (cf. ``local_index``).
+"""
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import numpy as np
+
+DTYPES = ("float32", "int8", "binary")
+
+# Lignes traitées par bloc (évite une copie float32 de toute la matrice)
+SCAN_BLOCK = 16384
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize(mat: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Retourne (codes, échelles) ; échelles None sauf en int8."""
+    mat = np.asarray(mat, dtype=np.float32)
+    if dtype == "float32":
+        return mat, None
+    if dtype == "int8":
+        scales = np.abs(mat).max(axis=1) / 127 if len(mat) else np.zeros(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        return np.round(mat / scales[:, None]).astype(np.int8), scales
+    if dtype == "binary":
+        return np.packbits(mat > 0, axis=1), None
+    raise ValueError(f"Type de quantification inconnu : {dtype} (attendu : {', '.join(DTYPES)})")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray], dtype: str, dimension: int) -> np.ndarray:
+    """Approximation float32 des vecteurs (exacte en float32)."""
+    if dtype == "float32":
+        return np.asarray(codes, dtype=np.float32)
+    if dtype == "int8":
+        return np.asarray(codes, dtype=np.float32) * np.asarray(scales)[:, None]
+    bits = np.unpackbits(np.asarray(codes), axis=1, count=dimension).astype(np.float32)
+    return (2 * bits - 1) / np.sqrt(dimension)
+
+
+def scores(codes: np.ndarray, scales: Optional[np.ndarray], dtype: str, query: np.ndarray,
+           dimension: int) -> np.ndarray:
+    """Produit scalaire (approché hors float32) entre chaque ligne et la requête."""
+    n = len(codes)
+    if dtype == "float32":
+        return np.asarray(codes[:n] @ query, dtype=np.float32)
+    out = np.empty(n, dtype=np.float32)
+    if dtype == "binary":
+        qbits = np.packbits(query > 0)
+        norm = float(np.linalg.norm(query))
+        for start in range(0, n, SCAN_BLOCK):
+            block = np.bitwise_xor(codes[start:start + SCAN_BLOCK], qbits)
+            hamming = _POPCOUNT[block].sum(axis=1, dtype=np.int32)
+            # cos ≈ 1 - 2·hamming/d, remis à l'échelle de la requête
+            out[start:start + SCAN_BLOCK] = (1 - 2 * hamming / dimension) * norm
+        return out
+    for start in range(0, n, SCAN_BLOCK):
+        block = codes[start:start + SCAN_BLOCK].astype(np.float32)
+        out[start:start + SCAN_BLOCK] = (block @ query) * scales[start:start + SCAN_BLOCK]
+    return out
+
+
+def bytes_per_vector(dtype: str, dimension: int, rerank: int = 0) -> int:
+    """Octets stockés par vecteur, copie float32 du re-rank comprise."""
+    size = {"float32": 4 * dimension, "int8": dimension + 4, "binary": (dimension + 7) // 8}[dtype]
+    if dtype != "float32" and rerank > 0:
+        size += 4 * dimension
+    return size
+
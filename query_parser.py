@@ -0,0 +1,167 @@
+"""query_parser.py – Extraction de filtres de métadonnées depuis la question.
+
+« prospects fintech en statut à relancer » : ``secteur`` et ``statut`` sont
+reconnus et deviennent un filtre Pinecone (``$eq`` pour une valeur, ``$in``
+pour plusieurs) ; la recherche ne parcourt plus que les fiches concernées.
+
+Le dictionnaire vient des données : l'ingestion enregistre les valeurs
+distinctes des champs facettes de chaque domaine
+(``RAG_STATE_DIR/facets_<index>.json``). La correspondance est locale et sans
+appel réseau :
+- minuscules, sans accents, pluriel en « s » ignoré ; les mots doivent être
+  identiques (« qualifiés » ↔ « Qualifié », mais « nouveaux » ≠ « Nouveau » et
+  « relance » ≠ « À relancer ») : pas de filtre que la question ne cite pas ;
+- une valeur est reconnue si tous ses mots significatifs sont présents
+  (les chiffres comptent : « 2 mois » ≠ « 1 mois ») ;
+- une valeur faite seulement de noms génériques du domaine (``GENERIC_WORDS`` :
+  « Prospect », « Client »…) n'est retenue que précédée du libellé du champ
+  (« en statut client ») : « prospects fintech » ou « liste des clients » ne
+  filtrent pas sur le statut.
+
+La question d'origine reste celle qui est embeddée : le filtre restreint déjà
+l'espace de recherche, et les termes filtrés donnent encore au classement
+dense de quoi départager les fiches retenues.
+
+Variables d'environnement :
+    QUERY_FILTERS   "0" pour désactiver l'extraction (défaut "1")
+"""
+from __future__ import annotations
+import os, re, threading, unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sparse import STOPWORDS
+from state import STATE_DIR, load_json, save_json
+
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "1") != "0"
+
+# Valeurs trop longues pour être tapées telles quelles : ignorées
+MAX_VALUE_WORDS = 4
+# Noms qui désignent les fiches elles-mêmes plutôt qu'une valeur de facette
+GENERIC_WORDS = frozenset("""
+    prospect client entreprise societe contact compte lead candidat profil fiche personne
+""".split())
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(word: str) -> str:
+    """Forme comparée : minuscules, sans accents ni « s » final du pluriel."""
+    word = _fold(word)
+    if len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    return word
+
+
+def _significant(word: str) -> bool:
+    folded = _fold(word)
+    return folded.isdigit() or (len(folded) > 1 and folded not in STOPWORDS)
+
+
+def value_stems(value: str) -> Tuple[str, ...]:
+    return tuple(stem(w) for w in WORD_RE.findall(value) if _significant(w))
+
+
+# ── dictionnaire des facettes ─────────────────────────────────────────
+class FacetIndex:
+    """Valeurs distinctes des champs facettes d'un index, alimentées à l'ingestion."""
+
+    def __init__(self, fields: Iterable[str] = (), values: Optional[Dict[str, Iterable[str]]] = None):
+        self.fields = tuple(fields)
+        self.values: Dict[str, Set[str]] = {f: set() for f in self.fields}
+        for f, vals in (values or {}).items():
+            self.values.setdefault(f, set()).update(vals)
+        self._lock = threading.Lock()
+
+    def observe(self, docs: List) -> List:
+        """Enregistre les facettes des documents (``metadata``) et les retourne."""
+        with self._lock:
+            for doc in docs:
+                md = doc.metadata
+                for f in self.fields:
+                    val = md.get(f)
+                    for v in val if isinstance(val, list) else [val]:
+                        if isinstance(v, str) and v.strip():
+                            self.values[f].add(v.strip())
+        return docs
+
+    @staticmethod
+    def path_for(name: str) -> Path:
+        return STATE_DIR / f"facets_{name}.json"
+
+    def save(self, name: str) -> None:
+        with self._lock:
+            data = {f: sorted(vals) for f, vals in self.values.items()}
+        save_json(self.path_for(name), data)
+
+    @classmethod
+    def load(cls, name: str, fields: Iterable[str] = ()) -> Optional["FacetIndex"]:
+        data = load_json(cls.path_for(name), None)
+        if not data:
+            return None
+        return cls(tuple(dict.fromkeys([*fields, *data])), data)
+
+
+_loaded: Dict[str, Tuple[float, FacetIndex]] = {}
+
+
+def load_facets(name: str) -> Optional[FacetIndex]:
+    """Facettes persistées d'un index, rechargées si une ingestion les a mises à jour."""
+    path = FacetIndex.path_for(name)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(name)
+    if cached is None or cached[0] != mtime:
+        facets = FacetIndex.load(name)
+        if facets is None:
+            return None
+        _loaded[name] = cached = (mtime, facets)
+    return cached[1]
+
+
+# ── analyse de la question ────────────────────────────────────────────
+@dataclass
+class ParsedQuery:
+    query: str                                               # question d'origine
+    filter: Dict[str, dict] = field(default_factory=dict)    # filtre Pinecone
+    matched: Dict[str, List[str]] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        return " · ".join(f"{f} = {' | '.join(vals)}" for f, vals in self.matched.items())
+
+    def accepts(self, metadata: dict) -> bool:
+        """Vrai si la fiche satisfait les filtres déduits."""
+        return all(metadata.get(f) in vals for f, vals in self.matched.items())
+
+
+def parse_query(query: str, facets: Optional[FacetIndex]) -> ParsedQuery:
+    """Reconnaît les valeurs de facettes citées dans ``query``."""
+    sig = [stem(w) for w in WORD_RE.findall(query) if _significant(w)]
+    present = set(sig)
+    # Mots précédés du libellé d'un champ (« statut client ») : (libellé, mot)
+    qualified = set(zip(sig, sig[1:]))
+    parsed = ParsedQuery(query=query)
+    if facets is None or not present:
+        return parsed
+
+    for f, vals in facets.values.items():
+        hits = []
+        for v in sorted(vals):
+            vs = value_stems(v)
+            if not vs or len(vs) > MAX_VALUE_WORDS or not all(s in present for s in vs):
+                continue
+            if all(s in GENERIC_WORDS for s in vs) and (stem(f), vs[0]) not in qualified:
+                continue   # nom générique sans qualificatif : pas un filtre
+            hits.append(v)
+        if hits:
+            parsed.matched[f] = hits
+            parsed.filter[f] = {"$eq": hits[0]} if len(hits) == 1 else {"$in": hits}
+    return parsed
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+reindex.py – Ré-indexation blue/green, sans interruption de la recherche.
+
+Pour chaque domaine :
+1. ingestion complète dans une nouvelle génération ``<index>-g<N>`` (index
+   Pinecone ou local neuf, état local propre : manifest, BM25, facettes, doc
+   store) pendant que la génération en service continue de répondre ;
+2. validation : nombre de vecteurs (attendu d'après le manifest, et au moins
+   ``--min-ratio`` × celui de l'ancienne génération), puis un échantillon de
+   requêtes – chaque fiche échantillonnée doit retrouver sa propre fiche dans
+   le top-k (``--min-self-hit``) ; le recouvrement avec l'ancienne génération
+   est rapporté (``--min-overlap`` pour l'exiger) ;
+3. bascule atomique de l'alias lu par ``core`` (``RAG_STATE_DIR/index_aliases.json``)
+   et invalidation des caches de réponses ;
+4. après ``REINDEX_GRACE_S`` secondes (requêtes en vol), suppression de
+   l'ancienne génération et de son état local, sauf ``--keep-old``.
+
+Si la validation échoue, l'alias n'est pas modifié ; la génération construite
+est conservée pour diagnostic et sera réutilisée au prochain passage.
+
+Usage :
+    python reindex.py                          # tous les domaines
+    python reindex.py prospects --keep-old     # garde l'ancienne génération (rollback possible)
+    python reindex.py prospects --rollback     # revient à la génération précédente conservée
+    python reindex.py candidates --queries questions.txt --min-overlap 0.5
+"""
+from __future__ import annotations
+import argparse, os, random, sys, time
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+from core import connections, search_vector
+from doc_store import drop_doc_store, open_doc_store
+from incremental import IngestManifest, record_id
+from ingest_engine import DOMAINS, DomainSchema, IngestEngine, validate_env
+from query_parser import FacetIndex
+from sparse import BM25Encoder
+from state import bump_index_version, load_aliases, resolve_index, set_alias
+
+REINDEX_GRACE_S = float(os.getenv("REINDEX_GRACE_S", "30"))
+
+# Longueur max d'un nom d'index Pinecone
+MAX_INDEX_NAME = 45
+
+
+# ── générations ───────────────────────────────────────────────────────
+def generation_name(logical: str, generation: int) -> str:
+    suffix = f"-g{generation}"
+    return logical[:MAX_INDEX_NAME - len(suffix)] + suffix
+
+
+def next_generation(logical: str) -> int:
+    return int(load_aliases().get(logical, {}).get("generation", 0)) + 1
+
+
+def open_existing(name: str):
+    """Handle d'un index physique existant, ou None (ouvrir un nom inconnu
+    créerait un index local vide)."""
+    try:
+        if not connections().exists(name):
+            return None
+        index = connections().index(name)
+        vector_count(index)
+        return index
+    except Exception:
+        return None
+
+
+def vector_count(index) -> int:
+    stats = index.describe_index_stats()
+    return int(stats["total_vector_count"] if isinstance(stats, dict) else stats.total_vector_count)
+
+
+def expected_count(schema: DomainSchema) -> int:
+    manifest = IngestManifest.load(schema.manifest_name)
+    return sum(len(entry.get("ids", [])) for entry in manifest.records.values())
+
+
+def wait_for_count(index, expected: int, timeout: float) -> int:
+    """Pinecone est cohérent à terme : attend que le décompte se stabilise."""
+    deadline = time.monotonic() + timeout
+    while True:
+        count = vector_count(index)
+        if count >= expected or time.monotonic() > deadline:
+            return count
+        time.sleep(2)
+
+
+# ── validation ────────────────────────────────────────────────────────
+def chunk_text(schema: DomainSchema, md: dict) -> str:
+    """Texte du chunk (stocké, ou reconstruit comme ``build_documents`` à partir des champs)."""
+    if md.get("text"):
+        return md["text"]
+    by_src = {src: md.get(key) for src, key in schema.field_map.items()}
+    return "\n".join(f"{k}: {by_src[k]}" for k in schema.fields if by_src.get(k))
+
+
+def sample_queries(schema: DomainSchema, index, n: int, seed: int = 7) -> List[Tuple[str, str]]:
+    """(airtable_id, texte) de ``n`` chunks tirés au hasard dans la génération."""
+    manifest = IngestManifest.load(schema.manifest_name)
+    ids = [vid for entry in manifest.records.values() for vid in entry.get("ids", [])]
+    ids = random.Random(seed).sample(ids, min(n, len(ids)))
+    store = open_doc_store(schema.manifest_name)
+    if store is not None:
+        payloads = store.get_many(ids)
+    else:
+        payloads = {vid: v.metadata or {} for vid, v in index.fetch(ids=ids).vectors.items()}
+    return [(record_id(vid), chunk_text(schema, payloads[vid])) for vid in ids if vid in payloads]
+
+
+def load_questions(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+
+def validate(engine: IngestEngine, schema: DomainSchema, index, previous: Optional[str], args) -> List[str]:
+    """Contrôles de la nouvelle génération ; retourne la liste des échecs."""
+    failures: List[str] = []
+    expected = expected_count(schema)
+    count = wait_for_count(index, expected, args.wait)
+    print(f"   vecteurs : {count} (attendus {expected})")
+    if count != expected:
+        failures.append(f"{count} vecteurs au lieu de {expected}")
+
+    old_index = open_existing(previous) if previous and previous != schema.index_name else None
+    if old_index is not None:
+        old_count = vector_count(old_index)
+        print(f"   génération précédente {previous} : {old_count} vecteurs")
+        if count < args.min_ratio * old_count:
+            failures.append(f"{count} vecteurs < {args.min_ratio:.0%} de l'ancienne génération ({old_count})")
+
+    samples = sample_queries(schema, index, args.samples)
+    questions = [text for _, text in samples] + (load_questions(args.queries) if args.queries else [])
+    if not questions:
+        failures.append("aucune requête de validation")
+        return failures
+    vectors = engine.embedder.embed_documents(questions)
+
+    def top_ids(idx, name: str, query: str, vec) -> List[str]:
+        records = search_vector(idx, name, query, vec, args.k)
+        return [r.metadata.get("airtable_id") or record_id(r.id) for r in records]
+
+    self_hits, empty, overlaps = 0, 0, []
+    for i, (query, vec) in enumerate(zip(questions, vectors)):
+        found = top_ids(index, schema.index_name, query, vec)
+        empty += not found
+        if i < len(samples):
+            self_hits += samples[i][0] in found
+        if old_index is not None:
+            old = top_ids(old_index, previous, query, vec)
+            if old:
+                overlaps.append(len(set(found) & set(old)) / len(old))
+    if empty:
+        failures.append(f"{empty} requêtes sans résultat")
+    if samples:
+        rate = self_hits / len(samples)
+        print(f"   auto-recherche : {self_hits}/{len(samples)} fiches retrouvées dans le top-{args.k}")
+        if rate < args.min_self_hit:
+            failures.append(f"auto-recherche {rate:.0%} < {args.min_self_hit:.0%}")
+    if overlaps:
+        overlap = sum(overlaps) / len(overlaps)
+        print(f"   recouvrement avec {previous} : {overlap:.0%} (top-{args.k}, {len(overlaps)} requêtes)")
+        if overlap < args.min_overlap:
+            failures.append(f"recouvrement {overlap:.0%} < {args.min_overlap:.0%}")
+    return failures
+
+
+# ── nettoyage ─────────────────────────────────────────────────────────
+def collect_garbage(schema: DomainSchema, physical: str) -> None:
+    """Supprime un index physique et son état local."""
+    old = replace(schema, index_name=physical)
+    connections().delete(physical)
+    drop_doc_store(old.manifest_name)
+    for path in (IngestManifest(old.manifest_name).path, BM25Encoder.path_for(old.manifest_name),
+                 FacetIndex.path_for(old.manifest_name)):
+        path.unlink(missing_ok=True)
+
+
+# ── commandes ─────────────────────────────────────────────────────────
+def reindex(engine: IngestEngine, schema: DomainSchema, args) -> bool:
+    logical = schema.index_name
+    previous = resolve_index(logical)
+    generation = next_generation(logical)
+    target = replace(schema, index_name=generation_name(logical, generation))
+    print(f"🔄 [{schema.name}] {logical} : {previous} en service, construction de {target.index_name}")
+
+    engine.ingest(target, incremental=False)
+    index = connections().index(target.index_name)
+
+    print(f"🔎 [{schema.name}] Validation de {target.index_name}…")
+    failures = validate(engine, target, index, previous, args)
+    if failures:
+        print(f"❌ [{schema.name}] Validation échouée, {previous} reste en service :")
+        for failure in failures:
+            print(f"   • {failure}")
+        return False
+
+    set_alias(logical, target.index_name, generation)
+    bump_index_version(logical)   # réponses en cache calculées sur l'ancienne génération
+    print(f"✅ [{schema.name}] {logical} → {target.index_name}")
+
+    if previous != target.index_name and not args.keep_old and open_existing(previous) is not None:
+        if args.grace > 0:
+            print(f"⏳ Suppression de {previous} dans {args.grace:.0f} s (requêtes en vol)…")
+            time.sleep(args.grace)
+        collect_garbage(schema, previous)
+        print(f"🗑️  {previous} supprimé")
+    return True
+
+
+def rollback(schema: DomainSchema) -> bool:
+    logical = schema.index_name
+    entry = load_aliases().get(logical)
+    if not entry or entry.get("previous") in (None, entry["physical"]):
+        print(f"❌ [{schema.name}] Aucune génération précédente pour {logical}")
+        return False
+    if open_existing(entry["previous"]) is None:
+        print(f"❌ [{schema.name}] {entry['previous']} n'existe plus (réindexation sans --keep-old)")
+        return False
+    set_alias(logical, entry["previous"], entry["generation"])
+    bump_index_version(logical)
+    print(f"↩️  [{schema.name}] {logical} → {entry['previous']} (au lieu de {entry['physical']})")
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="*", help=f"domaines (défaut : tous – {', '.join(DOMAINS)})")
+    parser.add_argument("--rollback", action="store_true", help="revenir à la génération précédente")
+    parser.add_argument("--keep-old", action="store_true", help="conserver l'ancienne génération")
+    parser.add_argument("--grace", type=float, default=REINDEX_GRACE_S, help="délai avant suppression (s)")
+    parser.add_argument("--wait", type=float, default=120, help="attente max du décompte de vecteurs (s)")
+    parser.add_argument("--samples", type=int, default=50, help="fiches échantillonnées pour la validation")
+    parser.add_argument("--queries", help="questions de validation supplémentaires (une par ligne)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-self-hit", type=float, default=0.8)
+    parser.add_argument("--min-ratio", type=float, default=0.9, help="vecteurs min. vs ancienne génération")
+    parser.add_argument("--min-overlap", type=float, default=0.0, help="recouvrement top-k min. avec l'ancienne")
+    args = parser.parse_args(argv)
+
+    names = args.domains or list(DOMAINS)
+    unknown = [n for n in names if n not in DOMAINS]
+    if unknown:
+        sys.exit(f"❌ Domaine(s) inconnu(s) : {', '.join(unknown)} (disponibles : {', '.join(DOMAINS)})")
+    if args.rollback:
+        ok = all([rollback(DOMAINS[name]) for name in names])
+    else:
+        validate_env()
+        engine = IngestEngine()
+        try:
+            ok = all([reindex(engine, DOMAINS[name], args) for name in names])
+        finally:
+            engine.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""retrieval_cache.py – Cache mémoire des résultats de recherche.
+
+Une même question (même index, filtres, top_k, alpha…) ne refait ni embedding
+ni requête Pinecone tant que l'entrée est valide :
+- LRU borné en nombre d'entrées et en octets (taille estimée par sérialisation) ;
+- TTL par entrée ;
+- invalidation par version d'index (``state.index_version``, incrémentée par
+  l'ingestion), y compris depuis un autre processus ;
+- compteurs hits / misses / évictions.
+
+Variables d'environnement :
+    RETRIEVAL_CACHE              "0" pour désactiver (défaut "1")
+    RETRIEVAL_CACHE_TTL          durée de vie en secondes (défaut 600)
+    RETRIEVAL_CACHE_MAX_ENTRIES  (défaut 1000)
+    RETRIEVAL_CACHE_MAX_MB       (défaut 64)
+"""
+from __future__ import annotations
+import json, os, pickle, threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from state import index_version
+
+RETRIEVAL_CACHE_ENABLED     = os.getenv("RETRIEVAL_CACHE", "1") != "0"
+RETRIEVAL_CACHE_TTL         = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "1000"))
+RETRIEVAL_CACHE_MAX_BYTES   = int(float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# Relecture des versions d'index au plus toutes les N secondes
+VERSION_CHECK_S = 2.0
+
+
+class RetrievalCache:
+    """LRU thread-safe (entrées + octets) avec TTL et invalidation par version d'index."""
+
+    def __init__(self, ttl: float = RETRIEVAL_CACHE_TTL, max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RETRIEVAL_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, int, Any]]" = OrderedDict()
+        self._versions: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(index_name: str, **params) -> str:
+        return json.dumps([index_name, params], sort_keys=True, ensure_ascii=False, default=str)
+
+    def _version(self, index_name: str) -> int:
+        now = time.monotonic()
+        checked = self._versions.get(index_name)
+        if checked is None or now - checked[0] > VERSION_CHECK_S:
+            checked = self._versions[index_name] = (now, index_version(index_name))
+        return checked[1]
+
+    def get_or_compute(self, index_name: str, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(index_name, key)
+        if value is None:
+            value = compute()
+            self.put(index_name, key, value)
+        return value
+
+    def get(self, index_name: str, key: str) -> Any:
+        """Valeur en cache, ou None (absente, expirée ou d'une ancienne version d'index)."""
+        version = self._version(index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, size, value = entry
+                if entry_version == version and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._drop(key)
+            self.misses += 1
+        return None
+
+    def put(self, index_name: str, key: str, value: Any) -> None:
+        self._put(key, self._version(index_name), value)
+
+    def _put(self, key: str, version: int, value: Any) -> None:
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, version, size, value)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "mb": round(self.bytes / 1024 / 1024, 2),
+                "hit_rate": self.hits / total if total else 0.0}
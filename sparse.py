@@ -0,0 +1,162 @@
+"""sparse.py – Vecteurs creux BM25 pour la recherche hybride (dense + sparse).
+
+Les embeddings Titan captent mal les correspondances exactes (nom de société,
+e-mail, compétence comme « Kubernetes »). ``BM25Encoder`` produit des vecteurs
+creux au format Pinecone (``{"indices", "values"}``) :
+- côté document : tf saturé BM25, sans normalisation par la longueur (les
+  chunks ont une taille bornée) : le poids ne dépend que du chunk lui-même ;
+- côté requête : IDF du terme, calculé sur le corpus indexé, normalisé pour
+  que les poids de la requête somment à 1.
+
+Les termes sont hachés (crc32) : pas de vocabulaire à maintenir. Les
+statistiques persistées (``RAG_STATE_DIR/bm25_<index>.json``) gardent les
+termes de chaque chunk, par ID de vecteur : une ingestion incrémentale remplace
+ceux des chunks ré-embeddés et retire ceux des chunks supprimés (``retain``),
+si bien que df et nombre de chunks restent ceux du corpus indexé.
+
+La requête hybride nécessite un index Pinecone de métrique ``dotproduct`` : un
+index existant en cosinus doit être recréé par ``reindex.py`` (d'ici là, la
+recherche reste dense). ``hybrid_scale`` pondère dense (alpha) et sparse (1 - alpha).
+
+Variables d'environnement :
+    HYBRID_SEARCH   "1" pour activer vecteurs creux et requêtes hybrides (défaut "0")
+    HYBRID_ALPHA    poids du dense dans [0, 1] (défaut 0.7)
+"""
+from __future__ import annotations
+import math, os, re, threading, unicodedata, zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from state import STATE_DIR, load_json, save_json
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "0") == "1"
+HYBRID_ALPHA  = float(os.getenv("HYBRID_ALPHA", "0.7"))
+
+TOKEN_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+|\w+")
+STOPWORDS = frozenset("""
+    au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me même mes moi mon ne nos
+    notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous est sont
+    the and of to in for with on at by is are
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules, sans accents ; e-mails conservés entiers ; mots vides retirés."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in TOKEN_RE.findall(text) if len(t) > 1 and t not in STOPWORDS]
+
+
+def term_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class BM25Encoder:
+    """Statistiques de corpus (df par terme haché) + encodage BM25 haché."""
+
+    def __init__(self, k1: float = 1.2):
+        self.k1 = k1
+        self.n_docs = 0
+        self.df: Dict[int, int] = {}
+        self.terms: Dict[str, List[int]] = {}     # ID de vecteur → termes du chunk
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.n_docs, self.df, self.terms = 0, {}, {}
+
+    def add(self, vid: str, text: str) -> Counter:
+        """Ajoute (ou remplace) le chunk ``vid`` dans les statistiques ; retourne
+        ses fréquences de termes."""
+        tf = Counter(term_index(t) for t in tokenize(text))
+        with self._lock:
+            self._discard(vid)
+            self.terms[vid] = sorted(tf)
+            self.n_docs += 1
+            for idx in tf:
+                self.df[idx] = self.df.get(idx, 0) + 1
+        return tf
+
+    def _discard(self, vid: str) -> None:
+        old = self.terms.pop(vid, None)
+        if old is None:
+            return
+        self.n_docs -= 1
+        for idx in old:
+            if self.df.get(idx, 0) <= 1:
+                self.df.pop(idx, None)
+            else:
+                self.df[idx] -= 1
+
+    def retain(self, ids: Set[str]) -> int:
+        """Retire les chunks absents de ``ids`` ; retourne leur nombre."""
+        with self._lock:
+            stale = [vid for vid in self.terms if vid not in ids]
+            for vid in stale:
+                self._discard(vid)
+        return len(stale)
+
+    def encode_document(self, text: str, tf: Optional[Counter] = None) -> dict:
+        tf = tf if tf is not None else Counter(term_index(t) for t in tokenize(text))
+        indices = sorted(tf)
+        return {"indices": indices, "values": [tf[i] * (self.k1 + 1) / (tf[i] + self.k1) for i in indices]}
+
+    def encode_query(self, text: str) -> dict:
+        indices = sorted({term_index(t) for t in tokenize(text)})
+        n = max(self.n_docs, 1)
+        idf = [math.log((n - self.df.get(i, 0) + 0.5) / (self.df.get(i, 0) + 0.5) + 1) for i in indices]
+        # Poids normalisés (somme = 1) : le score creux reste du même ordre que
+        # le cosinus dense, sans quoi HYBRID_ALPHA ne pondérerait plus rien
+        total = sum(idf) or 1.0
+        return {"indices": indices, "values": [w / total for w in idf]}
+
+    # ── persistance ───────────────────────────────────────────────────
+    @staticmethod
+    def path_for(name: str) -> Path:
+        return STATE_DIR / f"bm25_{name}.json"
+
+    def save(self, name: str) -> None:
+        with self._lock:
+            data = {"k1": self.k1, "n_docs": self.n_docs,
+                    "df": {str(k): v for k, v in self.df.items()}, "terms": self.terms}
+        save_json(self.path_for(name), data)
+
+    @classmethod
+    def load(cls, name: str) -> Optional["BM25Encoder"]:
+        data = load_json(cls.path_for(name), None)
+        if not data:
+            return None
+        enc = cls(k1=data["k1"])
+        # Ancien format (sans termes par chunk) : utilisable en requête, mais
+        # seul un passage complet permet ensuite de retirer des chunks
+        enc.n_docs, enc.terms = data["n_docs"], data.get("terms", {})
+        enc.df = {int(k): v for k, v in data["df"].items()}
+        return enc
+
+
+_loaded: Dict[str, Tuple[float, BM25Encoder]] = {}
+
+
+def load_encoder(name: str) -> Optional[BM25Encoder]:
+    """Encodeur persisté pour un index, rechargé si une ingestion l'a mis à jour."""
+    path = BM25Encoder.path_for(name)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(name)
+    if cached is None or cached[0] != mtime:
+        enc = BM25Encoder.load(name)
+        if enc is None:
+            return None
+        _loaded[name] = cached = (mtime, enc)
+    return cached[1]
+
+
+def hybrid_scale(dense: List[float], sparse: dict, alpha: float = HYBRID_ALPHA) -> Tuple[List[float], dict]:
+    """Pondère la requête : score = alpha · dense + (1 - alpha) · sparse."""
+    if not 0 <= alpha <= 1:
+        raise ValueError("HYBRID_ALPHA doit être compris entre 0 et 1")
+    return ([v * alpha for v in dense],
+            {"indices": sparse["indices"], "values": [v * (1 - alpha) for v in sparse["values"]]})
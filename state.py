@@ -0,0 +1,128 @@
+"""state.py – Répertoire d'état local partagé par l'ingestion et les interfaces.
+
+Par défaut ``.rag_state/`` à côté des scripts ; surchargeable via la variable
+RAG_STATE_DIR (à monter en volume pour partager l'état entre conteneurs).
+"""
+from __future__ import annotations
+import contextlib, json, os, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:   # Windows : pas de verrou inter-processus
+    fcntl = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+PROJECT_DIR = Path(__file__).resolve().parent
+STATE_DIR   = Path(os.getenv("RAG_STATE_DIR", PROJECT_DIR / ".rag_state"))
+
+
+def load_json(path: Path, default: Any) -> Any:
+    """Lit un fichier JSON d'état ; retourne ``default`` s'il est absent ou illisible."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def save_json(path: Path, data: Any) -> None:
+    """Écrit un fichier JSON de manière atomique (fichier temporaire + rename)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+@contextlib.contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Verrou exclusif inter-processus (``<fichier>.lock``) autour d'une
+    lecture-modification-écriture : deux écrivains ne perdent pas leurs mises à jour."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ── versions d'index ──────────────────────────────────────────────────
+# Incrémentée par l'ingestion à chaque modification d'un index : les caches
+# (réponses, recherches) s'en servent pour s'invalider.
+VERSIONS_PATH = STATE_DIR / "index_versions.json"
+
+
+def index_version(name: str) -> int:
+    return int(load_json(VERSIONS_PATH, {}).get(name, {}).get("version", 0))
+
+
+def bump_index_version(name: str) -> int:
+    with locked(VERSIONS_PATH):
+        versions = load_json(VERSIONS_PATH, {})
+        version = int(versions.get(name, {}).get("version", 0)) + 1
+        versions[name] = {"version": version, "updated_at": time.time()}
+        save_json(VERSIONS_PATH, versions)
+    return version
+
+
+# ── alias d'index (blue/green) ────────────────────────────────────────
+# Nom logique (PINECONE_INDEX_NAME…) → index physique de la génération en
+# service. Écrit par ``reindex.py`` ; sans alias, le nom logique est l'index.
+ALIASES_PATH = STATE_DIR / "index_aliases.json"
+
+_aliases_cache: Tuple[Optional[int], Dict[str, dict]] = (None, {})
+
+
+def load_aliases() -> Dict[str, dict]:
+    """Alias courants (relus seulement si le fichier a changé)."""
+    global _aliases_cache
+    try:
+        mtime = ALIASES_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _aliases_cache[0] != mtime:
+        _aliases_cache = (mtime, load_json(ALIASES_PATH, {}))
+    return _aliases_cache[1]
+
+
+def resolve_index(name: str) -> str:
+    """Index physique servant le nom logique ``name``."""
+    entry = load_aliases().get(name)
+    return entry["physical"] if entry else name
+
+
+def aliases_of(physical: str) -> List[str]:
+    """Noms logiques pointant sur l'index physique ``physical``."""
+    return [name for name, entry in load_aliases().items() if entry["physical"] == physical]
+
+
+def set_alias(name: str, physical: str, generation: int) -> Optional[str]:
+    """Bascule atomique du nom logique vers ``physical`` ; retourne l'index précédent."""
+    with locked(ALIASES_PATH):
+        aliases = load_json(ALIASES_PATH, {})
+        previous = aliases.get(name, {}).get("physical", name)
+        aliases[name] = {"physical": physical, "generation": generation, "previous": previous,
+                         "switched_at": time.time()}
+        save_json(ALIASES_PATH, aliases)
+    return previous
+
+
+def drop_aliases(physical: str) -> None:
+    """Retire les alias pointant sur un index supprimé."""
+    with locked(ALIASES_PATH):
+        aliases = load_json(ALIASES_PATH, {})
+        kept = {name: entry for name, entry in aliases.items() if entry["physical"] != physical}
+        if kept != aliases:
+            save_json(ALIASES_PATH, kept)
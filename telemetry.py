@@ -0,0 +1,264 @@
+"""telemetry.py – Latence par étage (spans), sans collecteur externe.
+
+Chaque étage d'une question (embedding Titan, requête d'index, doc store,
+assemblage du contexte, Claude…) est mesuré par un span :
+
+    with span("vector_query", index=name, top_k=10) as sp:
+        res = index.query(...)
+        sp.set(matches=len(res.matches))
+
+- durées agrégées par étage : fenêtre glissante (p50 / p95 des dernières
+  mesures) et histogramme cumulé ;
+- attributs numériques (tailles, tokens, ``cache_hit``…) cumulés par étage,
+  les autres ne servent qu'aux logs ;
+- ``trace`` ouvre une requête racine (question d'une interface, ingestion
+  d'un domaine) : les spans exécutés dans son contexte, y compris dans les
+  threads qui le propagent, y sont ventilés par étage.
+
+Exports : une ligne JSON par span (logger ``rag.span``), texte Prometheus
+(``prometheus_text``, écrit dans ``TELEMETRY_METRICS_FILE`` à la sortie du
+processus et au plus toutes les ``METRICS_WRITE_S`` secondes), mode
+« Performance » du tableau de bord. Coût : deux lectures d'horloge et un
+verrou par span.
+
+Variables d'environnement :
+    TELEMETRY               "0" pour désactiver (défaut "1")
+    TELEMETRY_WINDOW        mesures conservées par étage pour p50/p95 (défaut 500)
+    TELEMETRY_LOG           "0" pour ne pas journaliser les spans (défaut "1")
+    TELEMETRY_METRICS_FILE  fichier texte Prometheus (textfile collector), optionnel
+"""
+from __future__ import annotations
+import atexit, bisect, contextvars, json, logging, os, tempfile, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+TELEMETRY_ENABLED      = os.getenv("TELEMETRY", "1") != "0"
+TELEMETRY_WINDOW       = int(os.getenv("TELEMETRY_WINDOW", "500"))
+TELEMETRY_LOG          = os.getenv("TELEMETRY_LOG", "1") != "0"
+TELEMETRY_METRICS_FILE = os.getenv("TELEMETRY_METRICS_FILE", "")
+
+# Bornes (s) de l'histogramme Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Requêtes racines conservées pour l'affichage
+RECENT_TRACES = 50
+METRICS_WRITE_S = 10.0
+
+log = logging.getLogger("rag.span")
+
+
+class StageStats:
+    """Mesures cumulées d'un étage."""
+
+    __slots__ = ("count", "errors", "total_s", "buckets", "window", "attrs")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.window: Deque[float] = deque(maxlen=window)
+        self.attrs: Dict[str, float] = {}
+
+    def add(self, seconds: float, attrs: Dict[str, Any], error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.total_s += seconds
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            self.buckets[i] += 1
+        self.window.append(seconds)
+        for key, val in attrs.items():
+            if isinstance(val, (int, float)):   # bool compris (cache_hit)
+                self.attrs[key] = self.attrs.get(key, 0) + val
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Trace:
+    """Requête racine : durée totale et temps passé par étage."""
+
+    __slots__ = ("name", "attrs", "started_at", "stages")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.stages: Dict[str, float] = {}
+
+
+class Telemetry:
+    """Registre des mesures du processus (thread-safe)."""
+
+    def __init__(self, window: int = TELEMETRY_WINDOW, metrics_file: str = TELEMETRY_METRICS_FILE):
+        self.window = window
+        self.metrics_file = metrics_file
+        self.stages: Dict[str, StageStats] = {}
+        self.recent: Deque[dict] = deque(maxlen=RECENT_TRACES)
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, attrs: Dict[str, Any], error: bool = False,
+               trace: Optional[Trace] = None) -> None:
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.add(seconds, attrs, error)
+            if trace is not None:
+                trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+        if TELEMETRY_LOG and log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({"stage": stage, "ms": round(seconds * 1000, 2), **attrs,
+                                 **({"error": True} if error else {})}, ensure_ascii=False, default=str))
+
+    def finish(self, trace: Trace, seconds: float, error: bool) -> None:
+        entry = {"name": trace.name, "at": trace.started_at, "ms": round(seconds * 1000, 1),
+                 "error": error, "attrs": trace.attrs,
+                 "stages": {s: round(v * 1000, 1) for s, v in trace.stages.items()}}
+        with self._lock:
+            self.recent.append(entry)
+        if self.metrics_file and time.monotonic() - self._written_at > METRICS_WRITE_S:
+            self.write_metrics()
+
+    # ── lecture ───────────────────────────────────────────────────────
+    def summary(self) -> List[dict]:
+        """p50 / p95 / max (ms) sur la fenêtre récente, par étage."""
+        with self._lock:
+            items = [(name, s.count, s.errors, sorted(s.window), dict(s.attrs)) for name, s in self.stages.items()]
+        rows = []
+        for name, count, errors, window, attrs in sorted(items):
+            rows.append({"stage": name, "count": count, "errors": errors,
+                         "p50_ms": round(percentile(window, 0.50) * 1000, 1),
+                         "p95_ms": round(percentile(window, 0.95) * 1000, 1),
+                         "max_ms": round(window[-1] * 1000, 1) if window else 0.0,
+                         **{f"avg_{k}": round(v / count, 3) for k, v in attrs.items()}})
+        return rows
+
+    def recent_traces(self) -> List[dict]:
+        with self._lock:
+            return list(reversed(self.recent))
+
+    def prometheus_text(self, prefix: str = "rag") -> str:
+        """Métriques au format d'exposition texte Prometheus."""
+        with self._lock:
+            stages = [(name, s.count, s.errors, s.total_s, list(s.buckets), dict(s.attrs))
+                      for name, s in sorted(self.stages.items())]
+        lines = [f"# HELP {prefix}_stage_duration_seconds Durée des étages (spans).",
+                 f"# TYPE {prefix}_stage_duration_seconds histogram"]
+        for name, count, _, total, buckets, _ in stages:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines += [f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}',
+                      f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}',
+                      f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {count}']
+        lines += [f"# HELP {prefix}_stage_errors_total Spans terminés par une exception.",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        lines += [f'{prefix}_stage_errors_total{{stage="{name}"}} {errors}' for name, _, errors, *_ in stages]
+        lines += [f"# HELP {prefix}_stage_attr_total Attributs numériques cumulés (tailles, tokens, hits…).",
+                  f"# TYPE {prefix}_stage_attr_total counter"]
+        for name, *_, attrs in stages:
+            lines += [f'{prefix}_stage_attr_total{{stage="{name}",attr="{k}"}} {v:g}' for k, v in sorted(attrs.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path: Optional[str] = None) -> None:
+        """Écrit le texte Prometheus de manière atomique (textfile collector)."""
+        path = path or self.metrics_file
+        if not path:
+            return
+        self._written_at = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.recent.clear()
+
+
+telemetry = Telemetry()
+if TELEMETRY_ENABLED and TELEMETRY_METRICS_FILE:
+    atexit.register(telemetry.write_metrics)
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Span:
+    __slots__ = ("stage", "attrs")
+
+    def __init__(self, stage: str, attrs: Dict[str, Any]):
+        self.stage = stage
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+_NOOP = Span("", {})
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Span]:
+    """Mesure un étage ; ``sp.set(...)`` complète les attributs en cours de route."""
+    if not TELEMETRY_ENABLED:
+        yield _NOOP
+        return
+    sp = Span(stage, attrs)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield sp
+    except Exception:
+        error = True
+        raise
+    finally:
+        telemetry.record(stage, time.perf_counter() - start, sp.attrs, error, _current.get())
+
+
+def record(stage: str, seconds: float, **attrs) -> None:
+    """Mesure prise par l'appelant (p. ex. génération consommée en flux)."""
+    if TELEMETRY_ENABLED:
+        telemetry.record(stage, seconds, attrs, trace=_current.get())
+
+
+@contextmanager
+def trace(name: str, **attrs) -> Iterator[Span]:
+    """Requête racine : span ``name`` et ventilation par étage de ses spans."""
+    if not TELEMETRY_ENABLED:
+        yield _NOOP
+        return
+    current = Trace(name, attrs)
+    sp = Span(name, current.attrs)
+    token = _current.set(current)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield sp
+    except Exception:
+        error = True
+        raise
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - start
+        telemetry.record(name, seconds, sp.attrs, error)
+        telemetry.finish(current, seconds, error)
+
+
+def trace_stages() -> Dict[str, float]:
+    """Temps (s) par étage de la requête racine en cours (vide hors trace)."""
+    current = _current.get()
+    return dict(current.stages) if current is not None else {}
+
+
+def format_stages(stages: Dict[str, float]) -> str:
+    """« embed 12 ms · vector_query 40 ms » (secondes en entrée)."""
+    return " · ".join(f"{s} {v * 1000:.0f} ms" for s, v in sorted(stages.items(), key=lambda kv: -kv[1]))
@@ -0,0 +1,18 @@
+"""Tests hors-ligne : doublures de ``benchmarks.fakes``, état local temporaire."""
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+from benchmarks.fakes import isolated_state  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def state_dir():
+    """``RAG_STATE_DIR`` temporaire pour chaque test."""
+    with isolated_state() as root:
+        yield root
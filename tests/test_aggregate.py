@@ -0,0 +1,52 @@
+"""Agrégation des chunks par fiche (``core.aggregate_matches``)."""
+from types import SimpleNamespace
+
+from benchmarks.fakes import InMemoryIndex, fake_vector
+from core import aggregate_matches
+
+
+def match(vid, score, rec, text=None):
+    md = {"airtable_id": rec}
+    if text:
+        md["text"] = text
+    return SimpleNamespace(id=vid, score=score, metadata=md)
+
+
+MATCHES = [
+    match("a_0", 0.90, "a", "a0"),
+    match("b_0", 0.85, "b", "b0"),
+    match("b_1", 0.80, "b", "b1"),
+    match("a_1", 0.10, "a", "a1"),
+    match("c_0", 0.50, "c", "c0"),
+]
+
+
+def test_max_fusion_keeps_best_chunk_score():
+    records = aggregate_matches(MATCHES, top_k=10, fusion="max", chunks_per_record=2)
+    assert [(r.metadata["airtable_id"], r.id, r.score) for r in records] == [
+        ("a", "a_0", 0.90), ("b", "b_0", 0.85), ("c", "c_0", 0.50)]
+
+
+def test_sum_fusion_favours_records_with_several_good_chunks():
+    records = aggregate_matches(MATCHES, top_k=2, fusion="sum", chunks_per_record=2)
+    assert [r.metadata["airtable_id"] for r in records] == ["b", "a"]
+    assert records[0].score == 0.85 + 0.80
+    assert [c.id for c in records[0].chunks] == ["b_0", "b_1"]
+
+
+def test_chunk_texts_are_merged_in_score_order():
+    best = aggregate_matches(MATCHES, top_k=1, fusion="max", chunks_per_record=2)[0]
+    assert best.metadata["text"] == "a0\n…\na1"
+    only = aggregate_matches(MATCHES, top_k=3, fusion="max", chunks_per_record=1)
+    assert [r.metadata["text"] for r in only] == ["a0", "b0", "c0"]
+
+
+def test_one_result_per_record_from_an_index():
+    index = InMemoryIndex(dimension=8)
+    index.upsert([{"id": f"{rec}_{n}", "values": fake_vector(f"{rec} {n}", 8),
+                   "metadata": {"airtable_id": rec, "text": f"{rec} {n}"}}
+                  for rec in ("r1", "r2", "r3") for n in range(4)])
+    res = index.query(vector=fake_vector("r1 0", 8), top_k=12, include_metadata=True)
+    records = aggregate_matches(res.matches, top_k=3)
+    assert sorted(r.metadata["airtable_id"] for r in records) == ["r1", "r2", "r3"]
+    assert records[0].id == "r1_0"
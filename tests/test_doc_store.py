@@ -0,0 +1,68 @@
+"""Doc store : métadonnées réduites dans l'index, fiches complétées à la recherche."""
+import pytest
+
+from benchmarks.fakes import InMemoryIndex, fake_vector, synthetic_records
+from core import aggregate_matches, hydrate_records
+from doc_store import DOC_STORE_KEY, DocStore, drop_doc_store, open_doc_store
+from incremental import vector_ids
+from ingest_engine import PROSPECTS, build_documents, to_vector
+
+DIM = 16
+
+
+def ingest(name, n=5, store=True):
+    docs = build_documents(PROSPECTS, synthetic_records("prospects", n))
+    doc_store = DocStore(name) if store else None
+    index = InMemoryIndex(DIM)
+    index.upsert([to_vector(PROSPECTS, vid, d, fake_vector(d.page_content, DIM), store=doc_store)
+                  for vid, d in zip(vector_ids(docs), docs)])
+    if doc_store is not None:
+        doc_store.close()
+    return docs, index
+
+
+def search(index, text, top_k=3):
+    res = index.query(vector=fake_vector(text, DIM), top_k=20, include_metadata=True)
+    return aggregate_matches(res.matches, top_k=top_k)
+
+
+def test_index_keeps_only_filterable_metadata():
+    docs, index = ingest("t")
+    stored = index.fetch([vector_ids(docs)[0]]).vectors
+    md = next(iter(stored.values())).metadata
+    assert set(md) <= {"airtable_id", DOC_STORE_KEY, *PROSPECTS.facets}
+    assert md[DOC_STORE_KEY] is True and "text" not in md
+
+
+def test_hydration_restores_full_metadata():
+    docs, index = ingest("t")
+    records = hydrate_records("t", search(index, docs[0].page_content))
+    best = records[0]
+    assert best.id == vector_ids(docs)[0]
+    assert docs[0].page_content in best.metadata["text"]
+    assert all(best.metadata[k] == v for k, v in docs[0].metadata.items())
+
+
+def test_missing_store_fails_loudly():
+    docs, index = ingest("t")
+    drop_doc_store("t")
+    with pytest.raises(RuntimeError, match="Doc store introuvable"):
+        hydrate_records("t", search(index, docs[0].page_content))
+
+
+def test_full_metadata_index_needs_no_store():
+    docs, index = ingest("t", store=False)
+    records = search(index, docs[0].page_content)
+    assert open_doc_store("t") is None
+    assert hydrate_records("t", records) == records
+    assert docs[0].page_content in records[0].metadata["text"]
+
+
+def test_retain_drops_stale_chunks():
+    store = DocStore("t")
+    for vid in ("a_0", "a_1", "b_0"):
+        store.add(vid, {"text": vid})
+    assert store.retain({"a_0", "b_0"}) == 1
+    assert set(store.get_many(["a_0", "a_1", "b_0"])) == {"a_0", "b_0"}
+    assert store.stats()["entries"] == 2
+    store.close()
@@ -0,0 +1,82 @@
+"""Manifest et détection des changements (``incremental``)."""
+from benchmarks.fakes import InMemoryIndex, fake_vector, synthetic_records
+from incremental import (IngestManifest, apply_plan, finish_plan, plan_records, prune_index,
+                         vector_ids)
+from ingest_engine import PROSPECTS, build_documents
+
+DIM = 8
+
+
+def build(records):
+    return build_documents(PROSPECTS, records)
+
+
+def ingest(records, manifest, index, force=False):
+    """Planifie, écrit les vecteurs en attente puis applique le plan."""
+    plan = plan_records(records, manifest, build, force=force)
+    finish_plan(plan, {r["id"] for r in records}, {r["id"] for r in records}, manifest)
+    docs = [d for rec_docs in plan.pending.values() for d in rec_docs]
+    ids = vector_ids(docs)
+    index.upsert([{"id": vid, "values": fake_vector(d.page_content, DIM)} for vid, d in zip(ids, docs)])
+    return plan, apply_plan(index, manifest, plan, ids)
+
+
+def all_ids(index):
+    return {vid for page in index.list() for vid in page}
+
+
+def test_unchanged_records_are_skipped():
+    records = synthetic_records("prospects", 5)
+    manifest, index = IngestManifest("t"), InMemoryIndex(DIM)
+    ingest(records, manifest, index)
+
+    plan, (updated, deleted) = ingest(records, IngestManifest.load("t"), index)
+    assert plan.skipped == 5 and not plan.pending
+    assert (updated, deleted) == (0, 0)
+
+
+def test_changed_record_is_reindexed_and_stale_chunks_deleted():
+    records = synthetic_records("prospects", 3)
+    manifest, index = IngestManifest("t"), InMemoryIndex(DIM)
+    records[0]["fields"]["Notes"] = "relance " * 400      # plusieurs chunks
+    ingest(records, manifest, index)
+    long_ids = manifest.get(records[0]["id"])["ids"]
+    assert len(long_ids) > 1
+
+    records[0]["fields"]["Notes"] = "court"
+    plan, (updated, _) = ingest(records, manifest, index)
+    assert list(plan.pending) == [records[0]["id"]] and updated == 1
+    assert manifest.get(records[0]["id"])["ids"] == [f"{records[0]['id']}_0"]
+    assert not set(long_ids[1:]) & all_ids(index)
+
+
+def test_removed_record_vectors_are_deleted():
+    records = synthetic_records("prospects", 4)
+    manifest, index = IngestManifest("t"), InMemoryIndex(DIM)
+    ingest(records, manifest, index)
+    gone = records.pop(1)
+
+    plan, (_, deleted) = ingest(records, manifest, index)
+    assert plan.removed == [gone["id"]] and deleted == 1
+    assert manifest.get(gone["id"]) is None
+    assert not any(vid.startswith(gone["id"]) for vid in all_ids(index))
+
+
+def test_vector_ids_are_numbered_per_record():
+    records = synthetic_records("prospects", 2)
+    records[0]["fields"]["Notes"] = "relance " * 400
+    ids = vector_ids(build(records))
+    for rec in records:
+        own = [vid for vid in ids if vid.startswith(rec["id"] + "_")]
+        assert own == [f"{rec['id']}_{n}" for n in range(len(own))]
+    assert len(set(ids)) == len(ids) > len(records)
+
+
+def test_prune_index_removes_orphans():
+    records = synthetic_records("prospects", 2)
+    manifest, index = IngestManifest("t"), InMemoryIndex(DIM)
+    ingest(records, manifest, index)
+    index.upsert([{"id": "legacy_42", "values": fake_vector("x", DIM)}])
+
+    assert prune_index(index, manifest) == 1
+    assert "legacy_42" not in all_ids(index)
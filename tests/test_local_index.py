@@ -0,0 +1,78 @@
+"""Index local : générations publiées par ``flush`` et lecteurs concurrents."""
+import numpy as np
+import pytest
+
+from benchmarks.fakes import InMemoryIndex, fake_vector
+from local_index import LocalIndex
+
+DIM = 16
+
+
+def vectors(prefix, n, **md):
+    return [{"id": f"{prefix}_{i}", "values": fake_vector(f"{prefix} {i}", DIM),
+             "metadata": {"airtable_id": prefix, "n": i, **md}} for i in range(n)]
+
+
+def generation_files(index):
+    return sorted(p.name for p in index.dir.glob("*.npy"))
+
+
+def test_flush_publishes_generation_for_other_readers(tmp_path):
+    writer = LocalIndex("t", dimension=DIM, root=tmp_path)
+    writer.upsert(vectors("a", 3))
+    reader = LocalIndex("t", root=tmp_path)
+    assert reader.describe_index_stats()["total_vector_count"] == 0
+
+    writer.flush()
+    assert reader.describe_index_stats()["total_vector_count"] == 3
+    assert sorted(v for page in reader.list() for v in page) == ["a_0", "a_1", "a_2"]
+
+
+def test_previous_generation_kept_until_next_flush(tmp_path):
+    index = LocalIndex("t", dimension=DIM, dtype="int8", rerank=4, root=tmp_path)
+    for gen, prefix in enumerate("abc", start=1):
+        index.upsert(vectors(prefix, 2))
+        index.flush()
+        kept = {g for g in (gen - 1, gen) if g > 0}
+        assert generation_files(index) == sorted(f"{kind}.{g}.npy" for g in kept
+                                                 for kind in ("full", "scales", "vectors"))
+
+
+def test_reader_on_previous_generation_still_answers(tmp_path):
+    writer = LocalIndex("t", dimension=DIM, root=tmp_path)
+    writer.upsert(vectors("a", 2))
+    writer.flush()
+    reader = LocalIndex("t", root=tmp_path)
+    writer.upsert(vectors("b", 2))
+    writer.flush()
+    # Le lecteur tient encore la génération 1 (mmap), toujours présente sur disque
+    assert reader._generation == 1 and (reader.dir / "vectors.1.npy").exists()
+    assert reader._codes.shape == (2, DIM)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8", "binary"])
+def test_results_match_in_memory_index(tmp_path, dtype):
+    data = vectors("a", 20) + vectors("b", 20)
+    local = LocalIndex("t", dimension=DIM, dtype=dtype, rerank=4, root=tmp_path)
+    local.upsert(data)
+    local.flush()
+    ref = InMemoryIndex(DIM)
+    ref.upsert(data)
+
+    query = fake_vector("a 3", DIM)
+    got = local.query(vector=query, top_k=5)
+    want = ref.query(vector=query, top_k=5)
+    assert [m.id for m in got.matches] == [m.id for m in want.matches]
+    assert np.allclose([m.score for m in got.matches], [m.score for m in want.matches], atol=1e-4)
+
+
+def test_filter_and_delete_survive_reload(tmp_path):
+    index = LocalIndex("t", dimension=DIM, root=tmp_path)
+    index.upsert(vectors("a", 3, secteur="Fintech") + vectors("b", 3, secteur="Santé"))
+    index.delete(["a_0"])
+    index.flush()
+
+    reopened = LocalIndex("t", root=tmp_path)
+    res = reopened.query(vector=fake_vector("a 1", DIM), top_k=10,
+                         filter={"secteur": {"$eq": "Fintech"}, "n": {"$gte": 1}})
+    assert sorted(m.id for m in res.matches) == ["a_1", "a_2"]
@@ -0,0 +1,57 @@
+"""Extraction de filtres de facettes depuis la question (``query_parser``)."""
+import pytest
+
+from benchmarks.fakes import synthetic_records
+from ingest_engine import PROSPECTS, build_documents
+from query_parser import FacetIndex, load_facets, parse_query, stem
+
+FACETS = FacetIndex(("secteur", "statut"), {
+    "secteur": {"Fintech", "Santé", "Industrie"},
+    "statut": {"Prospect", "Client", "Qualifié", "À relancer", "Nouveau"},
+})
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("prospects fintech", {"secteur": {"$eq": "Fintech"}}),
+    ("liste des clients fintech", {"secteur": {"$eq": "Fintech"}}),
+    ("prospects en statut client", {"statut": {"$eq": "Client"}}),
+    ("leads qualifiés en santé", {"secteur": {"$eq": "Santé"}, "statut": {"$eq": "Qualifié"}}),
+    ("fintech ou industrie à relancer", {"secteur": {"$in": ["Fintech", "Industrie"]},
+                                         "statut": {"$eq": "À relancer"}}),
+])
+def test_cited_values_become_filters(query, expected):
+    assert parse_query(query, FACETS).filter == expected
+
+
+@pytest.mark.parametrize("query", [
+    "relance des comptes",          # « relance » ≠ « À relancer »
+    "nouveaux contacts",            # « nouveaux » ≠ « Nouveau »
+    "quels clients ont un budget élevé",
+])
+def test_no_filter_for_values_not_cited(query):
+    assert parse_query(query, FACETS).filter == {}
+
+
+def test_stem_folds_accents_and_plural():
+    assert stem("Qualifiés") == stem("qualifie") == "qualifie"
+    assert stem("bus") == "bus"
+
+
+def test_describe_and_accepts():
+    parsed = parse_query("prospects fintech qualifiés", FACETS)
+    assert parsed.describe() == "secteur = Fintech · statut = Qualifié"
+    assert parsed.accepts({"secteur": "Fintech", "statut": "Qualifié"})
+    assert not parsed.accepts({"secteur": "Santé", "statut": "Qualifié"})
+
+
+def test_facets_observed_at_ingestion_are_reloaded():
+    docs = build_documents(PROSPECTS, synthetic_records("prospects", 30))
+    facets = FacetIndex(PROSPECTS.facets)
+    facets.observe(docs)
+    facets.save("prospects-test")
+
+    loaded = load_facets("prospects-test")
+    assert loaded.values == facets.values
+    secteur = sorted(loaded.values["secteur"])[0]
+    assert parse_query(f"prospects {secteur}", loaded).matched == {"secteur": [secteur]}
+    assert load_facets("absent") is None
@@ -0,0 +1,144 @@
+"""Ré-indexation blue/green : alias, validation, bascule et rollback."""
+import threading
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+import reindex
+from benchmarks.fakes import InMemoryIndex, fake_vector, synthetic_records
+from incremental import IngestManifest, vector_ids
+from ingest_engine import PROSPECTS, build_documents, to_vector
+from state import aliases_of, bump_index_version, drop_aliases, index_version, load_aliases, \
+    resolve_index, set_alias
+
+DIM = 16
+LOGICAL = PROSPECTS.index_name
+
+
+class FakeConnections:
+    """Index physiques en mémoire, par nom."""
+
+    def __init__(self):
+        self.indexes = {}
+
+    def exists(self, name):
+        return name in self.indexes
+
+    def index(self, name):
+        return self.indexes.setdefault(name, InMemoryIndex(DIM))
+
+    def delete(self, name):
+        self.indexes.pop(name, None)
+
+
+@pytest.fixture
+def conns(monkeypatch):
+    fake = FakeConnections()
+    monkeypatch.setattr(reindex, "connections", lambda: fake)
+    return fake
+
+
+def build_generation(conns, physical, n=20):
+    """Remplit l'index ``physical`` et le manifest de sa génération."""
+    schema = replace(PROSPECTS, index_name=physical)
+    records = synthetic_records("prospects", n)
+    docs = build_documents(schema, records)
+    ids = vector_ids(docs)
+    conns.index(physical).upsert([to_vector(schema, vid, d, fake_vector(d.page_content, DIM))
+                                  for vid, d in zip(ids, docs)])
+    manifest = IngestManifest(schema.manifest_name)
+    for rec in records:
+        manifest.set(rec["id"], "h", [vid for vid in ids if vid.startswith(rec["id"] + "_")])
+    manifest.save()
+    return schema
+
+
+def validation_args(**overrides):
+    args = dict(wait=0, min_ratio=0.9, samples=10, queries=None, k=10, min_self_hit=0.8, min_overlap=0.0)
+    return SimpleNamespace(**{**args, **overrides})
+
+
+ENGINE = SimpleNamespace(embedder=SimpleNamespace(
+    embed_documents=lambda texts: [fake_vector(t, DIM) for t in texts]))
+
+
+# ── alias ─────────────────────────────────────────────────────────────
+def test_alias_switch_and_drop():
+    assert resolve_index(LOGICAL) == LOGICAL
+    assert set_alias(LOGICAL, f"{LOGICAL}-g1", 1) == LOGICAL
+    assert set_alias(LOGICAL, f"{LOGICAL}-g2", 2) == f"{LOGICAL}-g1"
+    assert resolve_index(LOGICAL) == f"{LOGICAL}-g2"
+    assert aliases_of(f"{LOGICAL}-g2") == [LOGICAL]
+    assert reindex.next_generation(LOGICAL) == 3
+
+    drop_aliases(f"{LOGICAL}-g2")
+    assert resolve_index(LOGICAL) == LOGICAL and load_aliases() == {}
+
+
+def test_generation_name_fits_pinecone_limit():
+    name = reindex.generation_name("x" * 60, 12)
+    assert len(name) == reindex.MAX_INDEX_NAME and name.endswith("-g12")
+
+
+def test_concurrent_updates_are_not_lost():
+    def work(i):
+        for _ in range(20):
+            bump_index_version(LOGICAL)
+        set_alias(f"logical-{i}", f"physical-{i}", i)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert index_version(LOGICAL) == 160
+    assert len(load_aliases()) == 8
+
+
+# ── validation ────────────────────────────────────────────────────────
+def test_validation_accepts_complete_generation(conns):
+    build_generation(conns, LOGICAL)
+    target = build_generation(conns, f"{LOGICAL}-g1")
+    assert reindex.validate(ENGINE, target, conns.index(target.index_name), LOGICAL, validation_args()) == []
+
+
+def test_validation_rejects_missing_vectors(conns):
+    build_generation(conns, LOGICAL, n=20)
+    target = build_generation(conns, f"{LOGICAL}-g1", n=10)
+    index = conns.index(target.index_name)
+    index.delete(ids=[next(iter(index.list()))[0]])
+    failures = reindex.validate(ENGINE, target, index, LOGICAL, validation_args())
+    assert any("au lieu de" in f for f in failures)
+    assert any("ancienne génération" in f for f in failures)
+
+
+# ── rollback et nettoyage ─────────────────────────────────────────────
+def test_rollback_restores_previous_generation(conns):
+    build_generation(conns, f"{LOGICAL}-g1")
+    build_generation(conns, f"{LOGICAL}-g2")
+    set_alias(LOGICAL, f"{LOGICAL}-g1", 1)
+    set_alias(LOGICAL, f"{LOGICAL}-g2", 2)
+    version = index_version(LOGICAL)
+
+    assert reindex.rollback(PROSPECTS)
+    assert resolve_index(LOGICAL) == f"{LOGICAL}-g1"
+    assert index_version(LOGICAL) == version + 1
+
+
+def test_rollback_refuses_deleted_generation(conns):
+    assert not reindex.rollback(PROSPECTS)            # aucun alias
+    build_generation(conns, f"{LOGICAL}-g2")
+    set_alias(LOGICAL, f"{LOGICAL}-g1", 1)
+    set_alias(LOGICAL, f"{LOGICAL}-g2", 2)
+    assert not reindex.rollback(PROSPECTS)            # g1 n'existe plus
+    assert resolve_index(LOGICAL) == f"{LOGICAL}-g2"
+
+
+def test_collect_garbage_removes_index_and_state(conns):
+    old = build_generation(conns, f"{LOGICAL}-g1")
+    path = IngestManifest(old.manifest_name).path
+    assert path.exists()
+    reindex.collect_garbage(PROSPECTS, old.index_name)
+    assert not conns.exists(old.index_name) and not path.exists()
+    assert reindex.open_existing(old.index_name) is None
@@ -0,0 +1,88 @@
+"""Cache des recherches : LRU, TTL et invalidation par version d'index."""
+import pytest
+
+import retrieval_cache
+from retrieval_cache import RetrievalCache
+from state import bump_index_version
+
+
+@pytest.fixture(autouse=True)
+def no_version_delay(monkeypatch):
+    monkeypatch.setattr(retrieval_cache, "VERSION_CHECK_S", 0.0)
+
+
+def test_key_ignores_parameter_order():
+    assert RetrievalCache.key("idx", query="q", top_k=5) == RetrievalCache.key("idx", top_k=5, query="q")
+    assert RetrievalCache.key("idx", query="q", top_k=5) != RetrievalCache.key("idx", query="q", top_k=6)
+
+
+def test_ingestion_invalidates_only_its_index():
+    cache = RetrievalCache()
+    cache.put("prospects", "k", ["r1"])
+    cache.put("candidats", "k2", ["c1"])
+    assert cache.get("prospects", "k") == ["r1"]
+
+    bump_index_version("prospects")
+    assert cache.get("prospects", "k") is None
+    assert cache.get("candidats", "k2") == ["c1"]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_version_is_reread_at_most_every_interval(monkeypatch):
+    monkeypatch.setattr(retrieval_cache, "VERSION_CHECK_S", 3600.0)
+    cache = RetrievalCache()
+    cache.put("prospects", "k", ["r1"])
+    bump_index_version("prospects")
+    assert cache.get("prospects", "k") == ["r1"]     # version encore en cache
+
+
+def test_expired_entries_are_dropped():
+    cache = RetrievalCache(ttl=-1)
+    cache.put("prospects", "k", ["r1"])
+    assert cache.get("prospects", "k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_evicts_oldest_and_counts_bytes():
+    cache = RetrievalCache(max_entries=2)
+    cache.put("idx", "a", 1)
+    cache.put("idx", "b", 2)
+    cache.get("idx", "a")
+    cache.put("idx", "c", 3)
+    assert cache.get("idx", "b") is None and cache.get("idx", "a") == 1
+    assert cache.evictions == 1
+
+    small = RetrievalCache(max_bytes=64)
+    small.put("idx", "big", "x" * 1000)
+    assert small.stats()["entries"] == 0 and small.bytes == 0
+
+
+def test_get_or_compute_calls_once():
+    cache, calls = RetrievalCache(), []
+    compute = lambda: calls.append(1) or ["r"]
+    assert cache.get_or_compute("idx", "k", compute) == ["r"]
+    assert cache.get_or_compute("idx", "k", compute) == ["r"]
+    assert len(calls) == 1
+
+
+def test_search_served_from_cache_until_reindex(monkeypatch):
+    import core
+    from benchmarks.fakes import FakeBedrockClient, patched_core, seeded_index
+    from embeddings import BedrockEmbeddingEngine
+
+    index = seeded_index("prospects", 20, dimension=32)
+    queries = []
+    real_query = index.query
+    monkeypatch.setattr(index, "query", lambda **kw: queries.append(1) or real_query(**kw))
+    cache = RetrievalCache()
+    engine = BedrockEmbeddingEngine(FakeBedrockClient(), dimensions=32, rate_limit=0)
+    with patched_core(core, engine, index, retrieval_cache=True):
+        monkeypatch.setattr(core, "init_retrieval_cache", lambda: cache)
+        first = core.search_prospects("relance démo", top_k=5, understand=False)
+        assert core.search_prospects("relance démo", top_k=5, understand=False) == first
+        assert len(queries) == 1 and cache.hits == 1
+
+        bump_index_version(core.PINECONE_INDEX_NAME)
+        core.search_prospects("relance démo", top_k=5, understand=False)
+        assert len(queries) == 2
+    engine.close()
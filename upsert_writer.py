@@ -0,0 +1,165 @@
+"""upsert_writer.py – Upsert Pinecone par lots, en parallèle, bornés en taille.
+
+Un seul ``index.upsert([...])`` avec des vecteurs 1024 dim + le texte en
+métadonnées dépasse vite la limite de taille de requête Pinecone (2 Mo) et fait
+échouer tout le run. ``UpsertWriter`` découpe par nombre de vecteurs *et* par
+octets, envoie les lots en parallèle, ré-essaie chaque lot en échec isolément et
+mesure le débit. Le pool de threads est partagé par tous les appels d'un même
+writer : ``submit`` n'attend pas la fin des lots, si bien que plusieurs pages
+de l'ingestion en flux peuvent être en vol simultanément.
+
+Variables d'environnement :
+    PINECONE_UPSERT_BATCH        vecteurs max par requête (défaut 100)
+    PINECONE_UPSERT_MAX_KB       taille max estimée d'une requête (défaut 1800)
+    PINECONE_UPSERT_CONCURRENCY  requêtes simultanées (défaut 4)
+"""
+from __future__ import annotations
+import json, os, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+UPSERT_BATCH       = int(os.getenv("PINECONE_UPSERT_BATCH", "100"))
+UPSERT_MAX_BYTES   = int(os.getenv("PINECONE_UPSERT_MAX_KB", "1800")) * 1024
+UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4"))
+
+# Coût estimé d'un float sérialisé (JSON/REST)
+BYTES_PER_FLOAT = 12
+
+
+def vector_size(vec: dict) -> int:
+    """Estimation rapide de la taille sérialisée d'un vecteur."""
+    size = len(vec["id"]) + BYTES_PER_FLOAT * len(vec.get("values", ()))
+    sparse = vec.get("sparse_values")
+    if sparse:
+        # Indices uint32 (≤ 10 chiffres) + valeurs flottantes
+        size += (11 + BYTES_PER_FLOAT) * len(sparse["indices"]) + 32
+    if vec.get("metadata"):
+        size += len(json.dumps(vec["metadata"], ensure_ascii=False).encode("utf-8"))
+    return size + 64
+
+
+def batches(vectors: Iterable[dict], max_vectors: int, max_bytes: int) -> Iterator[List[dict]]:
+    """Découpe en lots respectant à la fois le nombre et la taille max."""
+    batch: List[dict] = []
+    size = 0
+    for vec in vectors:
+        vsize = vector_size(vec)
+        if batch and (len(batch) >= max_vectors or size + vsize > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(vec)
+        size += vsize
+    if batch:
+        yield batch
+
+
+@dataclass
+class UpsertReport:
+    upserted: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def vectors_per_s(self) -> float:
+        return self.upserted / self.seconds if self.seconds else 0.0
+
+    def merge(self, other: "UpsertReport") -> None:
+        self.upserted += other.upserted
+        self.batches += other.batches
+        self.retries += other.retries
+        self.failed_ids += other.failed_ids
+        self.seconds += other.seconds
+
+    def __str__(self) -> str:
+        msg = f"{self.upserted} vecteurs en {self.batches} lots, {self.vectors_per_s:.0f} vecteurs/s"
+        if self.failed_ids:
+            msg += f", {len(self.failed_ids)} en échec"
+        return msg
+
+
+class PendingWrite:
+    """Lots soumis par ``UpsertWriter.submit`` ; ``result()`` attend leur fin."""
+
+    def __init__(self, futures: Dict[Future, List[dict]], start: float):
+        self.futures = futures
+        self.start = start
+
+    @property
+    def vectors(self) -> int:
+        return sum(len(b) for b in self.futures.values())
+
+    def result(self) -> UpsertReport:
+        report = UpsertReport()
+        for fut in as_completed(self.futures):
+            batch = self.futures[fut]
+            report.batches += 1
+            try:
+                report.retries += fut.result()
+                report.upserted += len(batch)
+            except Exception as exc:
+                print(f"   ⚠️ lot de {len(batch)} vecteurs en échec : {exc}")
+                report.failed_ids += [v["id"] for v in batch]
+        report.seconds = time.perf_counter() - self.start
+        return report
+
+
+class UpsertWriter:
+    """Écrit des vecteurs ``{"id", "values", "metadata"}`` dans un index Pinecone."""
+
+    def __init__(self, index, namespace: Optional[str] = None, max_vectors: int = UPSERT_BATCH,
+                 max_bytes: int = UPSERT_MAX_BYTES, concurrency: int = UPSERT_CONCURRENCY,
+                 max_retries: int = 3, base_delay: float = 1.0):
+        self.index = index
+        self.namespace = namespace
+        self.max_vectors = max_vectors
+        self.max_bytes = max_bytes
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Pool d'upsert partagé, créé au premier usage."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="upsert")
+            return self._pool
+
+    def _send(self, batch: List[dict]) -> int:
+        """Envoie un lot ; retourne le nombre de ré-essais effectués."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.namespace:
+                    self.index.upsert(vectors=batch, namespace=self.namespace)
+                else:
+                    self.index.upsert(vectors=batch)
+                return attempt
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.base_delay * 2 ** attempt)
+        return self.max_retries
+
+    def submit(self, vectors: Iterable[dict]) -> PendingWrite:
+        """Soumet les lots au pool sans attendre leur envoi."""
+        start = time.perf_counter()
+        pool = self.pool
+        return PendingWrite({pool.submit(self._send, b): b
+                             for b in batches(vectors, self.max_vectors, self.max_bytes)}, start)
+
+    def write(self, vectors: Iterable[dict]) -> UpsertReport:
+        return self.submit(vectors).result()
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None